@@ -0,0 +1,226 @@
+"""Benchmarks of scalable reference models.
+
+Every family builds a system of size N from the components. For every model the derivation
+time, the size of the derived equations, the peak memory of the derivation, the right hand side
+evaluations per second, the integration speed and the offline render rate are measured. The
+results are written as JSON and can be compared against a stored baseline:
+
+    python benchmarks.py --sizes 1 2 3 4 --output results.json
+    python benchmarks.py --baseline results.json
+
+The comparison exits with status 1 if a timing got slower than the tolerance allows or if none
+of the measured models is found in the baseline. benchmark_baseline.json is the stored baseline
+of the default sizes with both engines.
+"""
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+
+import numpy as np
+import sympy as sp
+
+from components import FixPoint, FixLine, Trolley, Spring, Connector, Point
+from simulation import Simulation
+from profiling import Profiler, expression_size
+
+
+def pendulum_chain(n, **options):
+    """A chain of n pendulums hanging from a FixPoint"""
+    sim = Simulation(**options)
+    parent = FixPoint()
+    sim.addObjects([parent])
+    for i in range(n):
+        connector = Connector(parent, length=1/n, phi0=np.pi/4 if i == 0 else 0)
+        parent = Point(connector, mass=1/n)
+        sim.addObjects([connector, parent])
+    return sim
+
+
+def spring_chain(n, **options):
+    """n Trolleys on a FixLine, each coupled to its neighbour by a Spring and the first one to a FixPoint"""
+    sim = Simulation(**options)
+    line = FixLine(point1=[-2, 0], point2=[2, 0])
+    parent = FixPoint(position=[-2, 0])
+    sim.addObjects([line, parent])
+    for i in range(n):
+        trolley = Trolley(line, loc0=(i+1.2)/(n+1), mass=1)
+        sim.addObjects([trolley, Spring(parent, trolley, k=20)])
+        parent = trolley
+    return sim
+
+
+def driven_chain(n, **options):
+    """A chain of n pendulums hanging from a horizontally oscillating FixPoint"""
+    sim = Simulation(**options)
+    parent = FixPoint(moving=True, position=[0.2*sp.sin(5*sim.t), sp.Integer(0)])
+    sim.addObjects([parent])
+    for i in range(n):
+        connector = Connector(parent, length=1/n)
+        parent = Point(connector, mass=1/n)
+        sim.addObjects([connector, parent])
+    return sim
+
+
+FAMILIES = {'pendulum_chain': pendulum_chain, 'spring_chain': spring_chain, 'driven_chain': driven_chain}
+
+# metrics where a larger value is a regression, the others are rates where a smaller value is one
+COSTS = ('derive_time', 'compile_time', 'peak_memory')
+RATES = ('rhs_per_second', 'simulated_seconds_per_second', 'render_fps')
+
+
+def measure_rate(function, duration):
+    """Calls function repeatedly for about duration seconds and returns the calls per second"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return calls/elapsed
+
+
+def measure_render(sim, t, y, frames):
+    """Returns the frames per second of the offline renderer in the current process, without encoding"""
+    import render
+    kinematics = sim.get_kinematics()
+    positions = kinematics.positions(t[:frames], y[:frames])
+    energies = sim.get_diagnostics().energy(t[:frames], y[:frames])
+    render._init_worker([object.artist_spec() for object in sim.Objects], kinematics.slices, sim.xlim, sim.ylim, (640, 360), 100)
+    start = time.perf_counter()
+    render._render_chunk((t[:frames], positions, energies))
+    return frames/(time.perf_counter()-start)
+
+
+def benchmark(family, n, formulation = 'mass_matrix', backend = 'numpy', t_end = 10, duration = 0.5, frames = 60, memory = False, engine = 'symbolic'):
+    """Builds and measures one model, returns a dict of metrics.
+
+    With memory the allocations of the derivation are traced, which also slows it down. The
+    numeric engine derives nothing, its setup counts as compile time and the expression size is 0.
+    """
+    profiler = Profiler(memory=memory)
+    sim = FAMILIES[family](n, formulation=formulation, backend=backend, profiler=profiler, engine=engine)
+    expressions = sim.derive()
+    if engine == 'numeric':
+        equations = []
+    elif formulation == 'mass_matrix':
+        equations = list(expressions['M'])+list(expressions['F'])
+    else:
+        equations = expressions['ode']
+    rhs = sim.get_rhs()
+    totals = profiler.totals()
+    derive = [phase for phase in profiler.phases if phase.name == 'derive']
+
+    x0 = np.array(sim.get_x0(), dtype=float)
+    if memory:
+        profiler.memory = False
+        tracemalloc.stop()
+    rhs_rate = measure_rate(lambda: rhs(0., x0), duration)
+    t = np.arange(0, t_end+sim.dt/2, sim.dt)
+    start = time.perf_counter()
+    y = sim.integrate((0, t_end), t_eval=t)
+    integration_time = time.perf_counter()-start
+    return {
+        'family': family, 'n': n, 'dof': len(sim.get_symbols()), 'formulation': formulation, 'backend': backend,
+        'engine': engine,
+        'derive_time': derive[0].time if derive else 0.,
+        'compile_time': totals.get('compile_rhs', 0.)+totals.get('compile_numeric', 0.),
+        'expression_size': expression_size(equations),
+        'peak_memory': derive[0].memory if derive else None,
+        'rhs_per_second': rhs_rate,
+        'simulated_seconds_per_second': t_end/integration_time,
+        'rhs_calls': profiler.counters.get('rhs', 0),
+        'render_fps': measure_render(sim, t, y, frames),
+    }
+
+
+def key(result):
+    # results stored before the numeric engine existed are symbolic
+    return (result['family'], result['n'], result['formulation'], result['backend'], result.get('engine', 'symbolic'))
+
+
+def unmatched(results, baseline):
+    """Returns the keys of the results missing in the baseline and the keys of the baseline missing in the results"""
+    new = [key(result) for result in results]
+    old = [key(result) for result in baseline]
+    return [k for k in new if k not in old], [k for k in old if k not in new]
+
+
+def compare(results, baseline, tolerance = 0.25):
+    """Compares the results against the baseline results.
+
+    Returns a list of (key, metric, baseline value, new value) of all metrics which got worse by
+    more than the relative tolerance.
+    """
+    reference = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = reference.get(key(result))
+        if old is None:
+            continue
+        for metric in COSTS:
+            if result[metric] is not None and old[metric] is not None and result[metric] > old[metric]*(1+tolerance):
+                regressions.append((key(result), metric, old[metric], result[metric]))
+        for metric in RATES:
+            if result[metric] < old[metric]/(1+tolerance):
+                regressions.append((key(result), metric, old[metric], result[metric]))
+        if result['expression_size'] > old['expression_size']:
+            regressions.append((key(result), 'expression_size', old['expression_size'], result['expression_size']))
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Benchmarks of scalable reference models")
+    parser.add_argument('--families', nargs='+', default=list(FAMILIES), choices=list(FAMILIES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1, 2, 3])
+    parser.add_argument('--formulation', default='mass_matrix', choices=['solve', 'mass_matrix'])
+    parser.add_argument('--backend', default='numpy', choices=['numpy', 'lambdify', 'c'])
+    parser.add_argument('--engines', nargs='+', default=['symbolic', 'numeric'], choices=['symbolic', 'numeric'])
+    parser.add_argument('--memory', action='store_true', help="trace the peak memory of the derivation")
+    parser.add_argument('--t-end', type=float, default=10, help="simulated time of the integration benchmark")
+    parser.add_argument('--output', help="write the results as JSON into this file")
+    parser.add_argument('--baseline', help="compare against the results stored in this file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown compared to the baseline")
+    args = parser.parse_args(argv)
+
+    results = []
+    for engine in args.engines:
+        for family in args.families:
+            for n in args.sizes:
+                result = benchmark(family, n, args.formulation, args.backend, args.t_end, memory=args.memory, engine=engine)
+                results.append(result)
+                print("{engine:<9} {family:<16} n={n:<3} derive {derive_time:8.3f}s  size {expression_size:8d}  "
+                      "rhs {rhs_per_second:10.0f}/s  integration {simulated_seconds_per_second:8.1f}x  "
+                      "render {render_fps:6.1f}fps".format(**result)
+                      + ("" if result['peak_memory'] is None else "  memory {:.1f}kB".format(result['peak_memory']/1024)))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'sympy': sp.__version__, 'results': results}, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        missing, dropped = unmatched(results, baseline)
+        for family, n, formulation, backend, engine in missing:
+            print("Not in the baseline: {} n={} ({}, {}, {})".format(family, n, formulation, backend, engine))
+        for family, n, formulation, backend, engine in dropped:
+            print("Not measured: {} n={} ({}, {}, {})".format(family, n, formulation, backend, engine))
+        if len(missing) == len(results):
+            print("None of the results is in {}".format(args.baseline))
+            return 1
+        regressions = compare(results, baseline, args.tolerance)
+        for (family, n, formulation, backend, engine), metric, old, new in regressions:
+            print("Regression in {} n={} ({}, {}, {}): {} {:.4g} -> {:.4g}".format(family, n, formulation, backend, engine, metric, old, new))
+        if regressions:
+            return 1
+        print("No regressions compared to {}".format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
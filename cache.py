@@ -0,0 +1,129 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+import numpy as np
+import sympy as sp
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+CACHE_VERSION = 2
+
+
+def _serialize(value):
+    """Turns a parameter value into a string which is stable between python sessions"""
+    if isinstance(value, sp.Basic):
+        return sp.srepr(value)
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return "[{}]".format(",".join(_serialize(v) for v in value))
+    if isinstance(value, (bool, np.bool_)):
+        return repr(bool(value))
+    if isinstance(value, (int, float, np.number)):
+        return repr(float(value))
+    return repr(value)
+
+
+def topology_key(objects, *extra):
+    """Hashes the component graph of a simulation.
+
+    The key is built from the class, the parent links and the structural parameters of every
+    component. extra contains further settings which change the derived equations (g, formulation, ...).
+    """
+    index = {id(object): i for i, object in enumerate(objects)}
+    parts = [str(CACHE_VERSION)]
+    for object in objects:
+        parents = [index.get(id(parent), -1) for parent in object.get_parents()]
+        parameters = sorted(object.get_parameters().items())
+        parts.append("{}{}{}".format(type(object).__name__, parents,
+                                     [(name, _serialize(value)) for name, value in parameters]))
+    parts.extend(_serialize(e) for e in extra)
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def default_directory():
+    """Returns the directory of the cache of the current user, $LAGRANGE_CACHE_DIR or ~/.cache/lagrange-mechanics"""
+    return os.environ.get('LAGRANGE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'lagrange-mechanics'))
+
+
+class EquationCache:
+    """A size bounded on-disk cache for derived equations.
+
+    Every entry is a pickle file named by its key. The modification time of a file is used as
+    its last access time, such that the least recently used entries are evicted first once the
+    cache grows beyond max_size bytes or max_entries files.
+    """
+    def __init__(self, directory = None, max_size = 100*2**20, max_entries = 256):
+        if directory is None:
+            directory = default_directory()
+        self.directory = directory
+        self.max_size = max_size
+        self.max_entries = max_entries
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key):
+        """Returns the cached value or None on a miss"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logger.warning("Dropping unreadable cache entry %s: %s", path, e)
+            self.remove(key)
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def remove(self, key):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        """Returns (mtime, size, path) of all entries, the least recently used first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        size = sum(e[1] for e in entries)
+        while entries and (size > self.max_size or len(entries) > self.max_entries):
+            mtime, entry_size, path = entries.pop(0)
+            logger.debug("Evicting cache entry %s", path)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            os.unlink(path)
@@ -0,0 +1,143 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class TangentRHS:
+    """Right hand side of the state together with k tangent vectors, dV/dt = J(t,y)*V.
+
+    z holds the state of length m followed by the m x k matrix V in row major order. With the
+    analytic jacobian jac(t,y) of the first order system the tangent vectors are propagated by
+    the variational equations of the derived ode, without a jacobian by central differences of
+    rhs along every tangent vector (two evaluations per vector instead of 2*m for the full jacobian).
+    """
+    def __init__(self, rhs, jac, m, k):
+        self.rhs = rhs
+        self.jac = jac
+        self.m = m
+        self.k = k
+
+    def __call__(self, t, z):
+        m = self.m
+        y = z[:m]
+        V = z[m:].reshape(m, self.k)
+        dz = np.empty(len(z))
+        dz[:m] = self.rhs(t, y)
+        if self.jac is not None:
+            J = self.jac(t, y)
+            dz[m:] = (J.toarray() if hasattr(J, 'toarray') else J).dot(V).ravel()
+            return dz
+        dV = dz[m:].reshape(m, self.k)
+        for i in range(self.k):
+            h = 1e-7*(1+np.abs(y).max())/max(np.abs(V[:, i]).max(), 1e-300)
+            dV[:, i] = (self.rhs(t, y+h*V[:, i]) - self.rhs(t, y-h*V[:, i]))/(2*h)
+        return dz
+
+
+class ChaosResult:
+    """The Lyapunov exponents and Poincare section crossings of one trajectory.
+
+    exponents are the k largest Lyapunov exponents, history their running estimates at the
+    renormalization times times. crossings are the times and states at which the trajectory
+    crossed the section.
+    """
+    def __init__(self, exponents, times, history, crossing_times, crossings):
+        self.exponents = exponents
+        self.times = times
+        self.history = history
+        self.crossing_times = crossing_times
+        self.crossings = crossings
+
+
+def lyapunov(rhs, jac, x0, t_span, interval = 1., exponents = 1, section = None, rtol = 1e-9, atol = 1e-9, seed = 0):
+    """Estimates the largest Lyapunov exponents of the trajectory through x0 by the method of Benettin et al.
+
+    The state and exponents tangent vectors are integrated together. Every interval the tangent
+    vectors are orthonormalized by a QR decomposition, the logarithms of the diagonal of R
+    accumulate the growth along each direction. section is a CompiledEvent whose zero crossings
+    are located by root finding on the dense output of every step. Returns a ChaosResult.
+    """
+    import scipy.integrate
+    x0 = np.asarray(x0, dtype=float)
+    m = len(x0)
+    k = exponents
+    f = TangentRHS(rhs, jac, m, k)
+    V = np.linalg.qr(np.random.default_rng(seed).normal(size=(m, k)))[0]
+    y = x0
+    t = t_span[0]
+    growth = np.zeros(k)
+    times = []
+    history = []
+    crossing_times = []
+    crossings = []
+    events = [] if section is None else [lambda t, z: section(t, z[:m])]
+    if section is not None:
+        events[0].direction = section.direction
+    while t < t_span[1] - 1e-12*interval:
+        t_end = min(t+interval, t_span[1])
+        solution = scipy.integrate.solve_ivp(f, (t, t_end), np.concatenate([y, V.ravel()]), method='DOP853',
+                                             rtol=rtol, atol=atol, events=events or None)
+        if solution.status < 0:
+            logger.warning("Integration failed at t = %s: %s", solution.t[-1], solution.message)
+            break
+        if events and len(solution.t_events[0]):
+            crossing_times.extend(solution.t_events[0])
+            crossings.extend(solution.y_events[0][:, :m])
+        z = solution.y[:, -1]
+        y = z[:m]
+        Q, R = np.linalg.qr(z[m:].reshape(m, k))
+        # the signs of Q and R are arbitrary, only |R_ii| measures the growth
+        growth += np.log(np.abs(np.diag(R)))
+        V = Q
+        t = t_end
+        times.append(t)
+        history.append(growth/(t-t_span[0]))
+    history = np.array(history).reshape(-1, k)
+    return ChaosResult(history[-1] if len(history) else np.full(k, np.nan), np.array(times), history,
+                       np.array(crossing_times), np.array(crossings).reshape(-1, m))
+
+
+_worker = {}
+
+
+def _init_worker(rhs, jac, section, options):
+    _worker.update(rhs=rhs, jac=jac, section=section, options=options)
+
+
+def _run(x0):
+    return lyapunov(_worker['rhs'], _worker['jac'], x0, section=_worker['section'], **_worker['options'])
+
+
+def analyze(sim, x0s, t_span, interval = 1., exponents = 1, section = None, processes = None, parameters = None,
+            rtol = 1e-9, atol = 1e-9):
+    """Computes the Lyapunov exponents and Poincare sections of many initial conditions.
+
+    x0s has the shape (N, 2*DOF). section is an events.Event, e.g. Event(Q0) for the section
+    Q0 = 0, with direction=1 only the upward crossings are recorded. With the symbolic engine the
+    tangent vectors follow the analytic jacobian of the derived ode, with the numeric engine they
+    are propagated by finite differences. The initial conditions are split over a process pool.
+    Returns a list of ChaosResult.
+    """
+    from events import compile_events
+    sim.derive()
+    x0s = np.atleast_2d(np.asarray(x0s, dtype=float))
+    rhs = sim.get_rhs(parameters=parameters)
+    jac = None
+    compiled = None
+    if section is not None:
+        compiled = compile_events(sim, [section])[0]
+        if sim.parameters:
+            compiled = compiled.bind(sim.get_parameter_values(parameters))
+    options = {'t_span': t_span, 'interval': interval, 'exponents': exponents, 'rtol': rtol, 'atol': atol}
+    if sim.engine != 'numeric':
+        jac = sim.get_jacobian(parameters=parameters)
+    logger.debug("Analyzing %s initial conditions", len(x0s))
+    chunksize = max(1, len(x0s)//(4*(processes or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(rhs, jac, compiled, options)) as pool:
+        return list(pool.map(_run, x0s, chunksize=chunksize))
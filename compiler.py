@@ -0,0 +1,320 @@
+import os
+import math
+import ctypes
+import hashlib
+import tempfile
+import subprocess
+
+import numpy as np
+import sympy as sp
+
+from scipy.linalg.lapack import dgesv
+
+from cache import default_directory
+
+from sympy.printing.pycode import PythonCodePrinter
+try:
+    from sympy.printing.numpy import NumPyPrinter
+except ImportError:
+    # sympy < 1.8
+    from sympy.printing.pycode import NumPyPrinter
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+def _cse(exprs, cse):
+    if not cse:
+        return [], list(exprs)
+    return sp.cse(list(exprs), symbols=sp.numbered_symbols('_x'))
+
+
+def _is_vector(symbols):
+    return isinstance(symbols, (list, tuple))
+
+
+class LambdifiedFunction:
+    """The plain sp.lambdify version with the same call signature as the compiled functions"""
+    def __init__(self, exprs, args, name = 'f'):
+        self.name = name
+        self.size = len(exprs)
+        self.args = [(arg, len(symbols) if _is_vector(symbols) else None) for arg, symbols in args]
+        self.function = sp.lambdify([list(symbols) if _is_vector(symbols) else symbols for arg, symbols in args], list(exprs))
+
+    def __call__(self, *args, out = None):
+        if out is None:
+            out = np.empty(self.size)
+        out[:] = self.function(*args)
+        return out
+
+
+class CompiledFunction:
+    """Evaluates a list of sympy expressions into a flat output array.
+
+    args is a list of (name, symbols) pairs. A single symbol becomes a scalar argument, a list of
+    symbols an array argument which is unpacked at the start of the generated function. The
+    common subexpressions are evaluated once and the results are written into out, which can be
+    passed in preallocated. Vectorized functions use numpy for every operation, such that the array
+    arguments can carry an additional trailing axis, e.g. y of shape (2*DOF, N).
+
+    Only the generated source is pickled, it is compiled again on unpickling.
+    """
+    def __init__(self, exprs, args, name = 'f', vectorized = False, cse = True):
+        self.name = name
+        self.size = len(exprs)
+        self.vectorized = vectorized
+        self.args = [(arg, len(symbols) if _is_vector(symbols) else None) for arg, symbols in args]
+        self.source = self.generate(exprs, args, cse)
+        self.compile()
+
+    def printer(self):
+        if self.vectorized:
+            return NumPyPrinter({'fully_qualified_modules': True})
+        return PythonCodePrinter({'fully_qualified_modules': True})
+
+    def generate(self, exprs, args, cse):
+        printer = self.printer()
+        replacements, reduced = _cse(exprs, cse)
+        lines = ["def {}({}, out):".format(self.name, ", ".join(arg for arg, symbols in args))]
+        for arg, symbols in args:
+            if _is_vector(symbols) and len(symbols) > 0:
+                lines.append("    [{}] = {}".format(", ".join(printer.doprint(s) for s in symbols), arg))
+        for symbol, expr in replacements:
+            lines.append("    {} = {}".format(printer.doprint(symbol), printer.doprint(expr)))
+        for i, expr in enumerate(reduced):
+            lines.append("    out[{}] = {}".format(i, printer.doprint(expr)))
+        lines.append("    return out")
+        return "\n".join(lines) + "\n"
+
+    def compile(self):
+        namespace = {'math': math, 'numpy': np}
+        exec(compile(self.source, "<{}>".format(self.name), 'exec'), namespace)
+        self.function = namespace[self.name]
+
+    def allocate(self, args):
+        shape = ()
+        if self.vectorized:
+            for arg, (name, size) in zip(args, self.args):
+                if size is not None:
+                    shape = np.shape(arg)[1:]
+                    break
+        return np.empty((self.size,) + shape)
+
+    def __call__(self, *args, out = None):
+        if out is None:
+            out = self.allocate(args)
+        return self.function(*args, out)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['function']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compile()
+
+
+def private_directory(directory):
+    """Creates directory accessible only by the current user and returns it.
+
+    Code is loaded from it, therefore a PermissionError is raised if it belongs to another user.
+    An existing directory of the current user which others can write to is restricted.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    stat = os.stat(directory)
+    if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+        raise PermissionError("{} belongs to another user, refusing to load libraries from it".format(directory))
+    if stat.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+    return directory
+
+
+class CFunction(CompiledFunction):
+    """Like the CompiledFunction but generates C code, which is compiled into a shared library and called through ctypes.
+
+    The libraries are stored by the hash of their source in directory, such that unpickling or
+    the same expressions in another process do not need to call the compiler again. directory
+    defaults to c in the directory of the EquationCache and must belong to the current user.
+    """
+    compiler = os.environ.get('CC', 'cc')
+
+    def __init__(self, exprs, args, name = 'f', cse = True, directory = None):
+        if directory is None:
+            directory = os.path.join(default_directory(), 'c')
+        self.directory = directory
+        CompiledFunction.__init__(self, exprs, args, name = name, vectorized = False, cse = cse)
+
+    def generate(self, exprs, args, cse):
+        replacements, reduced = _cse(exprs, cse)
+        signature = []
+        lines = []
+        for arg, symbols in args:
+            if _is_vector(symbols):
+                signature.append("const double *{}".format(arg))
+                for i, s in enumerate(symbols):
+                    lines.append("    const double {} = {}[{}];".format(sp.ccode(s), arg, i))
+            else:
+                signature.append("double {}".format(arg))
+        for symbol, expr in replacements:
+            lines.append("    const double {} = {};".format(sp.ccode(symbol), sp.ccode(expr)))
+        for i, expr in enumerate(reduced):
+            lines.append("    out[{}] = {};".format(i, sp.ccode(expr)))
+        return "#include <math.h>\n\nvoid {}({}, double *out) {{\n{}\n}}\n".format(
+            self.name, ", ".join(signature), "\n".join(lines))
+
+    def compile(self):
+        digest = hashlib.sha256(self.source.encode()).hexdigest()[:32]
+        library = os.path.join(self.directory, "{}_{}.so".format(self.name, digest))
+        private_directory(self.directory)
+        if not os.path.exists(library):
+            with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+                source = os.path.join(tmp, 'function.c')
+                with open(source, 'w') as file:
+                    file.write(self.source)
+                target = os.path.join(tmp, 'function.so')
+                logger.debug("Compiling %s", library)
+                subprocess.run([self.compiler, '-O2', '-shared', '-fPIC', '-o', target, source, '-lm'],
+                               check=True, capture_output=True)
+                os.replace(target, library)
+        function = getattr(ctypes.CDLL(library), self.name)
+        function.argtypes = [ctypes.c_void_p if size is not None else ctypes.c_double for arg, size in self.args] + [ctypes.c_void_p]
+        function.restype = None
+        self.function = function
+        # Fixed buffers avoid the costly conversion of numpy arrays to pointers on every call.
+        self.buffers = [np.empty(size) if size is not None else None for arg, size in self.args]
+        self.buffer = np.empty(self.size)
+        self.addresses = [b.ctypes.data if b is not None else None for b in self.buffers] + [self.buffer.ctypes.data]
+
+    def __call__(self, *args, out = None):
+        call = []
+        for arg, buffer, address in zip(args, self.buffers, self.addresses):
+            if buffer is None:
+                call.append(arg)
+            else:
+                buffer[:] = arg
+                call.append(address)
+        call.append(self.addresses[-1])
+        self.function(*call)
+        if out is None:
+            return self.buffer.copy()
+        out[:] = self.buffer
+        return out
+
+    def __getstate__(self):
+        state = CompiledFunction.__getstate__(self)
+        for name in ('buffers', 'buffer', 'addresses'):
+            del state[name]
+        return state
+
+
+class BoundFunction:
+    """Binds the parameter vector p as last argument to a compiled function f(..., p, out=None)"""
+    def __init__(self, function, p):
+        self.function = function
+        self.p = p
+
+    def __call__(self, *args, out = None):
+        return self.function(*args, self.p, out=out)
+
+
+BACKENDS = {'lambdify': LambdifiedFunction, 'numpy': CompiledFunction, 'c': CFunction}
+
+
+def compile_function(exprs, args, name = 'f', backend = 'numpy', vectorized = False):
+    """Compiles exprs with the given backend. Vectorized functions are always generated as numpy code."""
+    if vectorized:
+        return CompiledFunction(exprs, args, name = name, vectorized = True)
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend {}".format(backend))
+    return BACKENDS[backend](exprs, args, name = name)
+
+
+class MassMatrixRHS:
+    """Right hand side of the first order system for the mass matrix formulation.
+
+    function evaluates the n*n entries of M followed by the n entries of F into one buffer.
+    The accelerations are obtained by solving M*ddq = F with a LU decomposition.
+    """
+    def __init__(self, function, n):
+        self.function = function
+        self.n = n
+        self.buffer = None
+
+    def __call__(self, t, y, out = None):
+        n = self.n
+        if out is None:
+            out = np.empty(np.shape(y))
+        if self.buffer is None or self.buffer.shape[1:] != np.shape(y)[1:]:
+            self.buffer = np.empty((n*n+n,) + np.shape(y)[1:])
+        buffer = self.function(t, y, out=self.buffer)
+        out[0::2] = y[1::2]
+        if buffer.ndim == 2:
+            # ensemble of shape (2*DOF, N), solve all N systems at once
+            M = buffer[:n*n].reshape(n, n, -1).transpose(2, 0, 1)
+            out[1::2] = np.linalg.solve(M, buffer[n*n:].T[..., None])[..., 0].T
+            return out
+        lu, piv, out[1::2], info = dgesv(buffer[:n*n].reshape(n, n), buffer[n*n:])
+        if info > 0:
+            raise np.linalg.LinAlgError("Singular mass matrix")
+        return out
+
+
+def sparsity_pattern(matrix):
+    """Returns the boolean array of the entries of a sympy matrix which are not identically zero"""
+    return np.array([[matrix[i, j] != 0 for j in range(matrix.cols)] for i in range(matrix.rows)], dtype=bool).reshape(matrix.shape)
+
+
+class Jacobian:
+    """Jacobian of the first order system from the compiled nonzero entries.
+
+    function evaluates the entries at the positions (rows, cols) of the sparsity pattern. They
+    are scattered into a dense array or, if sparse is set, into a scipy.sparse csc matrix.
+    """
+    def __init__(self, function, rows, cols, n, sparse = False):
+        self.function = function
+        self.rows = np.asarray(rows, dtype=int)
+        self.cols = np.asarray(cols, dtype=int)
+        self.n = n
+        self.sparse = sparse
+        self.sparsity = np.zeros((n, n), dtype=bool)
+        self.sparsity[self.rows, self.cols] = True
+
+    def __call__(self, t, y):
+        data = self.function(t, y)
+        if self.sparse:
+            import scipy.sparse
+            return scipy.sparse.csc_matrix((data, (self.rows, self.cols)), shape=(self.n, self.n))
+        J = np.zeros((self.n, self.n))
+        J[self.rows, self.cols] = data
+        return J
+
+
+class MassMatrixJacobian:
+    """Jacobian of the first order system for the mass matrix formulation.
+
+    With the residual R(x, a) = M(q)*a - F(q, dq) of the Euler-Lagrange equations, the
+    derivative of the accelerations is d(ddq)/dx = -M^-1 * dR/dx evaluated at a = ddq.
+    mass_matrix evaluates M and F, residual the n x 2n entries of dR/dx.
+    """
+    def __init__(self, mass_matrix, residual, sparsity, sparse = False):
+        self.mass_matrix = mass_matrix
+        self.residual = residual
+        self.sparsity = sparsity
+        self.n = len(sparsity)//2
+        self.sparse = sparse
+
+    def __call__(self, t, y):
+        n = self.n
+        buffer = self.mass_matrix(t, y)
+        M = buffer[:n*n].reshape(n, n)
+        lu, piv, a, info = dgesv(M, buffer[n*n:])
+        D = self.residual(t, y, a).reshape(n, 2*n)
+        J = np.zeros((2*n, 2*n))
+        J[np.arange(0, 2*n, 2), np.arange(1, 2*n, 2)] = 1
+        J[1::2] = -np.linalg.solve(M, D)
+        if self.sparse:
+            import scipy.sparse
+            return scipy.sparse.csc_matrix(J*self.sparsity)
+        return J
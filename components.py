@@ -1,14 +1,18 @@
 
 import numpy as np
 import sympy as sp
-import scipy.constants
-
-import matplotlib.pyplot as plt
 
 
 class Component:
     """Base Class for all Components"""
 
+    parameters = ()
+    plot_format = '-k'
+    # the "FixGroup" and the "0d"/"1d" classes of the generation rules, checked by graph.ComponentGraph
+    fixed = False
+    dimension = None
+    max_parents = 1
+
     def setup(self, i, t):
         """The setup function sets up the Component for later use in the simulation. Must be called before any other function.
         
@@ -37,6 +41,10 @@ class Component:
         """Exchanges the implicit time dependency of the DOFs by symbols"""
         pass
 
+    def dampening_expr(self):
+        """Returns the dampening coefficient of every DOF of get_symbol, the force -c*dL/ddQ acts against the motion"""
+        return [sp.Integer(0) for s in self.get_symbol()]
+
     def get_symbol(self):
         """Returns all used symbols corresponding to this Component"""
         return []
@@ -52,17 +60,81 @@ class Component:
     def init_plot(self,ax):
         self.ax = ax
 
+    def plot_points_expr(self):
+        """Returns the position expressions of the points which are drawn for this component"""
+        return []
+
+    def draw(self, points):
+        """Draws the component from the precomputed global coordinates of its plot points, an array of shape (n,2)"""
+        self.plt_data.set_data(points[:,0], points[:,1])
+        return self.plt_data
+
+    def artist_spec(self):
+        """Returns a picklable description of the artist of this component, used by the offline renderer in render.py"""
+        return ('line', self.plot_format)
+
     def evaluate(self,L):
         return L 
 
+    def get_parents(self):
+        """Returns the components this component is attached to"""
+        return []
+
+    def get_parameters(self):
+        """Returns the structural parameters which enter the equations of motion. Initial conditions are not part of them."""
+        return {}
+
+    def parametrize(self, index, symbolic = True):
+        """Replaces the physical parameters listed in self.parameters by symbols named <name>_<index> in all expressions.
+
+        Returns the list of (symbol, numeric value) pairs. With symbolic=False the numeric values are used again.
+        """
+        self.parameter_symbols = {}
+        if symbolic:
+            self.parameter_symbols = {name: sp.Symbol('{}_{}'.format(name, index)) for name in self.parameters}
+        return [(self.parameter_symbols[name], getattr(self, name)) for name in self.parameters if symbolic]
+
+    def get_parameter(self, name):
+        """Returns the symbol of a parametrized physical parameter or its numeric value"""
+        return getattr(self, 'parameter_symbols', {}).get(name, getattr(self, name))
+
+    def clear_expressions(self):
+        """Drops the memoized position and velocity expressions. Called by Simulation.setup before every derivation."""
+        self.expression_cache = {}
+
+    def memoize(self, key, build):
+        """Returns the expression stored under key, which is built only on the first call.
+
+        Every component along a chain builds and differentiates its kinematics once, the
+        children reuse the results of their parents instead of expanding the whole chain again.
+        """
+        cache = self.__dict__.setdefault('expression_cache', {})
+        if key not in cache:
+            cache[key] = build()
+        return list(cache[key])
+
+    def get_velocity_expr(self):
+        """Returns the time derivative of get_position_expr"""
+        return self.memoize('velocity', lambda: [sp.diff(x, self.t) for x in self.get_position_expr()])
+
+    def l2g_velocity_expr(self, local):
+        """Returns the time derivative of l2g_expr(local)"""
+        return self.memoize(('l2g_velocity', local), lambda: [sp.diff(x, self.t) for x in self.l2g_expr(local)])
+
 
     
 class FixPoint(Component):
     """A non moving Point object to anchor other objects"""
+    fixed = True
+    dimension = 0
+    plot_format = 'ok'
     def __init__(self, position=[0,0], moving = False):
         self.position = np.array(position)
         self.moving = moving
 
+    def get_parameters(self):
+        return {'position': self.position, 'moving': self.moving}
+
     def get_position(self, t=0):
         if self.moving:
             return np.array([self.position[0].subs(self.t,t),self.position[1].subs(self.t,t)])
@@ -71,6 +143,9 @@ class FixPoint(Component):
     def get_position_expr(self):
         return self.position
 
+    def plot_points_expr(self):
+        return [self.get_position_expr()]
+
     def plot(self, t=0):
         x,y = self.get_position(t).T
         self.plt_data.set_data(x,y)
@@ -78,15 +153,21 @@ class FixPoint(Component):
 
     def init_plot(self,ax):
         self.ax = ax
-        self.plt_data, = ax.plot([],[],'ok')
+        self.plt_data, = ax.plot([],[],self.plot_format)
 
 class FixLine(Component):
     """A fixed linear track on which a Trolley can move"""
+    fixed = True
+    dimension = 1
+
     def __init__(self, point1=[0,0], point2=[1,0],moving = (False, False)):
         self.point1 = np.array(point1)
         self.point2 = np.array(point2)
         self.moving = moving
 
+    def get_parameters(self):
+        return {'point1': self.point1, 'point2': self.point2, 'moving': self.moving}
+
     def l2g(self, local, t=0):
         point1 = self.point1
         point2 = self.point2
@@ -99,6 +180,9 @@ class FixLine(Component):
     def l2g_expr(self, local):
         return [(1-local)*self.point1[0]+local*self.point2[0],(1-local)*self.point1[1]+local*self.point2[1]]
 
+    def plot_points_expr(self):
+        return [self.l2g_expr(-10), self.l2g_expr(10)]
+
     def plot(self, t=0):
         x,y = np.array([self.l2g(-10,t), self.l2g(10,t)]).T
         self.plt_data.set_data(x,y)
@@ -106,10 +190,13 @@ class FixLine(Component):
 
     def init_plot(self,ax):
         self.ax = ax
-        self.plt_data, = ax.plot([],[],'-k')
+        self.plt_data, = ax.plot([],[],self.plot_format)
 
 class FixCurve(Component):
     """A fixed track which follows an arbitrary curve on which a Trolley can move"""
+    fixed = True
+    dimension = 1
+
     def __init__(self, curve, var, moving = False,plot_interval = (-2,2),plot_points = 10):
         self.curve = curve
         self.var = var
@@ -117,6 +204,9 @@ class FixCurve(Component):
         self.plot_interval = plot_interval
         self.plot_points = plot_points
 
+    def get_parameters(self):
+        return {'curve': self.curve, 'var': self.var, 'moving': self.moving}
+
     def l2g(self, local, t=0):
         pos = [self.curve[0].subs(self.var,local),self.curve[1].subs(self.var,local)]
         if self.moving:
@@ -127,6 +217,9 @@ class FixCurve(Component):
         pos = [self.curve[0].subs(self.var,local),self.curve[1].subs(self.var,local)]
         return pos
 
+    def plot_points_expr(self):
+        return [self.l2g_expr(i) for i in np.linspace(self.plot_interval[0],self.plot_interval[1],self.plot_points)]
+
     def plot(self, t=0):
         if self.first and not self.moving:
             return self.plt_data
@@ -138,16 +231,22 @@ class FixCurve(Component):
 
     def init_plot(self,ax):
         self.ax = ax
-        self.plt_data, = ax.plot([],[],'-k')
+        self.plt_data, = ax.plot([],[],self.plot_format)
         self.first = False
 
 class FixCircle(Component):
     """A fixed circular crack on which a Trolley can move"""
+    fixed = True
+    dimension = 1
+
     def __init__(self, radius = 0.5, midpoint=np.array([0,0]), moving = False):
         self.midpoint = midpoint
         self.radius = radius
         self.moving = moving
 
+    def get_parameters(self):
+        return {'radius': self.radius, 'midpoint': self.midpoint, 'moving': self.moving}
+
     def l2g(self, local, t=0):
         if self.moving:
             return np.array([self.midpoint[0].subs(self.t,t)+self.radius*sp.sin(local),self.midpoint[1].subs(self.t,t)-self.radius*sp.cos(local)])
@@ -156,13 +255,24 @@ class FixCircle(Component):
     def l2g_expr(self, local):
         return [self.midpoint[0]+self.radius*sp.sin(local), self.midpoint[1]-self.radius*sp.cos(local)]
 
+    def plot_points_expr(self):
+        return [self.midpoint]
+
+    def draw(self, points):
+        self.circle.center = tuple(points[0])
+        return self.circle
+
+    def artist_spec(self):
+        return ('circle', float(self.radius))
+
     def init_plot(self,ax):
+        from matplotlib.patches import Circle
         self.ax = ax
         t = 0
         if self.moving:
-            self.circle = plt.Circle((self.midpoint[0].subs(self.t,t), self.midpoint[1].subs(self.t,t)), self.radius,color = "black",fill=False)
+            self.circle = Circle((self.midpoint[0].subs(self.t,t), self.midpoint[1].subs(self.t,t)), self.radius,color = "black",fill=False)
         else:
-            self.circle = plt.Circle(self.midpoint,self.radius,color = "black",fill=False)
+            self.circle = Circle(self.midpoint,self.radius,color = "black",fill=False)
         
         self.ax.add_artist(self.circle)
 
@@ -178,28 +288,43 @@ class FixCircle(Component):
 
 class Point(Component):
     """A mass point stationary on a Connector"""
+    dimension = 0
+    parameters = ('mass',)
+    plot_format = 'og'
+
     def __init__(self, parent, local=1, mass=1):
         self.parent=parent
         self.local = local
         self.mass = mass
+
+    def get_parents(self):
+        return [self.parent]
+
+    def get_parameters(self):
+        return {'local': self.local, 'mass': self.get_parameter('mass')}
         
     def get_position(self, t=0):
         return self.parent.l2g(self.local,t)
 
     def get_position_expr(self):
-        return self.parent.l2g_expr(self.local)
+        return self.memoize('position', lambda: self.parent.l2g_expr(self.local))
+
+    def get_velocity_expr(self):
+        return self.memoize('velocity', lambda: self.parent.l2g_velocity_expr(self.local))
+
+    def plot_points_expr(self):
+        return [self.get_position_expr()]
     
     def setup(self, i, t):
         self.t = t
         return i
 
     def potential_expr(self,g):
-        return self.mass*g*self.get_position_expr()[1]
+        return self.get_parameter('mass')*g*self.get_position_expr()[1]
 
     def kinetic_expr(self):
-        pos = self.get_position_expr()
-        v = [sp.diff(pos[0], self.t), sp.diff(pos[1],self.t)]
-        return 0.5*self.mass*(v[0]**2+v[1]**2)
+        v = self.get_velocity_expr()
+        return 0.5*self.get_parameter('mass')*(v[0]**2+v[1]**2)
    
    
     def plot(self, t=0):
@@ -209,10 +334,14 @@ class Point(Component):
 
     def init_plot(self,ax):
         self.ax = ax
-        self.plt_data, = ax.plot([],[],'og')
+        self.plt_data, = ax.plot([],[],self.plot_format)
     
 class Trolley(Component):
     """A mass point moving on a FixLine"""
+    dimension = 0
+    parameters = ('mass',)
+    plot_format = 'or'
+
     def __init__(self, parent, loc0=0, dloc0=0, mass=1):
         self.parent=parent
         self.mass = mass
@@ -220,6 +349,12 @@ class Trolley(Component):
         self.dloc0 = dloc0
         self.local = loc0
         self.dlocal = dloc0
+
+    def get_parents(self):
+        return [self.parent]
+
+    def get_parameters(self):
+        return {'mass': self.get_parameter('mass')}
         
     def setup(self, i, t):
         self.index = i
@@ -233,16 +368,21 @@ class Trolley(Component):
         return self.parent.l2g(self.local,t)
 
     def get_position_expr(self):
-        return self.parent.l2g_expr(self.q(self.t))
+        return self.memoize('position', lambda: self.parent.l2g_expr(self.q(self.t)))
+
+    def get_velocity_expr(self):
+        return self.memoize('velocity', lambda: self.parent.l2g_velocity_expr(self.q(self.t)))
+
+    def plot_points_expr(self):
+        return [self.get_position_expr()]
 
 
     def potential_expr(self,g):
-        return self.mass*g*self.get_position_expr()[1]
+        return self.get_parameter('mass')*g*self.get_position_expr()[1]
 
     def kinetic_expr(self):
-        pos = self.get_position_expr()
-        v = [sp.diff(pos[0],self.t),sp.diff(pos[1],self.t)]
-        return 0.5*self.mass*(v[0]**2+v[1]**2)
+        v = self.get_velocity_expr()
+        return 0.5*self.get_parameter('mass')*(v[0]**2+v[1]**2)
 
     def calculate_ode_functions(self, f, L):
         ODE = sp.diff(sp.diff(L,self.dq),self.t) - sp.diff(L,self.q(self.t)) 
@@ -271,13 +411,16 @@ class Trolley(Component):
 
     def init_plot(self,ax):
         self.ax = ax
-        self.plt_data, = ax.plot([],[],'or')
+        self.plt_data, = ax.plot([],[],self.plot_format)
 
     def evaluate(self,L):
         return L.subs(self.dQ,self.dlocal).subs(self.dq,self.dlocal).subs(self.Q,self.local).subs(self.q(self.t),self.local)
 
 
 class Connector(Component):
+    dimension = 1
+    parameters = ('length', 'dampening')
+
     def __init__(self, parent, length=1, offset = 0,phi0 = 0, dphi0 = 0, dampening = 0):
         self.parent = parent
         self.length = length
@@ -288,6 +431,12 @@ class Connector(Component):
         self.dphi = dphi0
         self.dampening = dampening
 
+    def get_parents(self):
+        return [self.parent]
+
+    def get_parameters(self):
+        return {'length': self.get_parameter('length'), 'offset': self.offset, 'dampening': self.get_parameter('dampening')}
+
 
     def setup(self, i, t):
         self.index = i
@@ -301,13 +450,29 @@ class Connector(Component):
         return self.parent.get_position(t)+self.length*(self.offset+local)*np.array([np.sin(self.phi),-np.cos(self.phi)])
 
     def l2g_expr(self, local): #local to global expression
-        modifier = self.length*(self.offset+local)
-        par_pos = self.parent.get_position_expr()
-        return [par_pos[0]+modifier*sp.sin(self.q(self.t)),par_pos[1]-modifier*sp.cos(self.q(self.t))]
+        def build():
+            modifier = self.get_parameter('length')*(self.offset+local)
+            par_pos = self.parent.get_position_expr()
+            return [par_pos[0]+modifier*sp.sin(self.q(self.t)),par_pos[1]-modifier*sp.cos(self.q(self.t))]
+        return self.memoize(('l2g', local), build)
+
+    def l2g_velocity_expr(self, local):
+        """The velocity of the parent plus the rotation of the connector and the motion along it (chain rule), local may depend on t"""
+        def build():
+            length = self.get_parameter('length')
+            modifier = length*(self.offset+local)
+            dlocal = length*sp.diff(local, self.t)
+            par_vel = self.parent.get_velocity_expr()
+            return [par_vel[0]+modifier*sp.cos(self.q(self.t))*self.dq+dlocal*sp.sin(self.q(self.t)),
+                    par_vel[1]+modifier*sp.sin(self.q(self.t))*self.dq-dlocal*sp.cos(self.q(self.t))]
+        return self.memoize(('l2g_velocity', local), build)
+
+    def plot_points_expr(self):
+        return [self.l2g_expr(0), self.l2g_expr(1)]
     
 
     def calculate_ode_functions(self,f,L):
-        ODE = sp.diff(sp.diff(L,self.dq),self.t) + self.dampening*sp.diff(L,self.dq) - sp.diff(L,self.q(self.t)) 
+        ODE = sp.diff(sp.diff(L,self.dq),self.t) + self.get_parameter('dampening')*sp.diff(L,self.dq) - sp.diff(L,self.q(self.t)) 
         f.append(ODE)
 
     def substitude_symbols(self, f):
@@ -318,6 +483,9 @@ class Connector(Component):
     def get_symbol(self):
         return [(self.Q, self.dQ, self.ddQ)]
 
+    def dampening_expr(self):
+        return [self.get_parameter('dampening')]
+
     def get_x0(self, x0):
         x0.extend([self.phi0, self.dphi0])
 
@@ -332,13 +500,18 @@ class Connector(Component):
 
     def init_plot(self,ax):
         self.ax = ax
-        self.plt_data, = ax.plot([],[],'-k')
+        self.plt_data, = ax.plot([],[],self.plot_format)
 
     def evaluate(self,L):
         return L.subs(self.dQ,self.dphi).subs(self.dq,self.dphi).subs(self.Q,self.phi).subs(self.q(self.t),self.phi)
 
 
 class Spring(Component):
+    dimension = 1
+    max_parents = 2
+    parameters = ('length', 'k')
+    plot_format = '-y'
+
     def __init__(self, parent, secondary_parent = False, length = 1, k=1, x0 = 0, dx0 = 0, phi0 = 0, dphi0 = 0):
         self.parent = parent
         self.secondary_parent = secondary_parent 
@@ -352,6 +525,14 @@ class Spring(Component):
         self.dphi = dphi0
         self.k = k
 
+    def get_parents(self):
+        if self.secondary_parent:
+            return [self.parent, self.secondary_parent]
+        return [self.parent]
+
+    def get_parameters(self):
+        return {'length': self.get_parameter('length'), 'k': self.get_parameter('k')}
+
     def setup(self, i, t):
         self.t = t
         if not self.secondary_parent:
@@ -374,12 +555,33 @@ class Spring(Component):
         return (1-local)*self.parent.get_position(t)+local*self.secondary_parent.get_position(t)
 
     def l2g_expr(self, local):
-        par_pos = self.parent.get_position_expr()
-        if not self.secondary_parent:
-            modifier = (self.length+self.q1(self.t))*local
-            return [par_pos[0]+modifier*sp.sin(self.q2(self.t)),par_pos[1]-modifier*sp.cos(self.q2(self.t))]
-        par_pos2 = self.secondary_parent.get_position_expr()
-        return [(1-local)*par_pos[0]+local*par_pos2[0], (1-local)*par_pos[1]+local*par_pos2[1]]
+        def build():
+            par_pos = self.parent.get_position_expr()
+            if not self.secondary_parent:
+                modifier = (self.get_parameter('length')+self.q1(self.t))*local
+                return [par_pos[0]+modifier*sp.sin(self.q2(self.t)),par_pos[1]-modifier*sp.cos(self.q2(self.t))]
+            par_pos2 = self.secondary_parent.get_position_expr()
+            return [(1-local)*par_pos[0]+local*par_pos2[0], (1-local)*par_pos[1]+local*par_pos2[1]]
+        return self.memoize(('l2g', local), build)
+
+    def l2g_velocity_expr(self, local):
+        """The velocity of the parents plus the stretching and rotation of the spring and the motion along it (chain rule), local may depend on t"""
+        def build():
+            par_vel = self.parent.get_velocity_expr()
+            if not self.secondary_parent:
+                modifier = (self.get_parameter('length')+self.q1(self.t))*local
+                own = [sp.diff(modifier*sp.sin(self.q2(self.t)), self.t), sp.diff(-modifier*sp.cos(self.q2(self.t)), self.t)]
+                return [par_vel[0]+own[0], par_vel[1]+own[1]]
+            par_vel2 = self.secondary_parent.get_velocity_expr()
+            par_pos = self.parent.get_position_expr()
+            par_pos2 = self.secondary_parent.get_position_expr()
+            dlocal = sp.diff(local, self.t)
+            return [(1-local)*par_vel[0]+local*par_vel2[0]+dlocal*(par_pos2[0]-par_pos[0]),
+                    (1-local)*par_vel[1]+local*par_vel2[1]+dlocal*(par_pos2[1]-par_pos[1])]
+        return self.memoize(('l2g_velocity', local), build)
+
+    def plot_points_expr(self):
+        return [self.l2g_expr(0), self.l2g_expr(1)]
     
 
 
@@ -419,11 +621,11 @@ class Spring(Component):
 
     def potential_expr(self,g):
         if not self.secondary_parent:
-            return sp.Rational(1,2)*self.k*self.q1(self.t)**2
+            return sp.Rational(1,2)*self.get_parameter('k')*self.q1(self.t)**2
         pos1 = self.parent.get_position_expr()
         pos2 = self.secondary_parent.get_position_expr()
         x = sp.sqrt((pos1[0]-pos2[0])**2+(pos1[1]-pos2[1])**2)
-        return sp.Rational(1,2)*self.k*x**2
+        return sp.Rational(1,2)*self.get_parameter('k')*x**2
 
 
     def plot(self, t=0):
@@ -433,7 +635,7 @@ class Spring(Component):
 
     def init_plot(self,ax):
         self.ax = ax
-        self.plt_data, = ax.plot([],[],'-y')
+        self.plt_data, = ax.plot([],[],self.plot_format)
 
     def evaluate(self,L):
         if self.secondary_parent:
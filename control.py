@@ -0,0 +1,144 @@
+from time import perf_counter_ns
+
+import numpy as np
+
+from scipy.linalg.lapack import dgesv
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class NumericInputs:
+    """The controlled function of the numeric engine, M*ddq = F + u evaluated numerically"""
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __call__(self, t, y, u, out = None):
+        M, F = self.engine.evaluate(t, y)
+        n = len(F)
+        if out is None:
+            out = np.empty(n*n+n)
+        out[:n*n] = M.ravel()
+        np.add(F, u, out=out[n*n:])
+        return out
+
+
+class NumericOutputs:
+    """The plot points of the numeric engine with the call signature of the compiled functions"""
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __call__(self, t, y, out = None):
+        points = self.engine.points(t, y).ravel()
+        if out is None:
+            return points
+        out[:] = points
+        return out
+
+
+class Stepper:
+    """Advances a simulation in real time with fixed Runge-Kutta steps under external generalized forces.
+
+    function(t, y, u, out) evaluates the n*n entries of the mass matrix followed by the right
+    side F + u of the Euler-Lagrange equations M*ddq = F + u, u being the generalized forces on
+    the DOFs: a torque on a Connector, a force along the track on a Trolley, the stretching force
+    and the torque on a Spring. The input is held between the steps. The state, the stages and
+    the matrix are buffers allocated once and the stages are combined in place, only lapack
+    allocates its pivot indices in every solve and the numeric engine its M and F in every
+    evaluation. The wall time of every step is kept for statistics. outputs optionally evaluates
+    the plot points into the buffer output after every step.
+    """
+    def __init__(self, function, dofs, x0, t0 = 0, substeps = 1, outputs = None, points = 0, history = 4096):
+        n = len(dofs)
+        self.function = function
+        self.dofs = list(dofs)
+        self.n = n
+        self.substeps = substeps
+        self.t = float(t0)
+        self.y = np.array(x0, dtype=float)
+        self.u = np.zeros(n)
+        self.k = np.empty((4, 2*n))
+        self.tmp = np.empty(2*n)
+        self.buffer = np.empty(n*n+n)
+        self.mass = self.buffer[:n*n].reshape(n, n)
+        self.force = self.buffer[n*n:]
+        self.M = np.empty((n, n), order='F')
+        self.b = np.empty(n)
+        self.outputs = outputs
+        self.output = np.empty(2*points)
+        self.latencies = np.zeros(history, dtype=np.int64)
+        self.count = 0
+        if outputs is not None:
+            outputs(self.t, self.y, out=self.output)
+
+    def index(self, object):
+        """Returns the positions of the DOFs of a component in u"""
+        return [self.dofs.index(str(s[0])) for s in object.get_symbol()]
+
+    def reset(self, x0, t0 = 0):
+        """Restarts at the state x0 at time t0 without input and clears the statistics"""
+        self.y[:] = x0
+        self.t = float(t0)
+        self.u[:] = 0
+        self.count = 0
+
+    def derivative(self, t, y, out):
+        self.function(t, y, self.u, out=self.buffer)
+        # copied into the column major matrix which lapack overwrites
+        self.M[...] = self.mass
+        self.b[...] = self.force
+        lu, piv, ddq, info = dgesv(self.M, self.b, overwrite_a=True, overwrite_b=True)
+        if info > 0:
+            raise np.linalg.LinAlgError("Singular mass matrix at t = {}".format(t))
+        out[0::2] = y[1::2]
+        out[1::2] = ddq
+        return out
+
+    def step(self, dt, u = None):
+        """Advances the state by dt with the generalized forces u (or the last ones) and returns the state buffer"""
+        start = perf_counter_ns()
+        if u is not None:
+            self.u[:] = u
+        h = dt/self.substeps
+        k1, k2, k3, k4 = self.k
+        y = self.y
+        tmp = self.tmp
+        for i in range(self.substeps):
+            t = self.t
+            self.derivative(t, y, k1)
+            np.multiply(k1, h/2, out=tmp)
+            tmp += y
+            self.derivative(t+h/2, tmp, k2)
+            np.multiply(k2, h/2, out=tmp)
+            tmp += y
+            self.derivative(t+h/2, tmp, k3)
+            np.multiply(k3, h, out=tmp)
+            tmp += y
+            self.derivative(t+h, tmp, k4)
+            # y += h/6*(k1 + 2*k2 + 2*k3 + k4), accumulated in k2
+            k2 += k3
+            k2 *= 2
+            k2 += k1
+            k2 += k4
+            k2 *= h/6
+            y += k2
+            self.t = t+h
+        if self.outputs is not None:
+            self.outputs(self.t, y, out=self.output)
+        self.latencies[self.count % len(self.latencies)] = perf_counter_ns()-start
+        self.count += 1
+        return y
+
+    def statistics(self):
+        """Returns the latency statistics of the last steps in microseconds.
+
+        The keys are 'steps', 'mean', 'std', 'min', 'p50', 'p99', 'p999' and 'max', computed over
+        the last history steps.
+        """
+        latencies = self.latencies[:min(self.count, len(self.latencies))]/1e3
+        if not len(latencies):
+            return {'steps': 0}
+        p50, p99, p999 = np.percentile(latencies, [50, 99, 99.9])
+        return {'steps': self.count, 'mean': latencies.mean(), 'std': latencies.std(), 'min': latencies.min(),
+                'p50': p50, 'p99': p99, 'p999': p999, 'max': latencies.max()}
@@ -1,9 +1,11 @@
 from components import FixPoint, Connector, Point
-from simulation import Simulation
+from simulation import Simulation, configure_logging
 
 import numpy as np
 import sympy as sp
 
+configure_logging()
+
 sim = Simulation(g=1,subintegrations=20)
 
 r = 0.1
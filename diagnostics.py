@@ -0,0 +1,83 @@
+import numpy as np
+
+from compiler import CompiledFunction
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class Diagnostics:
+    """Compiled energies of a simulation, evaluated for whole trajectories at once.
+
+    The Hamiltonian H, the total kinetic and potential energy T and U and the energies of every
+    single component are compiled into one vectorized function. All methods take the times t of
+    shape (K,) (or a single time) and the states of shape (K, 2*DOF) as returned by
+    Simulation.integrate.
+    """
+    def __init__(self, function, n_objects, p = None):
+        self.function = function
+        self.n_objects = n_objects
+        self.p = p
+
+    @classmethod
+    def compile(cls, sim):
+        expressions = sim.derive()
+        energies = expressions['energies']
+        T = sum(e[0] for e in energies)
+        U = sum(e[1] for e in energies)
+        exprs = [expressions['H'], T, U] + [e[0] for e in energies] + [e[1] for e in energies]
+        function = CompiledFunction(exprs, sim.get_arguments(), name='energies', vectorized=True)
+        return cls(function, len(energies))
+
+    def bind(self, p):
+        """Returns the diagnostics for the parameter values p"""
+        return Diagnostics(self.function, self.n_objects, p)
+
+    def _evaluate(self, t, y):
+        y = np.asarray(y, dtype=float)
+        t = np.broadcast_to(np.asarray(t, dtype=float), y.shape[:-1])
+        args = (t, y.T) if self.p is None else (t, y.T, self.p)
+        return self.function(*args)
+
+    def evaluate(self, t, y):
+        """Returns a dict with the arrays 'H', 'T' and 'U' and the per component energies 'kinetic' and 'potential' of shape (K, number of objects)"""
+        E = self._evaluate(t, y)
+        n = self.n_objects
+        return {'H': E[0], 'T': E[1], 'U': E[2], 'kinetic': E[3:3+n].T, 'potential': E[3+n:].T}
+
+    def energy(self, t, y):
+        """Returns the Hamiltonian"""
+        return self._evaluate(t, y)[0]
+
+    def energy_drift(self, t, y):
+        """Returns the relative deviation of the Hamiltonian from its value at the first state.
+
+        Only systems without dampening and moving FixGroup components conserve the energy, for all
+        others the drift is physical and not a numerical error.
+        """
+        H = self.energy(t, y)
+        H0 = H.flat[0]
+        return np.abs(H-H0)/max(abs(H0), 1e-12)
+
+
+class EnergyMonitor:
+    """Watches the energy drift of a running integration and warns once it exceeds tolerance"""
+    def __init__(self, diagnostics, tolerance = 1e-3):
+        self.diagnostics = diagnostics
+        self.tolerance = tolerance
+        self.H0 = None
+        self.max_drift = 0
+        self.warned = False
+
+    def check(self, t, y):
+        """Returns the relative drift of the state y at time t compared to the first checked state"""
+        H = float(self.diagnostics.energy(t, y))
+        if self.H0 is None:
+            self.H0 = H
+        drift = abs(H-self.H0)/max(abs(self.H0), 1e-12)
+        self.max_drift = max(self.max_drift, drift)
+        if drift > self.tolerance and not self.warned:
+            logger.warning("Energy drift %.2e exceeds the tolerance %.2e at t = %s", drift, self.tolerance, t)
+            self.warned = True
+        return drift
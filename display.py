@@ -0,0 +1,264 @@
+"""The interactive matplotlib layer of a Simulation.
+
+Nothing here is imported by the model, derivation and integration modules, matplotlib is only
+loaded once a figure is actually opened.
+"""
+import numpy as np
+
+from time import time
+
+from components import Point, Trolley
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+def init_figure(sim):
+    """Creates the matplotlib figure of sim. Only needed for the animated output, the headless integration never calls it."""
+    if sim.fig is None:
+        import matplotlib.pyplot as plt
+        sim.fig = plt.figure(figsize=(20,10))
+        sim.ax = sim.fig.add_subplot(111,aspect='equal', autoscale_on=False, xlim=sim.xlim, ylim=sim.ylim)
+    return sim.fig
+
+
+def init_plot(sim):
+    init_figure(sim)
+    for object in sim.Objects:
+        object.init_plot(sim.ax)
+
+
+def plot(sim, t = 0, x = None):
+    """Updates the artists of all objects. If the state x is given, the compiled kinematics are used."""
+    res = []
+
+    if x is not None:
+        kinematics = sim.get_kinematics()
+        points = kinematics.positions(t, x)
+        for object, s in zip(sim.Objects, kinematics.slices):
+            res.append(object.draw(points[s]))
+        return res
+
+    for object in sim.Objects:
+        res.append(object.plot(t))
+    return res
+
+
+def _color(fmt):
+    """Returns the color of a matplotlib format string like 'og' or '-k'"""
+    return ''.join(c for c in fmt if c in 'bgrcmykw') or 'k'
+
+
+class CollectionRenderer:
+    """Draws all components of a simulation with a fixed number of artists.
+
+    All markers (FixPoints, Points and Trolleys) form one scatter collection, all lines
+    (Connectors, Springs, FixLines and FixCurves) one LineCollection and all FixCircles one
+    EllipseCollection. The index arrays into the plot points of the compiled kinematics are built
+    once, every frame updates each collection with a single array assignment. With trail > 0 the
+    last trail positions of every mass are kept in a ring buffer and drawn as one more
+    LineCollection.
+    """
+    def __init__(self, sim, trail = 0):
+        self.sim = sim
+        self.trail = trail
+        self.markers = []
+        self.marker_colors = []
+        self.masses = []
+        self.segments = []
+        self.segment_colors = []
+        self.circles = []
+        self.radii = []
+        for object, s in zip(sim.Objects, sim.get_kinematics().slices):
+            kind, argument = object.artist_spec()
+            points = list(range(s.start, s.stop))
+            if kind == 'circle':
+                self.circles.append(points[0])
+                self.radii.append(argument)
+            elif 'o' in argument:
+                self.markers.extend(points)
+                self.marker_colors.extend([_color(argument)]*len(points))
+                if isinstance(object, (Point, Trolley)):
+                    # only the mass points move on their own and leave a trail
+                    self.masses.extend(points)
+            else:
+                self.segments.extend(zip(points[:-1], points[1:]))
+                self.segment_colors.extend([_color(argument)]*(len(points)-1))
+        self.markers = np.array(self.markers, dtype=int)
+        self.masses = np.array(self.masses, dtype=int)
+        self.segments = np.array(self.segments, dtype=int).reshape(-1, 2)
+        self.circles = np.array(self.circles, dtype=int)
+        self.history = np.zeros((trail, len(self.masses), 2))
+        self.head = 0
+        self.filled = 0
+
+    def init_plot(self, ax):
+        from matplotlib.collections import LineCollection, EllipseCollection
+        self.ax = ax
+        self.lines = LineCollection([], colors=self.segment_colors)
+        ax.add_collection(self.lines)
+        diameters = 2*np.array(self.radii)
+        options = {'units': 'xy', 'offsets': np.zeros((len(self.radii), 2)), 'facecolors': 'none', 'edgecolors': 'black'}
+        try:
+            self.circle_collection = EllipseCollection(diameters, diameters, np.zeros(len(self.radii)),
+                                                       offset_transform=ax.transData, **options)
+        except (AttributeError, TypeError):
+            # matplotlib < 3.6 only knows the old name of the argument
+            self.circle_collection = EllipseCollection(diameters, diameters, np.zeros(len(self.radii)),
+                                                       transOffset=ax.transData, **options)
+        ax.add_collection(self.circle_collection)
+        self.trails = LineCollection([], colors='0.6', linewidths=0.8)
+        ax.add_collection(self.trails)
+        self.scatter = ax.scatter(np.zeros(len(self.markers)), np.zeros(len(self.markers)), c=self.marker_colors, zorder=3)
+        self.artists = [self.lines, self.circle_collection, self.trails, self.scatter]
+
+    def draw(self, points):
+        """Updates the collections from the plot points of one state, returns the artists"""
+        self.lines.set_segments(points[self.segments])
+        self.circle_collection.set_offsets(points[self.circles])
+        self.scatter.set_offsets(points[self.markers])
+        if self.trail:
+            self.history[self.head] = points[self.masses]
+            self.head = (self.head+1) % self.trail
+            self.filled = min(self.filled+1, self.trail)
+            order = (self.head-self.filled+np.arange(self.filled)) % self.trail
+            self.trails.set_segments(self.history[order].transpose(1, 0, 2))
+        return self.artists
+
+    def clear_trails(self):
+        self.filled = 0
+
+
+def run(sim, pipelined = False, buffer_size = 256, collections = False, trail = 0):
+    """Animates sim in a matplotlib window, see Simulation.run"""
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    sim.derive()
+    if collections:
+        renderer = CollectionRenderer(sim, trail)
+        init_figure(sim)
+        renderer.init_plot(sim.ax)
+        kinematics = sim.get_kinematics()
+
+        def update_artists(t, y):
+            return list(renderer.draw(kinematics.positions(t, y)))
+    else:
+        init_plot(sim)
+
+        def update_artists(t, y):
+            return plot(sim, t, y)
+    update_artists(0, np.array(sim.get_x0(), dtype=float))
+    diagnostics = sim.get_diagnostics()
+
+    x0 = sim.get_x0()
+    logger.debug("x0 = %s", x0)
+
+    time_template = 'time = %.1fs'
+    energy_template = 'energy = %.1f'
+    time_text = sim.ax.text(0.05, 0.9, '', transform=sim.ax.transAxes)
+    energy_text = sim.ax.text(0.05,0.87,'', transform=sim.ax.transAxes)
+
+    def draw(t, y):
+        sim.update(y)
+        res = update_artists(t, y)
+        if sim.show_information:
+            time_text.set_text(time_template % t)
+            energy_text.set_text(energy_template % diagnostics.energy(t,y))
+            res.extend([time_text,energy_text])
+        return tuple(res)
+    draw = sim.profiler.count_calls(draw, 'frames', timed=True)
+
+    if pipelined:
+        from pipeline import IntegrationProducer
+        producer = IntegrationProducer(sim.get_rhs(), x0, 0, sim.dt, sim.subintegrations, buffer_size,
+                                       sim.integrator, sim.get_integrator_jacobian(sim.integrator))
+        producer.start()
+        state = [0., np.array(x0, dtype=float)]
+
+        def animate(i):
+            item = producer.get()
+            if item is not None:
+                state[:] = item
+            elif producer.failed.is_set():
+                # the states before the failure are drawn already
+                logger.error("The integration failed after t = %s, stopping the animation", state[0])
+                anim.event_source.stop()
+            return draw(*state)
+
+        interval = 1000 * sim.dt
+        anim = animation.FuncAnimation(sim.fig, animate, frames=None, interval=interval,
+                                       blit = True, cache_frame_data = False)
+    else:
+        r = sim.create_integrator(sim.profiler.count_calls(sim.get_rhs(), 'rhs'), x0)
+
+        def animate(i):
+            for i in range(sim.subintegrations):
+                r.integrate(r.t+sim.dt/sim.subintegrations)
+            if not r.successful():
+                logger.warning("Integration failed at t = %s, skipping the frame", r.t)
+                r.t += sim.dt
+            return draw(r.t, r.y)
+
+        t0 = time()
+        animate(0)
+        t1 = time()
+        interval = 1000 * sim.dt - (t1 - t0)
+
+        anim = animation.FuncAnimation(sim.fig, animate, frames=300,
+                                      interval=interval, blit = True)
+
+    if sim.movie:
+        sim.render('lagrange.mp4', (0, 300*sim.dt))
+
+    logger.debug("Starting animation")
+    try:
+        plt.show()
+    finally:
+        if pipelined:
+            producer.stop()
+    logger.debug("Finished animation")
+
+
+def replay(sim, reader, interval = None, collections = False, trail = 0):
+    """Animates the frames of a storage.TrajectoryReader with the artists of sim without integrating.
+
+    Recorded positions are drawn directly, otherwise they are evaluated from the recorded
+    states with the compiled kinematics. interval defaults to the dt of the recording.
+    collections and trail select the CollectionRenderer as in run.
+    """
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    if collections:
+        renderer = CollectionRenderer(sim, trail)
+        init_figure(sim)
+        renderer.init_plot(sim.ax)
+    else:
+        init_plot(sim)
+    time_text = sim.ax.text(0.05, 0.9, '', transform=sim.ax.transAxes)
+    slices = reader.slices if reader.has_positions else None
+
+    def animate(i):
+        t, y = reader[i]
+        sim.update(y)
+        if slices is None and not collections:
+            res = plot(sim, t, y)
+        else:
+            points = reader.positions(i) if slices is not None else sim.get_kinematics().positions(t, y)
+            if collections:
+                res = list(renderer.draw(points))
+            else:
+                res = [object.draw(points[s]) for object, s in zip(sim.Objects, slices)]
+        if sim.show_information:
+            time_text.set_text('time = %.1fs' % t)
+            res.append(time_text)
+        return tuple(res)
+
+    if interval is None:
+        interval = 1000 * reader.meta['dt']
+    anim = animation.FuncAnimation(sim.fig, animate, frames=len(reader), interval=interval, blit = True)
+    logger.debug("Replaying %s frames of %s", len(reader), reader.path)
+    plt.show()
+    return anim
@@ -0,0 +1,55 @@
+import numpy as np
+import sympy as sp
+
+from compiler import compile_function
+
+
+class Event:
+    """A root of a scalar expression of the time and the state, which is located during the integration.
+
+    expression is a sympy expression in the DOFs of the components (e.g. the height of a point
+    P1.get_position_expr()[1] - 0.5) or a function without arguments returning one. The function
+    is only called once the DOFs are set up, which allows building the expression before the
+    simulation derived its equations. A terminal event stops the integration, direction
+    restricts the event to rising (+1) or falling (-1) zero crossings.
+    """
+    def __init__(self, expression, name = None, terminal = False, direction = 0):
+        self.expression = expression
+        self.name = name
+        self.terminal = terminal
+        self.direction = direction
+
+    def get_expression(self):
+        if isinstance(self.expression, sp.Basic) or not callable(self.expression):
+            return sp.sympify(self.expression)
+        return sp.sympify(self.expression())
+
+
+class CompiledEvent:
+    """The compiled expression of an Event with the event(t, y) interface of scipy.integrate.solve_ivp"""
+    def __init__(self, function, name, terminal = False, direction = 0, p = None):
+        self.function = function
+        self.name = name
+        self.terminal = terminal
+        self.direction = direction
+        self.p = p
+        self.out = np.empty(1)
+
+    def __call__(self, t, y):
+        if self.p is None:
+            return self.function(t, y, out=self.out)[0]
+        return self.function(t, y, self.p, out=self.out)[0]
+
+    def bind(self, p):
+        return CompiledEvent(self.function, self.name, self.terminal, self.direction, p)
+
+
+def compile_events(sim, events):
+    """Compiles the events for the state layout of sim, unnamed events are named by their index"""
+    sim.derive()
+    exprs = [event.get_expression() for event in events]
+    for object in sim.Objects:
+        object.substitude_symbols(exprs)
+    return [CompiledEvent(compile_function([expr], sim.get_arguments(), name='event', backend=sim.backend),
+                          event.name if event.name is not None else i, event.terminal, event.direction)
+            for i, (event, expr) in enumerate(zip(events, exprs))]
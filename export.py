@@ -0,0 +1,194 @@
+"""Exports a derived simulation into a standalone python module which only needs numpy.
+
+The generated module holds the source of the compiled functions together with the state layout,
+the initial conditions and the parameters. Worker processes load it in milliseconds without
+importing sympy, scipy or the components.
+"""
+import os
+import importlib.util
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+EXPORT_VERSION = 1
+
+HEADER = '''"""A model exported by Lagrange-Mechanics, it only depends on numpy.
+
+Components: {components}
+
+The states y follow the layout of STATE, the initial conditions are X0. p is the vector of the
+PARAMETERS in their order, the defaults are P. rhs(t, y, p=P, out=None) is the right hand side
+of the first order system{jacobian_note}. energy, energies and positions take the times t of
+shape (K,) and the states of shape (K, 2*DOF) or a single time and state.
+"""
+import math
+
+import numpy
+
+EXPORT_VERSION = {version}
+FORMULATION = {formulation!r}
+STATE = {state!r}
+DOF = {dof!r}
+X0 = numpy.array({x0!r})
+PARAMETERS = {parameters!r}
+P = numpy.array(list(PARAMETERS.values()), dtype=float)
+N_OBJECTS = {n_objects!r}
+SLICES = [slice(start, stop) for start, stop in {slices!r}]
+
+'''
+
+RHS_SOLVE = '''
+def rhs(t, y, p=P, out=None):
+    if out is None:
+        out = numpy.empty(2*len(DOF))
+    return _rhs({call}, out)
+'''
+
+RHS_MASS_MATRIX = '''
+_buffer = numpy.empty(len(DOF)*len(DOF)+len(DOF))
+
+
+def rhs(t, y, p=P, out=None):
+    n = len(DOF)
+    if out is None:
+        out = numpy.empty(2*n)
+    buffer = _mass_matrix({call}, _buffer)
+    out[0::2] = y[1::2]
+    out[1::2] = numpy.linalg.solve(buffer[:n*n].reshape(n, n), buffer[n*n:])
+    return out
+'''
+
+JACOBIAN_SOLVE = '''
+ROWS = numpy.array({rows!r}, dtype=int)
+COLS = numpy.array({cols!r}, dtype=int)
+
+
+def jacobian(t, y, p=P):
+    J = numpy.zeros((2*len(DOF), 2*len(DOF)))
+    J[ROWS, COLS] = _jacobian({call}, numpy.empty(len(ROWS)))
+    return J
+'''
+
+JACOBIAN_MASS_MATRIX = '''
+def jacobian(t, y, p=P):
+    n = len(DOF)
+    buffer = _mass_matrix({call}, numpy.empty(n*n+n))
+    M = buffer[:n*n].reshape(n, n)
+    a = numpy.linalg.solve(M, buffer[n*n:])
+    D = _residual_jacobian({residual_call}, numpy.empty(2*n*n)).reshape(n, 2*n)
+    J = numpy.zeros((2*n, 2*n))
+    J[numpy.arange(0, 2*n, 2), numpy.arange(1, 2*n, 2)] = 1
+    J[1::2] = -numpy.linalg.solve(M, D)
+    return J
+'''
+
+VECTORIZED = '''
+def _vectorized(function, size, t, y, p):
+    y = numpy.asarray(y, dtype=float)
+    t = numpy.broadcast_to(numpy.asarray(t, dtype=float), y.shape[:-1])
+    return function({vectorized_call}, numpy.empty((size,) + y.shape[:-1]))
+
+
+def energies(t, y, p=P):
+    """Returns a dict with 'H', 'T' and 'U' and the per component energies 'kinetic' and 'potential'"""
+    E = _vectorized(_energies, 3+2*N_OBJECTS, t, y, p)
+    return {{'H': E[0], 'T': E[1], 'U': E[2], 'kinetic': E[3:3+N_OBJECTS].T, 'potential': E[3+N_OBJECTS:].T}}
+
+
+def energy(t, y, p=P):
+    """Returns the Hamiltonian"""
+    return _vectorized(_energies, 3+2*N_OBJECTS, t, y, p)[0]
+
+
+def positions(t, y, p=P):
+    """Returns the global coordinates of all plot points, the points of the i-th component are positions[..., SLICES[i], :]"""
+    out = _vectorized(_positions, {points}, t, y, p)
+    return numpy.moveaxis(out.reshape((-1, 2) + out.shape[1:]), (0, 1), (-2, -1))
+'''
+
+
+def _rename(function, name):
+    """Returns the generated source of a CompiledFunction with the function renamed"""
+    return function.source.replace('def {}('.format(function.name), 'def {}('.format(name), 1)
+
+
+def generate(sim, jacobian = True, parameters = None):
+    """Returns the source of the standalone module of sim.
+
+    parameters sets the defaults P of the module as in get_parameter_values, the other values
+    can still be passed to every function. With jacobian the analytic jacobian of the first order
+    system is exported as well.
+    """
+    if sim.engine == 'numeric':
+        raise ValueError("The numeric engine derives no expressions which could be exported")
+    expressions = sim.derive()
+    args = sim.get_arguments()
+    call = ", ".join(arg for arg, symbols in args)
+    kinematics = sim.get_kinematics()
+    diagnostics = sim.get_diagnostics()
+    parts = [HEADER.format(
+        components=", ".join(type(object).__name__ for object in sim.Objects),
+        jacobian_note=" and jacobian(t, y, p=P) its jacobian" if jacobian else "",
+        version=EXPORT_VERSION,
+        formulation=sim.formulation,
+        state=[str(s) for s in sim.get_state_symbols()],
+        dof=[str(s[0]) for s in sim.get_symbols()],
+        x0=[float(x) for x in sim.get_x0()],
+        parameters={str(symbol): float(value) for (symbol, default), value in
+                    zip(sim.parameters, sim.get_parameter_values(parameters))},
+        n_objects=len(sim.Objects),
+        slices=[(s.start, s.stop) for s in kinematics.slices])]
+
+    # the python source of the numpy backend is exported whatever backend sim uses
+    rhs = sim.get_compiled_rhs('numpy')
+    parts.append(_rename(rhs, '_' + rhs.name))
+    if sim.formulation == 'mass_matrix':
+        parts.append(RHS_MASS_MATRIX.format(call=call))
+    else:
+        parts.append(RHS_SOLVE.format(call=call))
+
+    if jacobian:
+        key = ('jacobian', 'numpy')
+        if key not in sim.compiled:
+            sim.compiled[key] = sim.compile_jacobian(expressions, 'numpy')
+        function, sparsity = sim.compiled[key]
+        parts.append(_rename(function, '_' + function.name))
+        if sim.formulation == 'mass_matrix':
+            residual_call = ", ".join(arg for arg, symbols in sim.get_arguments([('a', [])]))
+            parts.append(JACOBIAN_MASS_MATRIX.format(call=call, residual_call=residual_call))
+        else:
+            rows, cols = np.nonzero(sparsity)
+            parts.append(JACOBIAN_SOLVE.format(call=call, rows=rows.tolist(), cols=cols.tolist()))
+
+    parts.append(_rename(diagnostics.function, '_energies'))
+    parts.append(_rename(kinematics.function, '_positions'))
+    vectorized_call = ", ".join({'y': 'y.T'}.get(arg, arg) for arg, symbols in args)
+    points = kinematics.slices[-1].stop*2 if kinematics.slices else 0
+    parts.append(VECTORIZED.format(vectorized_call=vectorized_call, points=points))
+    return "\n".join(parts)
+
+
+def export_model(sim, path, jacobian = True, parameters = None):
+    """Writes the standalone module of sim to path, see generate. Returns path."""
+    source = generate(sim, jacobian, parameters)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as file:
+        file.write(source)
+    os.replace(tmp, path)
+    logger.debug("Exported the model to %s", path)
+    return path
+
+
+def load_model(path, name = None):
+    """Imports an exported module from path without importing sympy or the rest of the package"""
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if module.EXPORT_VERSION != EXPORT_VERSION:
+        raise ValueError("Unsupported export version {}".format(module.EXPORT_VERSION))
+    return module
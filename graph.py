@@ -0,0 +1,235 @@
+import hashlib
+
+from collections import OrderedDict
+
+import sympy as sp
+
+from cache import _serialize
+from components import Trolley
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class GraphError(ValueError):
+    """Raised for component graphs which break the generation rules"""
+
+
+class ComponentGraph:
+    """The components of a simulation linked by their get_parents.
+
+    validate checks the generation rules of the README, order returns the components such that
+    every one follows its parents and ancestors the sub graph a component depends on.
+    """
+    def __init__(self, objects):
+        self.objects = list(objects)
+        self.index = {id(object): i for i, object in enumerate(self.objects)}
+
+    def name(self, object):
+        return "{} {}".format(type(object).__name__, self.index.get(id(object), '?'))
+
+    def children(self, object):
+        return [child for child in self.objects if any(parent is object for parent in child.get_parents())]
+
+    def descendants(self, object):
+        """Returns all components which are attached to object directly or through others"""
+        result = []
+        seen = {id(object)}
+        stack = [object]
+        while stack:
+            for child in self.children(stack.pop()):
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    result.append(child)
+                    stack.append(child)
+        return result
+
+    def validate(self):
+        """Raises a GraphError if a component breaks the generation rules.
+
+        FixGroup components are attached to nothing, all others to one component (a Spring to
+        at most two) which was added to the simulation, and 1d components attach to 0d ones and
+        vice versa. Components which declare no dimension are not checked.
+        """
+        for object in self.objects:
+            parents = object.get_parents()
+            if object.fixed and parents:
+                raise GraphError("{} belongs to the FixGroup and can not be attached to another component".format(self.name(object)))
+            if not object.fixed and object.dimension is not None and not 1 <= len(parents) <= object.max_parents:
+                raise GraphError("{} must be attached to at least one and at most {} components, not {}".format(
+                    self.name(object), object.max_parents, len(parents)))
+            for parent in parents:
+                if id(parent) not in self.index:
+                    raise GraphError("{} is attached to a {} which was not added to the simulation".format(
+                        self.name(object), type(parent).__name__))
+                if object.dimension is not None and parent.dimension == object.dimension:
+                    raise GraphError("{} is {}d and can not be attached to the {}d {}".format(
+                        self.name(object), object.dimension, parent.dimension, self.name(parent)))
+                if isinstance(object, Trolley) and not parent.fixed:
+                    logger.warning("%s can move along the infinite line spanned by %s", self.name(object), self.name(parent))
+
+    def order(self):
+        """Returns the components sorted such that every component follows its parents.
+
+        The order in which the components were added is kept wherever it is valid already, such
+        that the DOF numbering of a correctly built simulation does not change. Raises a
+        GraphError for cycles.
+        """
+        pending = [sum(id(parent) in self.index for parent in object.get_parents()) for object in self.objects]
+        children = [[] for object in self.objects]
+        for i, object in enumerate(self.objects):
+            for parent in object.get_parents():
+                if id(parent) in self.index:
+                    children[self.index[id(parent)]].append(i)
+        ordered = []
+        ready = [i for i in range(len(self.objects)) if pending[i] == 0]
+        while ready:
+            # always the earliest added component whose parents are placed
+            i = min(ready)
+            ready.remove(i)
+            ordered.append(self.objects[i])
+            for child in children[i]:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    ready.append(child)
+        if len(ordered) < len(self.objects):
+            cycle = [self.name(object) for i, object in enumerate(self.objects) if pending[i] > 0]
+            raise GraphError("The components {} are attached to each other in a cycle".format(", ".join(cycle)))
+        return ordered
+
+    def ancestors(self, object):
+        """Returns object followed by every component it is attached to directly or through others, in depth first order"""
+        result = []
+        seen = set()
+        stack = [object]
+        while stack:
+            current = stack.pop()
+            if id(current) in seen:
+                continue
+            seen.add(id(current))
+            result.append(current)
+            stack.extend(reversed(current.get_parents()))
+        return result
+
+
+def _symbols(objects, symbolic):
+    """Returns the DOF and parameter symbols of objects in a fixed order"""
+    symbols = []
+    for object in objects:
+        for s in object.get_symbol():
+            symbols.extend(s)
+        if symbolic:
+            symbols.extend(object.parameter_symbols[name] for name in object.parameters)
+    return symbols
+
+
+class ContributionCache:
+    """The terms every component adds to the mass matrix formulation, reused between derivations.
+
+    The kinetic and the potential energy of a component only depend on the components it hangs
+    from. Its share of the Euler-Lagrange equations, M_i*ddQ = F_i for the DOFs of these
+    ancestors, is therefore derived from its own energies alone and M and F are the sums of the
+    shares. The shares are stored under a key of the sub graph of ancestors (classes, links and
+    structural parameters, but not the numbering), after adding, removing or changing a component
+    only the shares of that component and the ones attached below it are derived again. A share
+    derived with other DOF or parameter numbers is renamed with xreplace.
+
+    At most max_entries shares are kept in memory, the least recently used ones are dropped first.
+    """
+    def __init__(self, max_entries = 1024):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries = OrderedDict()
+
+    def key(self, sim, ancestors, descriptions):
+        position = {id(object): k for k, object in enumerate(ancestors)}
+        parts = ["{}{}".format(descriptions[id(object)], [position[id(parent)] for parent in object.get_parents()])
+                 for object in ancestors]
+        parts.append(_serialize(sim.symbolic_parameters or sim.g))
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def describe(self, sim, object):
+        parameters = object.get_parameters()
+        for name in object.parameters:
+            # symbolic parameters only enter by their symbol, which is renamed on reuse
+            parameters[name] = 'symbol' if sim.symbolic_parameters else getattr(object, name)
+        return "{}{}".format(type(object).__name__, [(name, _serialize(value)) for name, value in sorted(parameters.items())])
+
+    def derive(self, sim, object, ancestors):
+        """Returns the energies and the share M_i, F_i of one component for the DOFs of its ancestors.
+
+        With L_i = T_i - U_i in the Q and dQ symbols and the momenta p_a = dL_i/ddQ_a the
+        Euler-Lagrange equations give M_ab = dp_a/ddQ_b and
+        F_a = dL_i/dQ_a - sum_b dp_a/dQ_b*dQ_b - dp_a/dt - c_a*p_a for the dampening c_a of the DOF.
+        """
+        E = [object.kinetic_expr(), object.potential_expr(sim.get_g())]
+        for ancestor in ancestors:
+            ancestor.substitude_symbols(E)
+        T, U = [sim.simplify(e) for e in E]
+        dofs = [s for ancestor in ancestors for s in ancestor.get_symbol()]
+        dampening = [c for ancestor in ancestors for c in ancestor.dampening_expr()]
+        n = len(dofs)
+        M = sp.zeros(n, n)
+        F = sp.zeros(n, 1)
+        L = sim.simplify(T-U)
+        if L == 0:
+            return {'T': T, 'U': U, 'M': M, 'F': F}
+        p = [sp.diff(L, s[1]) for s in dofs]
+        for a in range(n):
+            for b in range(a, n):
+                # M is symmetric
+                M[a, b] = M[b, a] = sp.trigsimp(sp.diff(p[a], dofs[b][1]))
+            F[a] = sp.expand(sp.diff(L, dofs[a][0]) - sum(sp.diff(p[a], s[0])*s[1] for s in dofs)
+                             - sp.diff(p[a], sim.t) - dampening[a]*p[a])
+        return {'T': T, 'U': U, 'M': M, 'F': F}
+
+    def assemble(self, sim, graph):
+        """Returns the expressions of Simulation.derive for the mass matrix formulation"""
+        symbols = sim.get_symbols()
+        column = {s[0]: i for i, s in enumerate(symbols)}
+        M = sp.zeros(len(symbols), len(symbols))
+        F = sp.zeros(len(symbols), 1)
+        energies = []
+        derived = 0
+        descriptions = {id(object): self.describe(sim, object) for object in sim.Objects}
+        for object in sim.Objects:
+            ancestors = graph.ancestors(object)
+            key = self.key(sim, ancestors, descriptions)
+            current = _symbols(ancestors, sim.symbolic_parameters)
+            entry = self.entries.get(key)
+            if entry is None:
+                derived += 1
+                with sim.profiler.phase('derive_component') as phase:
+                    entry = self.derive(sim, object, ancestors)
+                    phase.measure(list(entry['M'])+list(entry['F']))
+                entry['symbols'] = current
+                self.entries[key] = entry
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            else:
+                self.entries.move_to_end(key)
+            share = [entry['T'], entry['U'], entry['M'], entry['F']]
+            renaming = {old: new for old, new in zip(entry['symbols'], current) if old != new}
+            if renaming:
+                share = [expr.xreplace(renaming) for expr in share]
+            T, U, Mi, Fi = share
+            energies.append((T, U))
+            rows = [column[s[0]] for ancestor in ancestors for s in ancestor.get_symbol()]
+            for a, i in enumerate(rows):
+                F[i] += Fi[a]
+                for b, j in enumerate(rows):
+                    M[i, j] += Mi[a, b]
+        self.misses += derived
+        self.hits += len(sim.Objects) - derived
+        logger.debug("Derived %s of %s component shares, the others were reused", derived, len(sim.Objects))
+        L = sum((T-U for T, U in energies), sp.Integer(0))
+        H = sum((T+U for T, U in energies), sp.Integer(0))
+        return {'L': L, 'H': H, 'energies': energies, 'M': M, 'F': F}
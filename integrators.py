@@ -0,0 +1,134 @@
+import numpy as np
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class SolverIntegrator:
+    """Gives the step based solvers of scipy.integrate (Radau, BDF, LSODA, RK45, ...) the interface of scipy.integrate.ode.
+
+    The solver takes its own adaptive steps, the states at the requested times are interpolated
+    with the dense output of the last step.
+    """
+    def __init__(self, solver, rhs, x0, t0 = 0, jac = None, **options):
+        if jac is not None:
+            options['jac'] = jac
+        self.solver = solver(lambda t,x: rhs(t,x), t0, np.array(x0, dtype=float), np.inf, **options)
+        self.t = t0
+        self.y = self.solver.y.copy()
+
+    def integrate(self, t):
+        solver = self.solver
+        while solver.t < t and solver.status == 'running':
+            message = solver.step()
+            if solver.status == 'failed':
+                logger.warning("Solver failed at t = %s: %s", solver.t, message)
+        if solver.status == 'failed':
+            self.t, self.y = solver.t, solver.y.copy()
+        elif solver.t == t or solver.t_old is None:
+            self.t, self.y = t, solver.y.copy()
+        else:
+            self.t, self.y = t, solver.dense_output()(t)
+        return self.y
+
+    def successful(self):
+        return self.solver.status != 'failed'
+
+
+# the names of the solver classes in scipy.integrate, which is only imported once an integrator is created
+SOLVERS = {'radau': 'Radau', 'BDF': 'BDF', 'LSODA': 'LSODA', 'RK45': 'RK45', 'RK23': 'RK23', 'DOP853': 'DOP853'}
+
+METHODS = ('adams', 'bdf') + tuple(SOLVERS)
+
+STIFF_METHODS = ('bdf', 'radau', 'BDF', 'LSODA')
+
+
+def create_integrator(rhs, x0, t0 = 0, method = 'adams', jac = None):
+    """Returns an integrator with the interface of scipy.integrate.ode for dx/dt = rhs(t,x).
+
+    'adams' and 'bdf' use vode, the latter with the analytic jacobian jac(t,x) if given. All other
+    methods use the step based solvers of scipy.integrate, which also accept sparse jacobians.
+    """
+    import scipy.integrate
+    if method in SOLVERS:
+        r = SolverIntegrator(getattr(scipy.integrate, SOLVERS[method]), rhs, x0, t0, jac = jac)
+        logger.debug("Initialized %s Integrator", method)
+        return r
+    if method not in ('adams', 'bdf'):
+        raise ValueError("Unknown integration method {}".format(method))
+    out = np.empty(len(x0))
+    if method == 'bdf' and jac is not None:
+        r = scipy.integrate.ode(lambda t,x: rhs(t,x,out=out), jac).set_integrator('vode', method='bdf', with_jacobian=True)
+    else:
+        r = scipy.integrate.ode(lambda t,x: rhs(t,x,out=out)).set_integrator('vode', method=method, with_jacobian=(method == 'bdf'))
+    r.set_initial_value(x0,t0)
+    logger.debug("Initialized Integrator")
+    return r
+
+
+def integrate_ode(rhs, x0, t0, t_eval, method = 'adams', jac = None):
+    """Integrates dx/dt = rhs(t,x) from x0 at t0 and returns the states at t_eval"""
+    r = create_integrator(rhs, x0, t0, method, jac)
+    y = np.empty((len(t_eval), len(x0)))
+    for i,ti in enumerate(t_eval):
+        if ti != r.t:
+            r.integrate(ti)
+        if not r.successful():
+            logger.warning("Integration failed at t = %s", r.t)
+        y[i] = r.y
+    return y
+
+
+class IntegrationError(RuntimeError):
+    """Raised if a solver fails, result holds the states computed up to the failure"""
+    def __init__(self, message, result = None):
+        RuntimeError.__init__(self, message)
+        self.result = result
+
+
+class IntegrationResult:
+    """The outcome of integrate_dense.
+
+    t and y are the sampled times and states (y of shape (len(t), 2*DOF)), events maps the name of
+    every event to the times and states at which it occurred. status is 0 if the end of the time
+    span was reached, 1 if a terminal event stopped the integration and -1 if the solver failed.
+    """
+    def __init__(self, t, y, events, status, message, nfev = 0, njev = 0):
+        self.t = t
+        self.y = y
+        self.events = events
+        self.status = status
+        self.message = message
+        self.nfev = nfev
+        self.njev = njev
+
+    @property
+    def success(self):
+        return self.status >= 0
+
+
+DENSE_METHODS = {'adams': 'LSODA', 'bdf': 'BDF'}
+
+
+def integrate_dense(rhs, x0, t_span, t_eval = None, method = 'adams', jac = None, events = (), rtol = 1e-6, atol = 1e-9):
+    """Integrates dx/dt = rhs(t,x) with adaptive steps and samples t_eval from the dense output of the steps.
+
+    The vode methods are replaced by their ODEPACK and scipy counterparts ('adams' by LSODA, 'bdf'
+    by BDF). events are CompiledEvents, their zero crossings are located by root finding on the
+    dense output. Unlike integrate_ode a failure is not only logged, the status of the returned
+    IntegrationResult is -1.
+    """
+    import scipy.integrate
+    solver = SOLVERS.get(method, DENSE_METHODS.get(method, method))
+    options = {}
+    if jac is not None:
+        options['jac'] = jac
+    solution = scipy.integrate.solve_ivp(lambda t,x: rhs(t,x), t_span, np.array(x0, dtype=float), method=solver,
+                                         t_eval=t_eval, events=list(events) or None, rtol=rtol, atol=atol, **options)
+    found = {}
+    for i, event in enumerate(events):
+        found[event.name] = (solution.t_events[i], solution.y_events[i])
+    if solution.status < 0:
+        logger.warning("Integration failed at t = %s: %s", solution.t[-1] if len(solution.t) else t_span[0], solution.message)
+    return IntegrationResult(solution.t, solution.y.T, found, solution.status, solution.message, solution.nfev, solution.njev)
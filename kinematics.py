@@ -0,0 +1,58 @@
+import numpy as np
+import sympy as sp
+
+from compiler import CompiledFunction
+
+
+class Kinematics:
+    """Compiled global coordinates of the plot points of all components.
+
+    The position expressions of every component (see Component.plot_points_expr) are compiled
+    into one vectorized function. positions evaluates it for a whole trajectory, the points of
+    the i-th object are positions[..., slices[i], :].
+    """
+    def __init__(self, function, slices, p = None):
+        self.function = function
+        self.slices = slices
+        self.p = p
+
+    @staticmethod
+    def expressions(sim):
+        """Returns the x and y coordinates of all plot points in the Q and dQ symbols and the slices of every object"""
+        sim.derive()
+        exprs = []
+        slices = []
+        for object in sim.Objects:
+            points = object.plot_points_expr()
+            slices.append(slice(len(exprs)//2, len(exprs)//2+len(points)))
+            for point in points:
+                exprs.extend(sp.sympify(c) for c in point)
+        for object in sim.Objects:
+            object.substitude_symbols(exprs)
+        return exprs, slices
+
+    @classmethod
+    def compile(cls, sim):
+        exprs, slices = cls.expressions(sim)
+        function = CompiledFunction(exprs, sim.get_arguments(), name='positions', vectorized=True)
+        return cls(function, slices)
+
+    def bind(self, p):
+        """Returns the kinematics for the parameter values p"""
+        return Kinematics(self.function, self.slices, p)
+
+    def positions(self, t, y):
+        """Returns the global coordinates of all plot points.
+
+        t has the shape (K,) and y the shape (K, 2*DOF), the result the shape (K, number of points, 2).
+        A single time and state give an array of shape (number of points, 2).
+        """
+        y = np.asarray(y, dtype=float)
+        t = np.broadcast_to(np.asarray(t, dtype=float), y.shape[:-1])
+        args = (t, y.T) if self.p is None else (t, y.T, self.p)
+        out = self.function(*args)
+        return np.moveaxis(out.reshape((-1, 2) + out.shape[1:]), (0, 1), (-2, -1))
+
+    def component_positions(self, t, y, index):
+        """Returns the coordinates of the plot points of the object with the given index"""
+        return self.positions(t, y)[..., self.slices[index], :]
@@ -0,0 +1,248 @@
+import numpy as np
+import sympy as sp
+import scipy.linalg
+
+from compiler import compile_function
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+def finite_difference_jacobian(rhs, t, y, epsilon = 1e-6):
+    """Returns the jacobian of rhs(t,y) by central differences"""
+    y = np.asarray(y, dtype=float)
+    J = np.empty((len(y), len(y)))
+    for i in range(len(y)):
+        h = epsilon*max(1, abs(y[i]))
+        yp = y.copy()
+        ym = y.copy()
+        yp[i] += h
+        ym[i] -= h
+        J[:, i] = (rhs(t, yp) - rhs(t, ym))/(2*h)
+    return J
+
+
+class LinearSystem:
+    """The linearization M*ddx + C*dx + K*x = 0 of a simulation around the state y0 at time t0.
+
+    x is the deviation of the positions from the ones of y0. A is the matrix of the first order
+    system dz/dt = A*z in the state layout of get_x0, z being the deviation from y0. For a
+    conservative system around an equilibrium K is the hessian of the potential.
+    """
+    def __init__(self, M, C, K, A, y0, t0 = 0):
+        self.M = M
+        self.C = C
+        self.K = K
+        self.A = A
+        self.y0 = np.asarray(y0, dtype=float)
+        self.t0 = t0
+
+    def modes(self):
+        """Returns the squared angular eigenfrequencies and the mode shapes of the undamped system.
+
+        Solves K*v = omega^2*M*v. The mode shapes are the columns of the returned matrix, normalized
+        to v^T*M*v = 1 for a symmetric K. Negative values of omega^2 belong to unstable directions.
+        """
+        if np.allclose(self.K, self.K.T, atol=1e-10*max(1, np.abs(self.K).max())):
+            return scipy.linalg.eigh((self.K+self.K.T)/2, self.M)
+        omega2, shapes = scipy.linalg.eig(self.K, self.M)
+        order = np.argsort(omega2.real)
+        return omega2[order].real, shapes[:, order].real
+
+    def natural_frequencies(self):
+        """Returns the eigenfrequencies of the undamped system in Hz, unstable directions give nan"""
+        omega2 = self.modes()[0]
+        with np.errstate(invalid='ignore'):
+            return np.sqrt(omega2)/(2*np.pi)
+
+    def eigenvalues(self):
+        """Returns the eigenvalues of A, which include the dampening"""
+        return np.linalg.eigvals(self.A)
+
+    def damping_ratios(self):
+        """Returns the damping ratio -Re(l)/|l| of every eigenvalue l of A"""
+        l = self.eigenvalues()
+        return -l.real/np.maximum(np.abs(l), 1e-300)
+
+    def stability_margin(self):
+        """Returns -max Re(l) over the eigenvalues of A, positive if the linearization is asymptotically stable"""
+        return -self.eigenvalues().real.max()
+
+    def is_stable(self, tolerance = 1e-9):
+        """True if no eigenvalue of A has a real part above tolerance (stable in the sense of Lyapunov for the linear system)"""
+        return self.stability_margin() >= -tolerance
+
+    def propagator(self, t):
+        """Returns the matrix exp(A*t) which maps the deviation at t0 to the deviation at t0+t"""
+        return scipy.linalg.expm(self.A*t)
+
+    def propagate(self, x0, t):
+        """Returns the states at the times t of the linear motion starting in the state x0 at t0.
+
+        The result has the shape (len(t), 2*DOF) as returned by Simulation.integrate. Equally
+        spaced times need only one matrix exponential.
+        """
+        t = np.asarray(t, dtype=float)
+        z = np.asarray(x0, dtype=float) - self.y0
+        y = np.empty((len(t), len(z)))
+        steps = np.diff(t)
+        if len(t) > 1 and np.allclose(steps, steps[0]):
+            step = self.propagator(steps[0])
+            z = self.propagator(t[0]-self.t0) @ z
+            for k in range(len(t)):
+                y[k] = z
+                z = step @ z
+        else:
+            for k in range(len(t)):
+                y[k] = self.propagator(t[k]-self.t0) @ z
+        return y + self.y0
+
+
+class Floquet:
+    """The linear stability of a periodic motion of period T.
+
+    monodromy maps a deviation at t0 to the deviation one period later. Its eigenvalues are the
+    Floquet multipliers, the motion is stable if all of them lie inside the unit circle.
+    """
+    def __init__(self, monodromy, period, y0, t0 = 0):
+        self.monodromy = monodromy
+        self.period = period
+        self.y0 = np.asarray(y0, dtype=float)
+        self.t0 = t0
+
+    def multipliers(self):
+        """Returns the Floquet multipliers, the eigenvalues of the monodromy matrix"""
+        return np.linalg.eigvals(self.monodromy)
+
+    def exponents(self):
+        """Returns the Floquet exponents log(multiplier)/T, their real parts are the mean growth rates"""
+        return np.log(self.multipliers().astype(complex))/self.period
+
+    def stability_margin(self):
+        """Returns 1 - max |multiplier|, positive if the periodic motion is asymptotically stable"""
+        return 1 - np.abs(self.multipliers()).max()
+
+    def is_stable(self, tolerance = 1e-6):
+        """True if no multiplier lies outside the unit circle by more than tolerance"""
+        return self.stability_margin() >= -tolerance
+
+    def propagate(self, x0, periods):
+        """Returns the states of the linear motion starting in the state x0 at t0 after 0, 1, ..., periods periods.
+
+        Like LinearSystem.propagate the result are states, not deviations, of shape (periods+1, 2*DOF).
+        Since the periodic motion returns to y0 after every period, they are y0 plus the deviation
+        mapped by the powers of the monodromy matrix.
+        """
+        z = np.asarray(x0, dtype=float) - self.y0
+        y = np.empty((periods+1, len(z)))
+        for k in range(periods+1):
+            y[k] = z
+            z = self.monodromy @ z
+        return y + self.y0
+
+
+class Linearization:
+    """Linearizes a simulation around equilibria and periodic motions.
+
+    mass evaluates the mass matrix M(t,y), jacobian the jacobian of the first order system or is
+    None, then it is approximated by finite differences of rhs. Simulation.get_linearization
+    returns it with the functions of the simulation bound.
+    """
+    def __init__(self, mass, jacobian, rhs, n):
+        self.mass = mass
+        self.jacobian_function = jacobian
+        self.rhs = rhs
+        self.n = n
+
+    @staticmethod
+    def compile_mass(sim):
+        """Compiles the mass matrix d^2L/ddq^2 of a symbolically derived simulation"""
+        L = sim.derive()['L']
+        dQ = [s[1] for s in sim.get_symbols()]
+        M = [sp.diff(L, a, b) for a in dQ for b in dQ]
+        return compile_function(M, sim.get_arguments(), name='mass', backend=sim.backend)
+
+    def mass_matrix(self, t, y):
+        return np.asarray(self.mass(t, np.asarray(y, dtype=float)), dtype=float).reshape(self.n, self.n)
+
+    def jacobian(self, t, y):
+        y = np.asarray(y, dtype=float)
+        if self.jacobian_function is None:
+            return finite_difference_jacobian(self.rhs, t, y)
+        J = self.jacobian_function(t, y)
+        return J.toarray() if hasattr(J, 'toarray') else np.asarray(J)
+
+    def state(self, q):
+        y = np.zeros(2*self.n)
+        y[0::2] = q
+        return y
+
+    def force(self, t, q):
+        """Returns the generalized forces M*ddq at rest in the positions q, for conservative systems the negative gradient of the potential"""
+        y = self.state(q)
+        return self.mass_matrix(t, y) @ self.rhs(t, y)[1::2]
+
+    def equilibrium(self, q0, t = 0, tolerance = 1e-10, max_step = 0.5, max_iterations = 100):
+        """Returns the positions near q0 at which all generalized forces vanish at rest.
+
+        For moving FixGroup components the equilibrium is the one of the frozen system at time t.
+        Newton's method is applied to the forces rather than the accelerations, whose jacobian is
+        the stiffness matrix, and its steps are limited to max_step in every coordinate. Both keep
+        it from jumping to an equilibrium several revolutions away. Raises a RuntimeError if it
+        does not converge.
+        """
+        q = np.array(q0, dtype=float)
+        for i in range(max_iterations):
+            residual = self.force(t, q)
+            if np.abs(residual).max() <= tolerance:
+                return q
+            delta = np.linalg.lstsq(finite_difference_jacobian(self.force, t, q), -residual, rcond=None)[0]
+            q += delta*min(1, max_step/max(np.abs(delta).max(), 1e-300))
+        raise RuntimeError("No equilibrium found near {}".format(q0))
+
+    def equilibria(self, guesses, t = 0, tolerance = 1e-10, decimals = 6):
+        """Returns the distinct equilibria reached from the initial guesses, guesses which do not converge are skipped"""
+        found = {}
+        for q0 in guesses:
+            try:
+                q = self.equilibrium(q0, t, tolerance)
+            except RuntimeError:
+                continue
+            found.setdefault(tuple(np.round(q, decimals)), q)
+        return list(found.values())
+
+    def linearize(self, y0, t0 = 0):
+        """Returns the LinearSystem around the state y0 at time t0"""
+        y0 = np.asarray(y0, dtype=float)
+        A = self.jacobian(t0, y0)
+        M = self.mass_matrix(t0, y0)
+        C = -M @ A[1::2, 1::2]
+        K = -M @ A[1::2, 0::2]
+        return LinearSystem(M, C, K, A, y0, t0)
+
+    def floquet(self, y0, period, t0 = 0, rtol = 1e-10, atol = 1e-12):
+        """Returns the Floquet analysis of the periodic motion through y0 at t0.
+
+        The state and the variational equation dPhi/dt = J(t,y)*Phi are integrated together over
+        one period, which gives the monodromy matrix Phi(t0+period). A warning is logged if the
+        motion through y0 is not periodic.
+        """
+        import scipy.integrate
+        y0 = np.asarray(y0, dtype=float)
+        m = len(y0)
+
+        def variational(t, z):
+            y = z[:m]
+            Phi = z[m:].reshape(m, m)
+            return np.concatenate([self.rhs(t, y), (self.jacobian(t, y) @ Phi).ravel()])
+
+        z0 = np.concatenate([y0, np.eye(m).ravel()])
+        solution = scipy.integrate.solve_ivp(variational, (t0, t0+period), z0, method='DOP853', rtol=rtol, atol=atol)
+        if solution.status < 0:
+            raise RuntimeError("The variational equation could not be integrated: {}".format(solution.message))
+        end = solution.y[:, -1]
+        deviation = np.abs(end[:m]-y0).max()
+        if deviation > 1e-6*max(1, np.abs(y0).max()):
+            logger.warning("The motion through y0 is not periodic with period %s, it deviates by %.2e", period, deviation)
+        return Floquet(end[m:].reshape(m, m), period, y0, t0)
@@ -1,9 +1,10 @@
 from components import Connector, Point, FixPoint
-from simulation import Simulation
+from simulation import Simulation, configure_logging
 
 import numpy as np
 import sympy as sp
 
+configure_logging()
 
 
 sim = Simulation(movie=False)
@@ -1,9 +1,11 @@
 from components import Connector, Point, FixLine, FixCircle, Trolley
-from simulation import Simulation
+from simulation import Simulation, configure_logging
 
 import numpy as np
 import sympy as sp
 
+configure_logging()
+
 sim = Simulation(movie=False)
 
 #Base = FixLine()
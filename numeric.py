@@ -0,0 +1,623 @@
+import copy
+import math
+
+import numpy as np
+import sympy as sp
+
+from scipy.linalg.lapack import dgesv
+
+from components import FixPoint, FixLine, FixCurve, FixCircle, Point, Trolley, Connector, Spring
+from diagnostics import Diagnostics
+from kinematics import Kinematics
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class Frame:
+    """The numeric kinematics of one point: position r, jacobian J = dr/dq of shape (2, DOF), velocity v and bias acceleration b.
+
+    The acceleration of the point is J*ddq + b, b collects everything which does not depend on the
+    generalized accelerations (centripetal terms, the motion of moving anchors, ...).
+    """
+    __slots__ = ('r', 'J', 'v', 'b')
+
+    def __init__(self, r, J, v, b):
+        self.r = r
+        self.J = J
+        self.v = v
+        self.b = b
+
+    def combine(self, other, a, c):
+        """Returns a*self + c*other"""
+        return Frame(a*self.r+c*other.r, a*self.J+c*other.J, a*self.v+c*other.v, a*self.b+c*other.b)
+
+
+class Cluster:
+    """The DOFs which move a group of masses relative to one root object, the unit of the articulated body recursion.
+
+    component is a Connector or a Spring hanging from root with the Points and Trolleys on it,
+    or a track with a single Trolley, root is None then. base is the index of root among the
+    objects of the simulation. dofs are the indices of the DOFs, the ones of component first,
+    sites are triples of a mass on the component, the column of its local coordinate in dofs
+    (None for a Point) and its index among the objects.
+    """
+    __slots__ = ('component', 'root', 'base', 'dofs', 'sites')
+
+    def __init__(self, component, root, base, dofs, sites = None):
+        self.component = component
+        self.root = root
+        self.base = base
+        self.dofs = dofs
+        self.sites = [] if sites is None else sites
+
+
+def _track_functions(track, t):
+    """Lambdifies the position of a track and its first and second derivatives in the track coordinate s and t.
+
+    Only these small per component expressions are handled symbolically, never the whole system.
+    """
+    s = sp.Symbol('s')
+    r = [sp.sympify(x) for x in track.l2g_expr(s)]
+    exprs = [r, [sp.diff(x, s) for x in r], [sp.diff(x, s, 2) for x in r],
+             [sp.diff(x, t) for x in r], [sp.diff(x, s, t) for x in r], [sp.diff(x, t, 2) for x in r]]
+    return sp.lambdify((s, t), exprs, modules='numpy')
+
+
+def _point_functions(fixpoint, t):
+    r = [sp.sympify(x) for x in fixpoint.get_position_expr()]
+    return sp.lambdify(t, [r, [sp.diff(x, t) for x in r], [sp.diff(x, t, 2) for x in r]], modules='numpy')
+
+
+def _solve(D, columns):
+    """Solves D*x = b for every b in columns by Gaussian elimination.
+
+    D is the symmetric positive definite matrix of the few DOFs of a Cluster, given as list of
+    rows. For these sizes plain floats are much faster than numpy.linalg.solve.
+    """
+    n = len(D)
+    if n == 1:
+        if D[0][0] <= 0:
+            raise np.linalg.LinAlgError("Singular mass matrix")
+        return [[b[0]/D[0][0]] for b in columns]
+    D = [row[:] for row in D]
+    columns = [list(b) for b in columns]
+    for k in range(n):
+        pivot = D[k][k]
+        if pivot <= 0:
+            raise np.linalg.LinAlgError("Singular mass matrix")
+        for i in range(k+1, n):
+            factor = D[i][k]/pivot
+            if factor:
+                for j in range(k, n):
+                    D[i][j] -= factor*D[k][j]
+                for b in columns:
+                    b[i] -= factor*b[k]
+    for b in columns:
+        for i in reversed(range(n)):
+            b[i] = (b[i]-sum(D[i][j]*b[j] for j in range(i+1, n)))/D[i][i]
+    return columns
+
+
+class NumericEngine:
+    """Evaluates the dynamics of a simulation numerically, without deriving its equations.
+
+    The setup costs only the lambdification of the moving anchors and tracks. The components are
+    taken in the order of Simulation.setup, which puts every component after its parents.
+
+    The accelerations are computed by an articulated body recursion over the Clusters (see
+    accelerations), which costs O(N) for a chain of N links. Only if a mass hangs on a Spring
+    between two points, which closes a loop, the dense formulation of evaluate is solved instead:
+    the positions, jacobians, velocities and bias accelerations of all points are computed
+    recursively along the component graph and with the masses m_p
+
+        M = sum_p m_p J_p^T J_p
+        F = -sum_p m_p J_p^T b_p - dU/dq - dampening
+
+    This builds one dense jacobian of 2*DOF entries per mass point and costs O(N^3) with the LU
+    decomposition. evaluate is also used for the mass matrix of the linearization.
+    """
+    def __init__(self, sim, p = None):
+        self.sim = sim
+        self.objects = sim.Objects
+        self.n = len(sim.get_symbols())
+        self.g = sim.g
+        self.t = sim.t
+        self.functions = self.lambdify()
+        self.parameter_names = [str(symbol) for symbol, default in sim.parameters]
+        self.values = {}
+        if p is not None:
+            self.values = dict(zip(self.parameter_names, p))
+        self.names = {id(object): j for j, object in enumerate(self.objects)}
+        self.masses = [object for object in self.objects if isinstance(object, (Point, Trolley))]
+        self.springs = [object for object in self.objects if isinstance(object, Spring) and object.secondary_parent]
+        self.clusters = self.cluster()
+        self.cluster_constants = None
+        self.slices = []
+        count = 0
+        for object in self.objects:
+            size = len(self.plot_locals(object))
+            self.slices.append(slice(count, count+size))
+            count += size
+
+    def lambdify(self):
+        functions = {}
+        for object in self.objects:
+            if isinstance(object, FixPoint):
+                functions[id(object)] = _point_functions(object, self.t)
+            elif isinstance(object, (FixLine, FixCurve, FixCircle)):
+                functions[id(object)] = _track_functions(object, self.t)
+        return functions
+
+    def __getstate__(self):
+        # the lambdified functions can not be pickled and the ids change, a worker process
+        # lambdifies them again, it does not need the simulation
+        state = self.__dict__.copy()
+        del state['functions']
+        state['sim'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.functions = self.lambdify()
+        self.names = {id(object): j for j, object in enumerate(self.objects)}
+
+    def cluster(self):
+        """Returns the Clusters in the order of their roots, or None if a mass hangs on a Spring between two points"""
+        clusters = {}
+        for j, object in enumerate(self.objects):
+            if isinstance(object, Connector):
+                clusters[id(object)] = Cluster(object, object.parent, self.names[id(object.parent)], [object.index])
+            elif isinstance(object, Spring) and not object.secondary_parent:
+                clusters[id(object)] = Cluster(object, object.parent, self.names[id(object.parent)], [object.x_index, object.phi_index])
+            elif isinstance(object, (Point, Trolley)) and isinstance(object.parent, Spring) and object.parent.secondary_parent:
+                return None
+            elif isinstance(object, Trolley) and id(object.parent) in self.functions:
+                clusters[id(object)] = Cluster(object.parent, None, None, [object.index], [(object, 0, j)])
+            elif isinstance(object, (Point, Trolley)) and id(object.parent) in clusters:
+                cluster = clusters[id(object.parent)]
+                if isinstance(object, Trolley):
+                    cluster.dofs.append(object.index)
+                    cluster.sites.append((object, len(cluster.dofs)-1, j))
+                else:
+                    cluster.sites.append((object, None, j))
+        return list(clusters.values())
+
+    def constants(self):
+        """Returns the length, the spring constant and the dampening of the component and the masses of the sites of every Cluster"""
+        if self.cluster_constants is None:
+            self.cluster_constants = []
+            for cluster in self.clusters:
+                component = cluster.component
+                self.cluster_constants.append((
+                    self.value(component, 'length') if isinstance(component, (Connector, Spring)) else None,
+                    self.value(component, 'k') if isinstance(component, Spring) else 0.,
+                    self.value(component, 'dampening') if isinstance(component, Connector) else 0.,
+                    [self.value(site, 'mass') for site, column, j in cluster.sites]))
+        return self.cluster_constants
+
+    def bind(self, p):
+        """Returns the engine for the parameter values p, see Simulation.get_parameter_values.
+
+        The bound engine shares the lambdified functions, it works without the simulation, e.g. in a worker process.
+        """
+        engine = copy.copy(self)
+        engine.values = dict(zip(self.parameter_names, p))
+        engine.cluster_constants = None
+        return engine
+
+    def value(self, object, name):
+        """Returns the numeric value of a physical parameter, overridden by the bound parameter values"""
+        return float(self.values.get('{}_{}'.format(name, self.names[id(object)]), getattr(object, name)))
+
+    def gravity(self):
+        return float(self.values.get('g', self.g))
+
+    def position(self, object, frames, t, q, dq):
+        """Returns the Frame of the position of a FixPoint, Point or Trolley"""
+        key = (id(object), None)
+        if key in frames:
+            return frames[key]
+        if isinstance(object, FixPoint):
+            r, v, b = (np.array(x, dtype=float) for x in self.functions[id(object)](t))
+            frame = Frame(r, np.zeros((2, self.n)), v, b)
+        elif isinstance(object, Point):
+            frame = self.l2g(object.parent, object.local, frames, t, q, dq)
+        elif isinstance(object, Trolley) and id(object.parent) in self.functions:
+            i = object.index
+            s, ds = q[i], dq[i]
+            r, r_s, r_ss, r_t, r_st, r_tt = (np.array(x, dtype=float) for x in self.functions[id(object.parent)](s, t))
+            J = np.zeros((2, self.n))
+            J[:, i] = r_s
+            frame = Frame(r, J, r_s*ds+r_t, r_ss*ds**2+2*r_st*ds+r_tt)
+        elif isinstance(object, Trolley):
+            frame = self.along(object.parent, object.index, frames, t, q, dq)
+        else:
+            raise TypeError("{} has no position".format(type(object).__name__))
+        frames[key] = frame
+        return frame
+
+    def l2g(self, object, local, frames, t, q, dq):
+        """Returns the Frame of the point at the local coordinate of a Connector, Spring or track"""
+        key = (id(object), local)
+        if key in frames:
+            return frames[key]
+        if isinstance(object, Connector):
+            parent = self.position(object.parent, frames, t, q, dq)
+            i = object.index
+            d = self.value(object, 'length')*(object.offset+local)
+            e = np.array([np.sin(q[i]), -np.cos(q[i])])
+            de = np.array([np.cos(q[i]), np.sin(q[i])])
+            J = parent.J.copy()
+            J[:, i] += d*de
+            frame = Frame(parent.r+d*e, J, parent.v+d*dq[i]*de, parent.b-d*dq[i]**2*e)
+        elif isinstance(object, Spring) and not object.secondary_parent:
+            parent = self.position(object.parent, frames, t, q, dq)
+            i, j = object.x_index, object.phi_index
+            d = (self.value(object, 'length')+q[i])*local
+            e = np.array([np.sin(q[j]), -np.cos(q[j])])
+            de = np.array([np.cos(q[j]), np.sin(q[j])])
+            J = parent.J.copy()
+            J[:, i] += local*e
+            J[:, j] += d*de
+            v = parent.v+local*dq[i]*e+d*dq[j]*de
+            b = parent.b+2*local*dq[i]*dq[j]*de-d*dq[j]**2*e
+            frame = Frame(parent.r+d*e, J, v, b)
+        elif isinstance(object, Spring):
+            a = self.position(object.parent, frames, t, q, dq)
+            c = self.position(object.secondary_parent, frames, t, q, dq)
+            frame = a.combine(c, 1-local, local)
+        elif isinstance(object, (FixLine, FixCurve, FixCircle)):
+            r, r_s, r_ss, r_t, r_st, r_tt = (np.array(x, dtype=float) for x in self.functions[id(object)](local, t))
+            frame = Frame(r, np.zeros((2, self.n)), r_t, r_tt)
+        else:
+            raise TypeError("{} has no local coordinates".format(type(object).__name__))
+        frames[key] = frame
+        return frame
+
+    def along(self, object, i, frames, t, q, dq):
+        """Returns the Frame of a point moving along a Connector or Spring, the DOF i being its local coordinate.
+
+        The point at the fixed local coordinate s = q[i] is extended by the derivative r_s along
+        the component, which is linear in s: J gains r_s in column i and the bias acceleration
+        the coriolis term 2*ds*dr_s/dt.
+        """
+        s, ds = q[i], dq[i]
+        fixed = self.l2g(object, s, frames, t, q, dq)
+        if isinstance(object, Connector):
+            j = object.index
+            length = self.value(object, 'length')
+            e = np.array([np.sin(q[j]), -np.cos(q[j])])
+            de = np.array([np.cos(q[j]), np.sin(q[j])])
+            r_s = length*e
+            dr_s = length*dq[j]*de
+        elif isinstance(object, Spring) and not object.secondary_parent:
+            x, j = object.x_index, object.phi_index
+            d = self.value(object, 'length')+q[x]
+            e = np.array([np.sin(q[j]), -np.cos(q[j])])
+            de = np.array([np.cos(q[j]), np.sin(q[j])])
+            r_s = d*e
+            dr_s = dq[x]*e+d*dq[j]*de
+        elif isinstance(object, Spring):
+            a = self.position(object.parent, frames, t, q, dq)
+            c = self.position(object.secondary_parent, frames, t, q, dq)
+            r_s = c.r-a.r
+            dr_s = c.v-a.v
+        else:
+            raise TypeError("A Trolley can not move along a {}".format(type(object).__name__))
+        J = fixed.J.copy()
+        J[:, i] += r_s
+        return Frame(fixed.r, J, fixed.v+r_s*ds, fixed.b+2*ds*dr_s)
+
+    def evaluate(self, t, y):
+        """Returns the mass matrix M and the forcing vector F of M*ddq = F in the state y"""
+        q = y[0::2]
+        dq = y[1::2]
+        frames = {}
+        g = self.gravity()
+        masses = np.array([self.value(object, 'mass') for object in self.masses])
+        points = [self.position(object, frames, t, q, dq) for object in self.masses]
+        J = np.array([frame.J for frame in points])
+        b = np.array([frame.b for frame in points])
+        v = np.array([frame.v for frame in points])
+        mJ = masses[:, None, None]*J
+        M = np.einsum('pki,pkj->ij', mJ, J)
+        F = -np.einsum('pki,pk->i', mJ, b) - g*mJ[:, 1, :].sum(axis=0)
+        for object in self.objects:
+            if isinstance(object, Spring):
+                k = self.value(object, 'k')
+                if not object.secondary_parent:
+                    F[object.x_index] -= k*q[object.x_index]
+                else:
+                    a = self.position(object.parent, frames, t, q, dq)
+                    c = self.position(object.secondary_parent, frames, t, q, dq)
+                    F -= k*(a.r-c.r) @ (a.J-c.J)
+            elif isinstance(object, Connector):
+                dampening = self.value(object, 'dampening')
+                if dampening:
+                    # d/dt dL/ddq + c*dL/ddq - dL/dq = 0, dL/ddq being the generalized momentum
+                    F[object.index] -= dampening*np.einsum('pk,pk->', mJ[:, :, object.index], v)
+        return M, F
+
+    def mass_matrix(self, t, y):
+        return self.evaluate(t, np.asarray(y, dtype=float))[0]
+
+    def __call__(self, t, y, out = None):
+        y = np.asarray(y, dtype=float)
+        if y.ndim > 1:
+            # an ensemble of shape (2*DOF, K) is evaluated member by member
+            if out is None:
+                out = np.empty(y.shape)
+            for k in range(y.shape[1]):
+                self(t, y[:, k], out=out[:, k])
+            return out
+        if out is None:
+            out = np.empty(len(y))
+        out[0::2] = y[1::2]
+        self.accelerations(t, y, out=out[1::2])
+        return out
+
+    def relative(self, cluster, site, column, length, t, q, dq):
+        """Returns the motion of a site of the cluster relative to the root of the cluster.
+
+        These are the displacement d, the columns S of the jacobian with respect to the DOFs of
+        the cluster, the relative velocity w and the bias acceleration beta, such that a site with
+        the root A moves with r = r_A + d, v = v_A + w and a = a_A + S*ddq + beta. column is the
+        column of the local coordinate of a Trolley, None for a Point, and length the length of
+        the component. The vectors are tuples or lists of floats, which are much faster than
+        numpy arrays of two entries.
+        """
+        component = cluster.component
+        S = [(0., 0.)]*len(cluster.dofs)
+        if cluster.root is None:
+            s, ds = q[site.index], dq[site.index]
+            r, r_s, r_ss, r_t, r_st, r_tt = (np.array(x, dtype=float).tolist() for x in self.functions[id(component)](s, t))
+            S[0] = tuple(r_s)
+            return r, S, [r_s[k]*ds+r_t[k] for k in range(2)], [r_ss[k]*ds**2+2*r_st[k]*ds+r_tt[k] for k in range(2)]
+        local, dlocal = (site.local, 0.) if column is None else (q[site.index], dq[site.index])
+        if isinstance(component, Connector):
+            i = component.index
+            d = length*(component.offset+local)
+            # e = (sin, -cos) points along the connector, de = (cos, sin) is its derivative
+            sin, cos = math.sin(q[i]), math.cos(q[i])
+            dphi = dq[i]
+            S[0] = (d*cos, d*sin)
+            w = [d*dphi*cos, d*dphi*sin]
+            beta = [-d*dphi**2*sin, d*dphi**2*cos]
+            if column is not None:
+                S[column] = (length*sin, -length*cos)
+                w[0] += length*dlocal*sin
+                w[1] -= length*dlocal*cos
+                beta[0] += 2*length*dlocal*dphi*cos
+                beta[1] += 2*length*dlocal*dphi*sin
+            return (d*sin, -d*cos), S, w, beta
+        i, j = component.x_index, component.phi_index
+        length = length+q[i]
+        d = length*local
+        sin, cos = math.sin(q[j]), math.cos(q[j])
+        dx, dphi = dq[i], dq[j]
+        S[0] = (local*sin, -local*cos)
+        S[1] = (d*cos, d*sin)
+        w = [local*dx*sin+d*dphi*cos, -local*dx*cos+d*dphi*sin]
+        coriolis, centripetal = 2*local*dx*dphi, d*dphi**2
+        beta = [coriolis*cos-centripetal*sin, coriolis*sin+centripetal*cos]
+        if column is not None:
+            S[column] = (length*sin, -length*cos)
+            w[0] += length*dlocal*sin
+            w[1] -= length*dlocal*cos
+            beta[0] += 2*dlocal*(dx*sin+length*dphi*cos)
+            beta[1] += 2*dlocal*(-dx*cos+length*dphi*sin)
+        return (d*sin, -d*cos), S, w, beta
+
+    def accelerations(self, t, y, out = None):
+        """Returns the generalized accelerations in the state y.
+
+        Without a loop they are computed in three passes over the Clusters. The first one walks
+        from the anchors to the leaves and computes the positions and velocities of all sites.
+        The second one walks back and reduces every cluster to an articulated inertia I and bias
+        force p of its root, such that the force the cluster needs is I*a_A + p for any
+        acceleration a_A of the root. Since the masses are points, I is only a symmetric 2x2
+        matrix, stored as (I_xx, I_xy, I_yy). The last pass propagates the accelerations from the
+        anchors again and obtains ddq of every cluster from the small system of its own DOFs.
+        The quantities of the objects are stored in lists by the index of the object.
+        """
+        y = np.asarray(y, dtype=float)
+        if out is None:
+            out = np.empty(self.n)
+        if self.clusters is None:
+            M, F = self.evaluate(t, y)
+            lu, piv, out[:], info = dgesv(M, F)
+            if info > 0:
+                raise np.linalg.LinAlgError("Singular mass matrix")
+            return out
+        constants = self.constants()
+        q = y[0::2].tolist()
+        dq = y[1::2].tolist()
+        frames = {}
+        count = len(self.objects)
+        r, v, a = [None]*count, [None]*count, [None]*count
+        motions = []
+        for cluster, (length, k, dampening, masses) in zip(self.clusters, constants):
+            base = cluster.base
+            if base is None:
+                r_A = v_A = (0., 0.)
+            else:
+                if r[base] is None:
+                    # an anchor or a point on a track, its motion is prescribed
+                    frame = self.position(cluster.root, frames, t, y[0::2], y[1::2])
+                    r[base], v[base], a[base] = frame.r.tolist(), frame.v.tolist(), frame.b.tolist()
+                r_A, v_A = r[base], v[base]
+            motion = []
+            for site, column, j in cluster.sites:
+                d, S, w, beta = self.relative(cluster, site, column, length, t, q, dq)
+                r[j] = (r_A[0]+d[0], r_A[1]+d[1])
+                v[j] = (v_A[0]+w[0], v_A[1]+w[1])
+                motion.append((S, beta))
+            motions.append(motion)
+
+        g = self.gravity()
+        inertia, bias, momentum = [None]*count, [None]*count, [None]*count
+        for cluster, (length, k, dampening, masses) in zip(self.clusters, constants):
+            for (site, column, j), m in zip(cluster.sites, masses):
+                inertia[j] = (m, 0., m)
+                bias[j] = (0., m*g)
+                momentum[j] = (m*v[j][0], m*v[j][1])
+        for spring in self.springs:
+            k = self.value(spring, 'k')
+            ends = [self.names[id(spring.parent)], self.names[id(spring.secondary_parent)]]
+            (ax, ay), (cx, cy) = [r[j] if r[j] is not None else self.position(self.objects[j], frames, t, y[0::2], y[1::2]).r for j in ends]
+            for j, sign in zip(ends, (1, -1)):
+                if bias[j] is not None:
+                    px, py = bias[j]
+                    bias[j] = (px+sign*k*(ax-cx), py+sign*k*(ay-cy))
+
+        solutions = []
+        for cluster, motion, (length, k, dampening, masses) in zip(reversed(self.clusters), reversed(motions), reversed(constants)):
+            size = len(cluster.dofs)
+            D = [[0.]*size for j in range(size)]
+            Wx, Wy = [0.]*size, [0.]*size
+            u = [0.]*size
+            Ixx = Ixy = Iyy = px = py = Px = Py = 0.
+            if k:
+                u[0] -= k*q[cluster.component.x_index]
+            for (site, column, j), (S, beta) in zip(cluster.sites, motion):
+                Ia, Ib, Ic = inertia[j]
+                bx, by = bias[j]
+                mx, my = momentum[j]
+                IS = [(Ia*sx+Ib*sy, Ib*sx+Ic*sy) for sx, sy in S]
+                fx = Ia*beta[0]+Ib*beta[1]+bx
+                fy = Ib*beta[0]+Ic*beta[1]+by
+                for l, (sx, sy) in enumerate(S):
+                    if sx == 0 and sy == 0:
+                        continue
+                    u[l] -= sx*fx+sy*fy
+                    Wx[l] += IS[l][0]
+                    Wy[l] += IS[l][1]
+                    row = D[l]
+                    for c, (tx, ty) in enumerate(IS):
+                        row[c] += sx*tx+sy*ty
+                if dampening:
+                    u[0] -= dampening*(S[0][0]*mx+S[0][1]*my)
+                Ixx += Ia
+                Ixy += Ib
+                Iyy += Ic
+                px += fx
+                py += fy
+                Px += mx
+                Py += my
+            xu, xx, xy = _solve(D, [u, Wx, Wy])
+            solutions.append((xu, xx, xy))
+            base = cluster.base
+            if base is not None and inertia[base] is not None:
+                Ia, Ib, Ic = inertia[base]
+                inertia[base] = (Ia+Ixx-sum(Wx[l]*xx[l] for l in range(size)),
+                                 Ib+Ixy-sum(Wx[l]*xy[l] for l in range(size)),
+                                 Ic+Iyy-sum(Wy[l]*xy[l] for l in range(size)))
+                bx, by = bias[base]
+                bias[base] = (bx+px+sum(Wx[l]*xu[l] for l in range(size)), by+py+sum(Wy[l]*xu[l] for l in range(size)))
+                mx, my = momentum[base]
+                momentum[base] = (mx+Px, my+Py)
+
+        for cluster, motion, (xu, xx, xy) in zip(self.clusters, motions, reversed(solutions)):
+            ax, ay = (0., 0.) if cluster.base is None else a[cluster.base]
+            ddq = [xu[l]-xx[l]*ax-xy[l]*ay for l in range(len(xu))]
+            for index, value in zip(cluster.dofs, ddq):
+                out[index] = value
+            for (site, column, j), (S, beta) in zip(cluster.sites, motion):
+                cx, cy = ax+beta[0], ay+beta[1]
+                for (sx, sy), value in zip(S, ddq):
+                    cx += sx*value
+                    cy += sy*value
+                a[j] = (cx, cy)
+        return out
+
+    def energies(self, t, y):
+        """Returns the kinetic and the potential energy of every object"""
+        q = y[0::2]
+        dq = y[1::2]
+        frames = {}
+        g = self.gravity()
+        E = np.zeros((2, len(self.objects)))
+        for i, object in enumerate(self.objects):
+            if isinstance(object, (Point, Trolley)):
+                frame = self.position(object, frames, t, q, dq)
+                m = self.value(object, 'mass')
+                E[0, i] = 0.5*m*frame.v @ frame.v
+                E[1, i] = m*g*frame.r[1]
+            elif isinstance(object, Spring):
+                k = self.value(object, 'k')
+                if not object.secondary_parent:
+                    E[1, i] = 0.5*k*q[object.x_index]**2
+                else:
+                    a = self.position(object.parent, frames, t, q, dq)
+                    c = self.position(object.secondary_parent, frames, t, q, dq)
+                    E[1, i] = 0.5*k*(a.r-c.r) @ (a.r-c.r)
+        return E
+
+    def plot_locals(self, object):
+        """The numeric counterpart of Component.plot_points_expr: None for the position, else the local coordinates"""
+        if isinstance(object, (FixPoint, Point, Trolley)):
+            return [None]
+        if isinstance(object, FixLine):
+            return [-10, 10]
+        if isinstance(object, FixCurve):
+            return list(np.linspace(object.plot_interval[0], object.plot_interval[1], object.plot_points))
+        if isinstance(object, FixCircle):
+            return ['midpoint']
+        if isinstance(object, (Connector, Spring)):
+            return [0, 1]
+        return []
+
+    def points(self, t, y):
+        """Returns the global coordinates of all plot points in the state y"""
+        q = y[0::2]
+        dq = y[1::2]
+        frames = {}
+        points = []
+        for object in self.objects:
+            for local in self.plot_locals(object):
+                if local is None:
+                    points.append(self.position(object, frames, t, q, dq).r)
+                elif local == 'midpoint':
+                    points.append(self.l2g(object, 0, frames, t, q, dq).r+[0, float(object.radius)])
+                else:
+                    points.append(self.l2g(object, local, frames, t, q, dq).r)
+        return np.array(points).reshape(-1, 2)
+
+
+class NumericDiagnostics(Diagnostics):
+    """The energies of a simulation evaluated with the NumericEngine, with the interface of Diagnostics"""
+    def __init__(self, engine):
+        Diagnostics.__init__(self, None, len(engine.objects))
+        self.engine = engine
+
+    def _evaluate(self, t, y):
+        y = np.asarray(y, dtype=float)
+        t = np.broadcast_to(np.asarray(t, dtype=float), y.shape[:-1])
+        flat_y = y.reshape(-1, y.shape[-1])
+        flat_t = t.reshape(-1)
+        E = np.empty((3+2*self.n_objects, len(flat_y)))
+        for k in range(len(flat_y)):
+            energies = self.engine.energies(flat_t[k], flat_y[k])
+            E[1, k] = energies[0].sum()
+            E[2, k] = energies[1].sum()
+            E[3:3+self.n_objects, k] = energies[0]
+            E[3+self.n_objects:, k] = energies[1]
+        E[0] = E[1]+E[2]
+        return E.reshape((len(E),) + y.shape[:-1])
+
+
+class NumericKinematics(Kinematics):
+    """The positions of the plot points evaluated with the NumericEngine, with the interface of Kinematics"""
+    def __init__(self, engine):
+        Kinematics.__init__(self, None, engine.slices)
+        self.engine = engine
+
+    def positions(self, t, y):
+        y = np.asarray(y, dtype=float)
+        t = np.broadcast_to(np.asarray(t, dtype=float), y.shape[:-1])
+        flat_y = y.reshape(-1, y.shape[-1])
+        flat_t = t.reshape(-1)
+        points = np.array([self.engine.points(flat_t[k], flat_y[k]) for k in range(len(flat_y))])
+        return points.reshape(y.shape[:-1] + points.shape[1:])
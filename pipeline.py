@@ -0,0 +1,97 @@
+import multiprocessing
+
+import numpy as np
+
+from integrators import create_integrator
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class StateBuffer:
+    """A bounded ring buffer of (t, state) pairs in shared memory for one producer and one consumer.
+
+    The semaphores count the free and the filled slots, such that the producer blocks while the
+    buffer is full and the consumer can poll without blocking.
+    """
+    def __init__(self, capacity, n, context = multiprocessing):
+        self.capacity = capacity
+        self.n = n
+        self.times = context.RawArray('d', capacity)
+        self.states = context.RawArray('d', capacity*n)
+        self.free = context.Semaphore(capacity)
+        self.filled = context.Semaphore(0)
+        self.position = 0
+
+    def _arrays(self):
+        return np.frombuffer(self.times), np.frombuffer(self.states).reshape(self.capacity, self.n)
+
+    def put(self, t, y, timeout = None):
+        """Appends a state, returns False if no slot got free within timeout"""
+        if not self.free.acquire(timeout=timeout):
+            return False
+        times, states = self._arrays()
+        times[self.position] = t
+        states[self.position] = y
+        self.position = (self.position+1) % self.capacity
+        self.filled.release()
+        return True
+
+    def get(self, block = False, timeout = None):
+        """Returns the oldest (t, state) pair or None if the buffer is empty"""
+        if not self.filled.acquire(block, timeout):
+            return None
+        times, states = self._arrays()
+        item = times[self.position], states[self.position].copy()
+        self.position = (self.position+1) % self.capacity
+        self.free.release()
+        return item
+
+
+def _produce(buffer, stop, failed, rhs, jac, method, x0, t0, dt, subintegrations):
+    try:
+        r = create_integrator(rhs, x0, t0, method, jac)
+        while not stop.is_set():
+            for i in range(subintegrations):
+                r.integrate(r.t+dt/subintegrations)
+            if not r.successful():
+                logger.warning("Integration failed at t = %s, stopping the producer", r.t)
+                failed.set()
+                return
+            while not buffer.put(r.t, r.y, timeout=0.1):
+                if stop.is_set():
+                    return
+    except Exception:
+        logger.exception("The integration raised, stopping the producer")
+        failed.set()
+
+
+class IntegrationProducer:
+    """Integrates a system in a background process, one state every dt, into a StateBuffer.
+
+    The producer runs ahead of the consumer until the buffer is full and then waits for free
+    slots, therefore the run length is unlimited while the memory stays bounded. The event failed
+    is set when the integration fails or raises, the states before stay in the buffer.
+    """
+    def __init__(self, rhs, x0, t0 = 0, dt = 1./30, subintegrations = 10, capacity = 256, method = 'adams', jac = None):
+        self.buffer = StateBuffer(capacity, len(x0))
+        self.stop_event = multiprocessing.Event()
+        self.failed = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=_produce, daemon=True,
+            args=(self.buffer, self.stop_event, self.failed, rhs, jac, method, x0, t0, dt, subintegrations))
+
+    def start(self):
+        self.process.start()
+        logger.debug("Started integration producer")
+
+    def get(self):
+        """Returns the next (t, state) pair or None if the producer has not caught up"""
+        return self.buffer.get()
+
+    def stop(self):
+        self.stop_event.set()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        logger.debug("Stopped integration producer")
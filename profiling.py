@@ -0,0 +1,171 @@
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+import sympy as sp
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+class Lazy:
+    """Defers building a log message argument until the record is actually formatted"""
+    def __init__(self, function):
+        self.function = function
+
+    def __str__(self):
+        return str(self.function())
+
+
+def expression_size(exprs):
+    """Returns the number of nodes of the expression trees in exprs (an expression, an iterable of them or a dict with them as values)"""
+    if isinstance(exprs, dict):
+        exprs = list(exprs.values())
+    if isinstance(exprs, sp.Basic) and not isinstance(exprs, sp.MatrixBase):
+        exprs = [exprs]
+    return sum(sum(1 for node in sp.preorder_traversal(expr)) for expr in exprs if isinstance(expr, sp.Basic))
+
+
+class Phase:
+    """The record of one profiled phase. size is the expression size of its result, memory the peak of the traced allocations in bytes."""
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.time = 0.
+        self.size = None
+        self.memory = None
+        self.start = None
+        self.peak = 0
+        self.result = None
+
+    def measure(self, exprs):
+        """Marks exprs as the result of the phase, its expression size is counted once the phase is timed"""
+        self.result = exprs
+        return exprs
+
+    def as_dict(self):
+        return {'name': self.name, 'depth': self.depth, 'time': self.time, 'size': self.size, 'memory': self.memory}
+
+
+class CallCounter:
+    """Wraps a function and counts its calls in the counters of a profiler, with timed also the total time spent in it under <name>_time"""
+    def __init__(self, function, profiler, name, timed = False):
+        self.function = function
+        self.profiler = profiler
+        self.name = name
+        self.timed = timed
+
+    def __call__(self, *args, **kwargs):
+        counters = self.profiler.counters
+        counters[self.name] += 1
+        if not self.timed:
+            return self.function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return self.function(*args, **kwargs)
+        finally:
+            counters[self.name+'_time'] += time.perf_counter() - start
+
+
+class NullPhase:
+    def measure(self, exprs):
+        return exprs
+
+
+class NullProfiler:
+    """The default profiler of a Simulation, which records nothing"""
+    enabled = False
+
+    @contextmanager
+    def phase(self, name):
+        yield NullPhase()
+
+    def count_calls(self, function, name, timed = False):
+        return function
+
+    def count(self, name, n = 1):
+        pass
+
+
+class Profiler(NullProfiler):
+    """Records the wall time, the expression size and optionally the memory of the phases of the derivation and integration.
+
+    Pass it to Simulation(profiler=...). Every finished phase is passed to callback (as returned by
+    Phase.as_dict) and the whole run can be inspected with report or summary. With memory=True
+    the allocations are traced with tracemalloc, which slows down the symbolic part noticeably.
+    Counters collect the number of calls of the right hand side and other functions.
+    """
+    enabled = True
+
+    def __init__(self, callback = None, memory = False):
+        self.callback = callback
+        self.memory = memory
+        self.phases = []
+        self.stack = []
+        self.counters = {}
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        record = Phase(name, len(self.stack))
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1].peak = max(self.stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            record.start = current
+        self.phases.append(record)
+        self.stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.time = time.perf_counter() - start
+            self.stack.pop()
+            if record.result is not None:
+                record.size = expression_size(record.result)
+                record.result = None
+            if self.memory:
+                peak = max(record.peak, tracemalloc.get_traced_memory()[1])
+                record.memory = peak - record.start
+                if self.stack:
+                    self.stack[-1].peak = max(self.stack[-1].peak, peak)
+                tracemalloc.reset_peak()
+            logger.debug("Phase %s took %.3fs", name, record.time)
+            if self.callback is not None:
+                self.callback(record.as_dict())
+
+    def count_calls(self, function, name, timed = False):
+        """Returns function wrapped such that its calls are counted under name"""
+        self.counters.setdefault(name, 0)
+        if timed:
+            self.counters.setdefault(name+'_time', 0.)
+        return CallCounter(function, self, name, timed)
+
+    def count(self, name, n = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        """Returns the phases in the order they were started and the counters"""
+        return {'phases': [phase.as_dict() for phase in self.phases], 'counters': dict(self.counters)}
+
+    def totals(self):
+        """Returns the total time of every phase name"""
+        totals = {}
+        for phase in self.phases:
+            totals[phase.name] = totals.get(phase.name, 0) + phase.time
+        return totals
+
+    def summary(self):
+        """Returns the report as a human readable table"""
+        lines = ["{:<40} {:>10} {:>10} {:>12}".format('phase', 'time [s]', 'size', 'memory [kB]')]
+        for phase in self.phases:
+            lines.append("{:<40} {:>10.4f} {:>10} {:>12}".format('  '*phase.depth + phase.name, phase.time,
+                         '' if phase.size is None else phase.size,
+                         '' if phase.memory is None else '{:.1f}'.format(phase.memory/1024)))
+        for name, value in sorted(self.counters.items()):
+            lines.append("{:<40} {:>10}".format(name, value))
+        return "\n".join(lines)
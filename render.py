@@ -0,0 +1,129 @@
+import os
+import subprocess
+import tempfile
+import collections
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+_worker = {}
+
+
+def _init_worker(specs, slices, xlim, ylim, size, dpi):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.patches import Circle
+
+    fig = Figure(figsize=(size[0]/dpi, size[1]/dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111, aspect='equal', autoscale_on=False, xlim=xlim, ylim=ylim)
+    artists = []
+    for kind, argument in specs:
+        if kind == 'circle':
+            artist = Circle((0, 0), argument, color="black", fill=False)
+            ax.add_artist(artist)
+        else:
+            artist, = ax.plot([], [], argument)
+        artists.append((kind, artist))
+    text = ax.text(0.05, 0.9, '', transform=ax.transAxes)
+    for kind, artist in artists:
+        artist.set_animated(True)
+    text.set_animated(True)
+    # the axes are drawn only once, every frame restores them and draws the moving artists on top
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    _worker.update(canvas=canvas, ax=ax, background=background, artists=artists, slices=slices, text=text, size=size)
+
+
+def _render_chunk(chunk):
+    """Draws the frames of one chunk and returns them as raw rgb24 bytes"""
+    t, positions, energies = chunk
+    canvas = _worker['canvas']
+    ax = _worker['ax']
+    text = _worker['text']
+    frames = []
+    for k in range(len(t)):
+        canvas.restore_region(_worker['background'])
+        for (kind, artist), s in zip(_worker['artists'], _worker['slices']):
+            points = positions[k, s]
+            if kind == 'circle':
+                artist.center = tuple(points[0])
+            else:
+                artist.set_data(points[:,0], points[:,1])
+            ax.draw_artist(artist)
+        if energies is not None:
+            text.set_text('time = %.1fs\nenergy = %.1f' % (t[k], energies[k]))
+            ax.draw_artist(text)
+        frame = np.asarray(canvas.buffer_rgba())[:, :, :3]
+        if frame.shape[:2] != (_worker['size'][1], _worker['size'][0]):
+            raise ValueError("The figure has {}x{} pixels instead of {}x{}, choose a size divisible by dpi".format(
+                frame.shape[1], frame.shape[0], *_worker['size']))
+        frames.append(frame.tobytes())
+    return b''.join(frames)
+
+
+def render_movie(sim, t, y, path = 'lagrange.mp4', size = (1280, 720), dpi = 100, fps = None, processes = None,
+                 chunk_size = 32, codec = 'libx264', ffmpeg = 'ffmpeg', parameters = None):
+    """Renders a precomputed trajectory into a movie without any interactive figure.
+
+    t and y are the times and states as returned by Simulation.integrate. The positions of all
+    components are evaluated at once with the compiled kinematics, the frames are split into
+    chunks of chunk_size frames and drawn with the Agg backend across a process pool. The raw
+    frames are piped in order to ffmpeg, which encodes them with codec into path. size is the
+    resolution in pixels, fps defaults to 1/sim.dt.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if fps is None:
+        fps = round(1/sim.dt)
+    kinematics = sim.get_kinematics(parameters)
+    positions = kinematics.positions(t, y)
+    energies = None
+    if sim.show_information:
+        energies = sim.get_diagnostics(parameters).energy(t, y)
+    specs = [object.artist_spec() for object in sim.Objects]
+
+    chunks = [(t[i:i+chunk_size], positions[i:i+chunk_size], None if energies is None else energies[i:i+chunk_size])
+              for i in range(0, len(t), chunk_size)]
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+               '-s', '{}x{}'.format(*size), '-r', str(fps), '-i', '-',
+               '-vcodec', codec, '-pix_fmt', 'yuv420p', path]
+    logger.debug("Rendering %s frames into %s", len(t), path)
+    initargs = (specs, kinematics.slices, sim.xlim, sim.ylim, size, dpi)
+    # ffmpeg reports into a file, a pipe which nobody reads could fill up and block it
+    errors = tempfile.TemporaryFile()
+    encoder = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=errors)
+    broken = False
+    try:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=initargs) as pool:
+            # only a few chunks per worker are in flight, such that the rendered frames waiting for the encoder stay bounded
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_render_chunk, chunk))
+                if len(pending) >= 2*(processes or os.cpu_count() or 1):
+                    encoder.stdin.write(pending.popleft().result())
+            while pending:
+                encoder.stdin.write(pending.popleft().result())
+    except BrokenPipeError:
+        # ffmpeg exited early, its status and output below tell why
+        broken = True
+    finally:
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            broken = True
+        returncode = encoder.wait()
+        errors.seek(0)
+        message = errors.read().decode(errors='replace').strip()
+        errors.close()
+    if returncode != 0 or broken:
+        raise RuntimeError("ffmpeg exited with status {}{}: {}".format(
+            returncode, " before all frames were written" if broken else "", message or "no output"))
+    logger.debug("Finished rendering %s", path)
+    return path
@@ -1,8 +1,9 @@
 from components import Spring, Trolley, FixPoint, FixLine, Connector, Point
-from simulation import Simulation
+from simulation import Simulation, configure_logging
 
 import numpy as np
 
+configure_logging()
 
 sim = Simulation(movie=False)
     
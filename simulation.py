@@ -1,126 +1,258 @@
 
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-
-import scipy.integrate
 import numpy as np
 import sympy as sp
 
-from time import time
-
 from sympy.utilities.iterables import flatten
 
+from cache import EquationCache, topology_key
+from compiler import compile_function, BoundFunction, MassMatrixRHS, Jacobian, MassMatrixJacobian, sparsity_pattern
+from diagnostics import Diagnostics
+from graph import ComponentGraph, ContributionCache, GraphError
+from kinematics import Kinematics
+from profiling import NullProfiler, Lazy
+from integrators import create_integrator, integrate_ode, integrate_dense, IntegrationError, METHODS, STIFF_METHODS
+
 import logging
 
 logger = logging.getLogger('Lagrange_Mechanics')
-logger.setLevel(logging.DEBUG)
-fh = logging.FileHandler('mechanics.log')
-fh.setLevel(logging.DEBUG)
-ch = logging.StreamHandler()
-ch.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
+logger.addHandler(logging.NullHandler())
+
+# scipy.constants.g, importing scipy.constants alone takes longer than importing sympy
+STANDARD_GRAVITY = 9.80665
+
+
+# the handlers of the last configure_logging, replaced by the next call
+_handlers = []
+
+
+def configure_logging(filename = 'mechanics.log', level = logging.INFO):
+    """Sends the log of the simulation to the console and, with all debug messages, to filename.
+
+    Importing the modules has no side effects, applications call this once at startup. Worker
+    processes which do not call it neither print nor open a log file. Calling it again replaces
+    the handlers of the previous call.
+    """
+    while _handlers:
+        handler = _handlers.pop()
+        logger.removeHandler(handler)
+        handler.close()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.DEBUG if filename else level)
+    if filename:
+        fh = logging.FileHandler(filename)
+        fh.setLevel(logging.DEBUG)
+        fh.setFormatter(formatter)
+        _handlers.append(fh)
+    ch = logging.StreamHandler()
+    ch.setLevel(level)
+    ch.setFormatter(formatter)
+    _handlers.append(ch)
+    for handler in _handlers:
+        logger.addHandler(handler)
+    return logger
 
 
 class Simulation:
-    def __init__(self,dt = 1./30,movie=False,subintegrations = 10,xlim = (-2,2),ylim=(-2,2), g = scipy.constants.g, show_information = True):
+    def __init__(self,dt = 1./30,movie=False,subintegrations = 10,xlim = (-2,2),ylim=(-2,2), g = STANDARD_GRAVITY, show_information = True, formulation = 'solve', cache = None, backend = 'numpy', symbolic_parameters = False, integrator = 'adams', profiler = None, engine = 'symbolic'):
         self.dt = dt
         self.Objects = []
-        self.fig = plt.figure(figsize=(20,10))
+        self.fig = None
+        self.ax = None
         self.xlim = xlim
         self.ylim = ylim
         self.subintegrations = subintegrations
         self.t = sp.symbols('t')
-        
-        self.ax = self.fig.add_subplot(111,aspect='equal', autoscale_on=False, xlim=self.xlim, ylim=self.ylim)
         self.movie = movie
         logger.debug("Simulation initiated.")
         self.g = g
         self.show_information = show_information
+        if formulation not in ('solve', 'mass_matrix'):
+            raise ValueError("Unknown formulation {}".format(formulation))
+        self.formulation = formulation
+        if cache is True:
+            cache = EquationCache()
+        self.cache = cache
+        self.backend = backend
+        self.symbolic_parameters = symbolic_parameters
+        if integrator not in METHODS:
+            raise ValueError("Unknown integrator {}".format(integrator))
+        self.integrator = integrator
+        if engine not in ('symbolic', 'numeric'):
+            raise ValueError("Unknown engine {}".format(engine))
+        self.engine = engine
+        self.parameters = []
+        self.expressions = None
+        self.compiled = {}
+        self.contributions = ContributionCache()
+        self.profiler = profiler if profiler is not None else NullProfiler()
 
 
     def addObjects(self,objects):
         self.Objects.extend(objects)
+        self.expressions = None
+        self.compiled = {}
         logger.debug("Added objects")
 
-    def init_plot(self):
-        for object in self.Objects:
-            object.init_plot(self.ax)
+    def removeObjects(self,objects):
+        """Removes components. Raises a GraphError if a remaining component is attached to a removed one."""
+        removed = {id(object) for object in objects}
+        remaining = [object for object in self.Objects if id(object) not in removed]
+        for object in remaining:
+            for parent in object.get_parents():
+                if id(parent) in removed:
+                    raise GraphError("{} is still attached to a removed {}".format(type(object).__name__, type(parent).__name__))
+        self.Objects = remaining
+        self.invalidate()
+        logger.debug("Removed objects")
+
+    def invalidate(self):
+        """Derives the equations again on the next use. Call it after changing the parameters of components.
+
+        With the mass matrix formulation only the components whose energies changed are derived
+        again, see graph.ContributionCache.
+        """
+        self.expressions = None
+        self.compiled = {}
+
+    def init_figure(self):
+        """Creates the matplotlib figure. Only needed for the animated output, the headless integration never calls it."""
+        import display
+        return display.init_figure(self)
 
-    def plot(self, t = 0):
-        #self.ax.cla()
-        #self.ax.autoscale(False)
-        #self.ax.set_xlim(self.xlim)
-        #self.ax.set_ylim(self.ylim)
-        res = []
+    def init_plot(self):
+        import display
+        display.init_plot(self)
 
-        for object in self.Objects:
-            res.append(object.plot(t))
-        return res
+    def plot(self, t = 0, x = None):
+        """Updates the artists of all objects. If the state x is given, the compiled kinematics are used."""
+        import display
+        return display.plot(self, t, x)
 
-    def setup(self): #TODO: can fail if objects are in wrong order
+    def setup(self):
+        """Validates the component graph, sorts the components such that parents come first and numbers the DOFs and parameters"""
         logger.debug("Starting setup")
-        i = 0 
-        for object in self.Objects:
-            i = object.setup(i,self.t)
-        logger.debug("Finished setup of {} objects with {} independent variables".format(len(self.Objects),i))
+        with self.profiler.phase('setup'):
+            self.graph = ComponentGraph(self.Objects)
+            self.graph.validate()
+            ordered = self.graph.order()
+            if any(a is not b for a, b in zip(ordered, self.Objects)):
+                logger.info("Reordered the components such that every component follows its parents")
+                self.Objects = ordered
+                self.graph = ComponentGraph(self.Objects)
+            i = 0 
+            for object in self.Objects:
+                i = object.setup(i,self.t)
+            self.parameters = []
+            if self.symbolic_parameters:
+                self.parameters.append((sp.Symbol('g'),self.g))
+            for j,object in enumerate(self.Objects):
+                self.parameters.extend(object.parametrize(j,self.symbolic_parameters))
+            for object in self.Objects:
+                object.clear_expressions()
+        logger.debug("Finished setup of %s objects with %s independent variables", len(self.Objects), i)
+
+    def get_g(self):
+        """Returns the gravity constant as it enters the expressions"""
+        if self.symbolic_parameters:
+            return self.parameters[0][0]
+        return self.g
+
+    def get_parameter_values(self, parameters = None):
+        """Returns the values of the symbolic parameters as array.
+
+        parameters is a dict from the parameter names (e.g. 'g', 'mass_2', 'length_1') to the
+        values which replace the ones given to the components.
+        """
+        if parameters is None:
+            parameters = {}
+        names = [str(symbol) for symbol,value in self.parameters]
+        for name in parameters:
+            if name not in names:
+                raise KeyError("Unknown parameter {}. Known parameters are {}".format(name, names))
+        return np.array([parameters.get(str(symbol),value) for symbol,value in self.parameters],dtype=float)
             
 
     
+    def simplify(self, expr):
+        """Simplifies the energy expressions.
+
+        The full sp.simplify is only affordable if the accelerations are solved symbolically
+        afterwards. The mass matrix formulation only expands, which keeps the cost polynomial.
+        """
+        with self.profiler.phase('simplify') as phase:
+            if self.formulation == 'mass_matrix':
+                return phase.measure(sp.expand(expr))
+            return phase.measure(sp.simplify(expr))
+
     def calculate_potential_expr(self):
-        U = 0 
-        for i,object in enumerate(self.Objects):
-            Ui = object.potential_expr(self.g) 
-            logger.debug("Object {} has potential {}".format(i,Ui))
-            U += Ui
+        with self.profiler.phase('calculate_potential_expr') as phase:
+            U = 0 
+            for i,object in enumerate(self.Objects):
+                Ui = object.potential_expr(self.get_g())
+                logger.debug("Object %s has potential %s", i, Ui)
+                U += Ui
 
-        return sp.simplify(U)
+            return phase.measure(self.simplify(U))
 
     def calculate_kinetic_expr(self):
-        T = 0 
-        for i,object in enumerate(self.Objects):
-            Ti = object.kinetic_expr()
-            logger.debug("Object {} has kinetic Energy {}".format(i,Ti))
-            T+=Ti
-        return sp.simplify(T)
+        with self.profiler.phase('calculate_kinetic_expr') as phase:
+            T = 0 
+            for i,object in enumerate(self.Objects):
+                Ti = object.kinetic_expr()
+                logger.debug("Object %s has kinetic Energy %s", i, Ti)
+                T+=Ti
+            return phase.measure(self.simplify(T))
 
     def calculate_lagrange_expr(self):
         T = self.calculate_kinetic_expr()
         U = self.calculate_potential_expr()
-        L = sp.simplify(T-U)
-        H = sp.simplify(T+U)
+        L = self.simplify(T-U)
+        H = self.simplify(T+U)
         Lp = [L,H]
         for object in self.Objects:
             object.substitude_symbols(Lp)
-        logger.info("Lagrange Function:\n\tL = {}".format(Lp[0]))
-        logger.info("Lagrange Function unchanged:\n\tL = {}".format(L))
+        logger.debug("Lagrange Function:\n\tL = %s", Lp[0])
+        logger.debug("Lagrange Function unchanged:\n\tL = %s", L)
         return L,Lp[0],Lp[1]
 
-    def calculate_ode_functions(self,L):
+    def calculate_component_energies(self):
+        """Returns the kinetic and the potential energy of every object with the DOFs replaced by symbols"""
+        E = []
+        for object in self.Objects:
+            E.extend([object.kinetic_expr(),object.potential_expr(self.get_g())])
+        for object in self.Objects:
+            object.substitude_symbols(E)
+        return [(E[2*i],E[2*i+1]) for i in range(len(self.Objects))]
+
+    def calculate_euler_lagrange(self,L):
+        """Returns the Euler-Lagrange equations with the DOFs replaced by the Q, dQ and ddQ symbols."""
         f = []
         for object in self.Objects:
             object.calculate_ode_functions(f,L)
         for object in self.Objects:
             object.substitude_symbols(f)
+        logger.debug("cuppled ode: %s", f)
+        return f
+
+    def calculate_ode_functions(self,L):
+        f = self.calculate_euler_lagrange(L)
 
         s = self.get_symbols()
         for i in range(len(s)):
             s[i]=s[i][2]
     
-        logger.debug("cuppled ode: {}".format(f))
-        rf = sp.solve(f,s)
-        logger.debug("solver returned: {}".format(rf))
+        with self.profiler.phase('solve') as phase:
+            rf = phase.measure(sp.solve(f,s))
+        logger.debug("solver returned: %s", rf)
         for i in range(len(f)):
             try:
                 f[i] = rf[s[i]]
             except KeyError:
                 f[i] = sp.Integer(0)
-                logger.warning("Symbol {} not found in solution. Setting it to 0".format(s[i]))
+                logger.warning("Symbol %s not found in solution. Setting it to 0", s[i])
         for i,fun in enumerate(f):
-            f[i] = sp.simplify(fun)
+            with self.profiler.phase('simplify') as phase:
+                f[i] = phase.measure(sp.simplify(fun))
         return f 
 
     def get_x0(self):
@@ -147,67 +279,481 @@ class Simulation:
         return L
     
 
-    def run(self):
+    def derive(self):
+        """Derives the Lagrangian, the Hamiltonian and the ode system of the current objects.
+
+        Depending on the formulation the ode system is either stored as explicit accelerations
+        ('ode') or as mass matrix and forcing vector ('M', 'F'). The results are stored in
+        self.expressions and reused until objects are added or removed or invalidate is called. If
+        a cache is given, the expressions are loaded from and stored to it. The mass matrix
+        formulation is assembled from the shares of the single components, of which only the
+        changed ones are derived again.
+        """
+        if self.expressions is not None:
+            return self.expressions
         self.setup()
-        self.init_plot()
-        self.plot()
-        L,Lp,H = self.calculate_lagrange_expr()
-        f = self.calculate_ode_functions(L)
-    
-        s=self.get_symbols()
-        for i in range(len(s)):
-            s[i]=(s[i][0],s[i][1])
+        if self.engine == 'numeric':
+            # the numeric engine evaluates the dynamics in every call, there is nothing to derive
+            self.expressions = {}
+            return self.expressions
+        if self.cache:
+            key = topology_key(self.Objects, self.get_g(), self.formulation)
+            self.expressions = self.cache.get(key)
+            if self.expressions is not None:
+                logger.debug("Loaded equations %s from cache", key)
+                return self.expressions
+        with self.profiler.phase('derive'):
+            if self.formulation == 'mass_matrix':
+                self.expressions = self.contributions.assemble(self, self.graph)
+            else:
+                L,Lp,H = self.calculate_lagrange_expr()
+                self.expressions = {'L': Lp, 'H': H, 'energies': self.calculate_component_energies()}
+                self.expressions['ode'] = self.calculate_ode_functions(L)
+        if self.cache:
+            self.cache.put(key, self.expressions)
+        return self.expressions
+
+    def get_state_symbols(self):
+        """Returns the symbols of the first order state [Q0, dQ0, Q1, dQ1, ...] in the layout of get_x0"""
+        return flatten([(s[0],s[1]) for s in self.get_symbols()])
+
+    def get_rhs(self, backend = None, vectorized = False, parameters = None):
+        """Returns the right hand side rhs(t,x,out=None) of the first order ode system.
+
+        The backend defaults to the one given to the Simulation. If out is given, the
+        derivative is written into it. With symbolic parameters, their values are bound to the
+        returned function, see get_parameter_values. The compiled functions are reused until new
+        objects are added. With the numeric engine the backend is ignored.
+        """
+        if self.engine == 'numeric':
+            return self.get_numeric_engine(parameters)
+        f = self.get_compiled_rhs(backend, vectorized)
+        if self.parameters:
+            f = BoundFunction(f, self.get_parameter_values(parameters))
+        if self.formulation == 'mass_matrix':
+            return MassMatrixRHS(f, len(self.get_symbols()))
+        return f
+
+    def get_numeric_engine(self, parameters = None):
+        """Returns the numeric.NumericEngine of the current objects, which evaluates the dynamics without deriving them"""
+        from numeric import NumericEngine
+        self.derive()
+        if 'numeric' not in self.compiled:
+            with self.profiler.phase('compile_numeric'):
+                self.compiled['numeric'] = NumericEngine(self)
+        engine = self.compiled['numeric']
+        if self.parameters:
+            return engine.bind(self.get_parameter_values(parameters))
+        return engine
+
+    def get_compiled_rhs(self, backend = None, vectorized = False):
+        """Returns the compiled function behind get_rhs, which takes the parameter vector as additional argument.
+
+        For the mass matrix formulation it evaluates M and F instead of the derivative.
+        """
+        expressions = self.derive()
+        if backend is None:
+            backend = self.backend
+        key = ('rhs', backend, vectorized)
+        if key not in self.compiled:
+            with self.profiler.phase('compile_rhs'):
+                self.compiled[key] = self.compile_rhs(expressions, backend, vectorized)
+        return self.compiled[key]
+
+    def get_arguments(self, extra = ()):
+        """Returns the arguments of the compiled functions as (name, symbols) pairs. The parameters always come last."""
+        args = [('t',self.t),('y',self.get_state_symbols())] + list(extra)
+        if self.parameters:
+            args.append(('p',[symbol for symbol,value in self.parameters]))
+        return args
+
+    def compile_rhs(self, expressions, backend, vectorized):
+        args = self.get_arguments()
+        if self.formulation == 'mass_matrix':
+            return compile_function(list(expressions['M'])+list(expressions['F']),args,name='mass_matrix',backend=backend,vectorized=vectorized)
 
+        s = self.get_symbols()
         f2 = []
-        for i,fi in enumerate(f):
+        for i,fi in enumerate(expressions['ode']):
             f2.extend([s[i][1],fi])
-        logger.info("ODE System: \n\t{}".format("\n\t".join([str(o) for o in f2])))
-        func = sp.lambdify([self.t]+flatten(s),f2)
-        rhs2 = lambda t,x: func(t,*x)
-    
-        x0 = self.get_x0()
-        logger.debug("x0 = {}".format(x0))
-
-    
-        r = scipy.integrate.ode(rhs2).set_integrator('vode', method='adams',with_jacobian=False) #bdf/adams
-        r.set_initial_value(x0,0)
-
-        logger.debug("Initialized Integrator")
-
-        time_template = 'time = %.1fs'
-        energy_template = 'energy = %.1f'
-        time_text = self.ax.text(0.05, 0.9, '', transform=self.ax.transAxes)
-        energy_text = self.ax.text(0.05,0.87,'', transform=self.ax.transAxes)
-
-
-        def animate(i):
-            for i in range(self.subintegrations):
-                r.integrate(r.t+self.dt/self.subintegrations)
-            if not r.successful():
-                r.t += self.dt
-            self.update(r.y)
-            res = self.plot(r.t)
-            if self.show_information:
-                time_text.set_text(time_template % r.t)
-                energy_text.set_text(energy_template % (self.evaluate(H,r.t)))
-                res.extend([time_text,energy_text])
-            return tuple(res)
-
+        logger.debug("ODE System: \n\t%s", Lazy(lambda: "\n\t".join([str(o) for o in f2])))
+        return compile_function(f2,args,name='rhs',backend=backend,vectorized=vectorized)
+
+    def get_diagnostics(self, parameters = None):
+        """Returns the compiled energy diagnostics, see diagnostics.Diagnostics"""
+        if self.engine == 'numeric':
+            from numeric import NumericDiagnostics
+            return NumericDiagnostics(self.get_numeric_engine(parameters))
+        self.derive()
+        if 'diagnostics' not in self.compiled:
+            with self.profiler.phase('compile_diagnostics'):
+                self.compiled['diagnostics'] = Diagnostics.compile(self)
+        diagnostics = self.compiled['diagnostics']
+        if self.parameters:
+            return diagnostics.bind(self.get_parameter_values(parameters))
+        return diagnostics
+
+    def get_kinematics(self, parameters = None):
+        """Returns the compiled global coordinates of the plot points, see kinematics.Kinematics"""
+        if self.engine == 'numeric':
+            from numeric import NumericKinematics
+            return NumericKinematics(self.get_numeric_engine(parameters))
+        self.derive()
+        if 'kinematics' not in self.compiled:
+            with self.profiler.phase('compile_kinematics'):
+                self.compiled['kinematics'] = Kinematics.compile(self)
+        kinematics = self.compiled['kinematics']
+        if self.parameters:
+            return kinematics.bind(self.get_parameter_values(parameters))
+        return kinematics
+
+    def get_jacobian(self, backend = None, parameters = None, sparse = False):
+        """Returns the analytic jacobian jac(t,x) of the first order system.
+
+        Its sparsity pattern is available as jac.sparsity. With sparse=True the jacobian is
+        returned as scipy.sparse matrix, which the implicit solvers of scipy.integrate can use directly.
+        """
+        expressions = self.derive()
+        if backend is None:
+            backend = self.backend
+        key = ('jacobian', backend)
+        if key not in self.compiled:
+            with self.profiler.phase('compile_jacobian'):
+                self.compiled[key] = self.compile_jacobian(expressions, backend)
+        function, sparsity = self.compiled[key]
+        if self.parameters:
+            function = BoundFunction(function, self.get_parameter_values(parameters))
+        if self.formulation == 'mass_matrix':
+            return MassMatrixJacobian(self.get_rhs(backend, parameters=parameters).function, function, sparsity, sparse)
+        rows, cols = np.nonzero(sparsity)
+        return Jacobian(function, rows, cols, len(sparsity), sparse)
+
+    def compile_jacobian(self, expressions, backend):
+        state = self.get_state_symbols()
+        if self.formulation == 'mass_matrix':
+            dds = [s[2] for s in self.get_symbols()]
+            R = expressions['M']*sp.Matrix(dds)-expressions['F']
+            D = R.jacobian(state)
+            # the accelerations depend on everything their residual depends on, coupled through M
+            coupled = sparsity_pattern(expressions['M'])
+            for i in range(int(np.log2(len(dds)))+1):
+                coupled = coupled | (coupled.astype(int) @ coupled.astype(int) > 0)
+            sparsity = np.zeros((len(state),len(state)), dtype=bool)
+            sparsity[np.arange(0,len(state),2),np.arange(1,len(state),2)] = True
+            sparsity[1::2] = coupled.astype(int) @ sparsity_pattern(D).astype(int) > 0
+            f = compile_function(list(D),self.get_arguments([('a',dds)]),name='residual_jacobian',backend=backend)
+            return f, sparsity
 
-    
-        t0 = time()
-        animate(0)
-        t1 = time()
-        interval = 1000 * self.dt - (t1 - t0)
-
-
-        anim = animation.FuncAnimation(self.fig, animate, frames=300,
-                                      interval=interval, blit = True)
-
-        if self.movie:
-            anim.save('lagrange.mp4', fps=30, extra_args=['-vcodec', 'libx264'])
-
-        logger.debug("Starting animation")
-        plt.show()
-        logger.debug("Finished animation")
-        
+        s = self.get_symbols()
+        f2 = []
+        for i,fi in enumerate(expressions['ode']):
+            f2.extend([s[i][1],fi])
+        J = sp.Matrix(f2).jacobian(state)
+        sparsity = sparsity_pattern(J)
+        rows, cols = np.nonzero(sparsity)
+        f = compile_function([J[i,j] for i,j in zip(rows,cols)],self.get_arguments(),name='jacobian',backend=backend)
+        return f, sparsity
+
+    def get_input_symbols(self):
+        """Returns the symbols u0, u1, ... of the external generalized forces on the DOFs Q0, Q1, ..."""
+        return [sp.Symbol('u' + str(s[0])[1:]) for s in self.get_symbols()]
+
+    def compile_controlled(self, expressions, backend):
+        """Compiles M and F + u of the Euler-Lagrange equations M*ddQ = F + u with the external generalized forces u.
+
+        The solve formulation has only the accelerations, there M is the hessian of L in the
+        velocities and F = M*ddQ.
+        """
+        u = sp.Matrix(self.get_input_symbols())
+        if self.formulation == 'mass_matrix':
+            M, F = expressions['M'], expressions['F']
+        else:
+            M = sp.hessian(expressions['L'], [s[1] for s in self.get_symbols()])
+            F = M*sp.Matrix(expressions['ode'])
+        return compile_function(list(M)+list(F+u), self.get_arguments([('u', list(u))]), name='controlled', backend=backend)
+
+    def get_stepper(self, x0 = None, t0 = 0, substeps = 1, outputs = False, parameters = None, backend = None, history = 4096):
+        """Returns a control.Stepper, which advances the system with fixed RK4 steps under external generalized forces.
+
+        With outputs the global coordinates of the plot points are evaluated into stepper.output
+        after every step, in the layout of get_kinematics().positions.
+        """
+        from control import Stepper, NumericInputs, NumericOutputs
+        self.derive()
+        if x0 is None:
+            x0 = self.get_x0()
+        if backend is None:
+            backend = self.backend
+        dofs = [str(s[0]) for s in self.get_symbols()]
+        if self.engine == 'numeric':
+            engine = self.get_numeric_engine(parameters)
+            function = NumericInputs(engine)
+            positions = NumericOutputs(engine) if outputs else None
+        else:
+            key = ('controlled', backend)
+            if key not in self.compiled:
+                with self.profiler.phase('compile_controlled'):
+                    self.compiled[key] = self.compile_controlled(self.derive(), backend)
+            function = self.compiled[key]
+            positions = None
+            if outputs:
+                key = ('outputs', backend)
+                if key not in self.compiled:
+                    with self.profiler.phase('compile_outputs'):
+                        self.compiled[key] = compile_function(Kinematics.expressions(self)[0], self.get_arguments(),
+                                                              name='outputs', backend=backend)
+                positions = self.compiled[key]
+            if self.parameters:
+                p = self.get_parameter_values(parameters)
+                function = BoundFunction(function, p)
+                positions = BoundFunction(positions, p) if outputs else None
+        slices = self.get_kinematics(parameters).slices if outputs else None
+        points = slices[-1].stop if slices else 0
+        return Stepper(function, dofs, x0, t0, substeps, positions, points, history)
+
+    def get_integrator_jacobian(self, method, parameters = None):
+        """Returns the analytic jacobian for the stiff methods and None for all others.
+
+        The step based solvers get a sparse jacobian if less than a quarter of its entries can be nonzero.
+        The numeric engine has no analytic jacobian, the stiff methods approximate it by finite differences.
+        """
+        if method not in STIFF_METHODS or self.engine == 'numeric':
+            return None
+        jac = self.get_jacobian(parameters=parameters)
+        jac.sparse = method in ('radau', 'BDF') and jac.sparsity.mean() < 0.25
+        return jac
+
+    def create_integrator(self, rhs, x0, t0 = 0, parameters = None):
+        return create_integrator(rhs, x0, t0, self.integrator, self.get_integrator_jacobian(self.integrator, parameters))
+
+    def integrate(self, t_span, t_eval = None, x0 = None, parameters = None):
+        """Integrates the system without any plotting and returns the states at the times t_eval.
+
+        If t_eval is not given, the states are sampled every dt between t_span[0] and t_span[1].
+        x0 defaults to the initial conditions of the components. parameters overrides the values
+        of symbolic parameters. The result has the shape (len(t_eval), 2*DOF) with the same layout as get_x0.
+        """
+        self.derive()
+        if t_eval is None:
+            t_eval = np.arange(t_span[0], t_span[1]+self.dt/2, self.dt)
+        t_eval = np.asarray(t_eval, dtype=float)
+        if x0 is None:
+            x0 = self.get_x0()
+        logger.debug("x0 = %s", x0)
+
+        jac = self.get_integrator_jacobian(self.integrator, parameters)
+        rhs = self.profiler.count_calls(self.get_rhs(parameters=parameters), 'rhs')
+        with self.profiler.phase('integrate'):
+            return integrate_ode(rhs, x0, t_span[0], t_eval, self.integrator, jac)
+
+    def record(self, path, t_span, x0 = None, parameters = None, positions = False, chunk_size = 4096):
+        """Integrates the system and streams every frame of length dt into path, see storage.TrajectoryWriter.
+
+        At most chunk_size frames are held in memory, the run can be arbitrarily long. With
+        positions the global coordinates of the plot points are stored as well. Returns a
+        storage.TrajectoryReader of the recording.
+        """
+        from storage import TrajectoryWriter, TrajectoryReader
+        self.derive()
+        if x0 is None:
+            x0 = self.get_x0()
+        frames = int(round((t_span[1]-t_span[0])/self.dt))+1
+        rhs = self.profiler.count_calls(self.get_rhs(parameters=parameters), 'rhs')
+        r = create_integrator(rhs, x0, t_span[0], self.integrator, self.get_integrator_jacobian(self.integrator, parameters))
+        block = min(chunk_size, frames)
+        t = np.empty(block)
+        y = np.empty((block, len(x0)))
+        with self.profiler.phase('record'), TrajectoryWriter(path, self, chunk_size, positions, parameters) as writer:
+            for start in range(0, frames, block):
+                count = min(block, frames-start)
+                for k in range(count):
+                    ti = t_span[0]+(start+k)*self.dt
+                    if ti != r.t:
+                        r.integrate(ti)
+                    if not r.successful():
+                        logger.warning("Integration failed at t = %s", r.t)
+                    t[k] = ti
+                    y[k] = r.y
+                writer.append(t[:count], y[:count])
+        return TrajectoryReader(path)
+
+    def integrate_dense(self, t_span, t_eval = None, x0 = None, events = (), method = None, parameters = None, rtol = 1e-6, atol = 1e-9, strict = True):
+        """Integrates the system with adaptive steps, sampling t_eval by interpolation and locating events.
+
+        events is a list of events.Event. t_eval defaults to one frame every dt, method to the
+        integrator of the Simulation. Returns an integrators.IntegrationResult. If the solver
+        fails an IntegrationError carrying the partial result is raised, with strict=False the
+        failure is only reported in the status of the result.
+        """
+        from events import compile_events
+        self.derive()
+        if t_eval is None:
+            t_eval = np.arange(t_span[0], t_span[1]+self.dt/2, self.dt)
+        if x0 is None:
+            x0 = self.get_x0()
+        if method is None:
+            method = self.integrator
+        compiled = compile_events(self, list(events))
+        if self.parameters:
+            p = self.get_parameter_values(parameters)
+            compiled = [event.bind(p) for event in compiled]
+        jac = self.get_integrator_jacobian(method, parameters)
+        rhs = self.profiler.count_calls(self.get_rhs(parameters=parameters), 'rhs')
+        with self.profiler.phase('integrate_dense'):
+            result = integrate_dense(rhs, x0, t_span, t_eval, method, jac, compiled, rtol, atol)
+        if strict and not result.success:
+            raise IntegrationError("Integration failed: {}".format(result.message), result)
+        return result
+
+    def integrate_ensemble(self, x0s, t_span, t_eval = None, chunk_size = None, parameters = None):
+        """Integrates the system for many initial conditions at once.
+
+        x0s has the shape (N, 2*DOF). All members of a chunk are integrated as one large ode
+        whose right hand side is evaluated for the whole chunk in one vectorized call. chunk_size
+        bounds the number of members integrated together and thereby the memory of the integrator.
+        The integrator of the Simulation is used, the stiff methods approximate the jacobian of
+        the chunk by finite differences. Returns an array of shape (N, len(t_eval), 2*DOF).
+        """
+        self.derive()
+        if t_eval is None:
+            t_eval = np.arange(t_span[0], t_span[1]+self.dt/2, self.dt)
+        t_eval = np.asarray(t_eval, dtype=float)
+        x0s = np.atleast_2d(np.asarray(x0s, dtype=float))
+        N, n = x0s.shape
+        if chunk_size is None:
+            chunk_size = N
+
+        rhs = self.profiler.count_calls(self.get_rhs(vectorized=True, parameters=parameters), 'rhs_vectorized')
+        y = np.empty((N, len(t_eval), n))
+        with self.profiler.phase('integrate_ensemble'):
+            for start in range(0, N, chunk_size):
+                chunk = x0s[start:start+chunk_size]
+                m = len(chunk)
+                logger.debug("Integrating ensemble members %s to %s", start, start+m)
+
+                def flat(t, x, out = None):
+                    # a fresh array, the step based solvers keep the returned derivatives
+                    return rhs(t, x.reshape(n,m)).ravel()
+                r = create_integrator(flat, chunk.T.ravel(), t_span[0], self.integrator)
+                for i,ti in enumerate(t_eval):
+                    if ti != r.t:
+                        r.integrate(ti)
+                    if not r.successful():
+                        logger.warning("Integration failed at t = %s", r.t)
+                    y[start:start+m,i] = r.y.reshape(n,m).T
+        return y
+
+    def get_variational_integrator(self, scheme = 'midpoint', parameters = None):
+        """Returns the variational integrator of the given scheme, see symplectic.VariationalIntegrator"""
+        from symplectic import VariationalIntegrator
+        if self.engine == 'numeric':
+            raise ValueError("The variational integrators need the Lagrangian of the symbolic engine")
+        self.derive()
+        key = ('variational', scheme)
+        if key not in self.compiled:
+            with self.profiler.phase('compile_variational'):
+                self.compiled[key] = VariationalIntegrator.compile(self, scheme)
+        integrator = self.compiled[key]
+        if self.parameters:
+            return integrator.bind(self.get_parameter_values(parameters))
+        return integrator
+
+    def integrate_symplectic(self, t_span, x0 = None, scheme = 'midpoint', substeps = 1, parameters = None):
+        """Integrates the system with a fixed step variational integrator derived from the Lagrangian.
+
+        scheme is 'midpoint' or 'verlet'. Every frame of length dt is split into substeps steps.
+        The energy error of conservative systems stays bounded even for large steps, dampening is
+        ignored. The states are returned every dt from t_span[0] to t_span[1], for x0 of shape
+        (N, 2*DOF) the result has the shape (N, frames, 2*DOF) as for integrate_ensemble.
+        """
+        if x0 is None:
+            x0 = self.get_x0()
+        x0 = np.asarray(x0, dtype=float)
+        frames = int(round((t_span[1]-t_span[0])/self.dt))
+        integrator = self.get_variational_integrator(scheme, parameters)
+        with self.profiler.phase('integrate_symplectic'):
+            y = integrator.integrate(np.atleast_2d(x0), t_span[0], self.dt/substeps, frames*substeps, substeps)
+        return y if x0.ndim == 2 else y[0]
+
+    def get_linearization(self, parameters = None):
+        """Returns the linear.Linearization of the system, which finds equilibria and linearizes around them"""
+        from linear import Linearization
+        self.derive()
+        n = len(self.get_symbols())
+        if self.engine == 'numeric':
+            engine = self.get_numeric_engine(parameters)
+            return Linearization(engine.mass_matrix, None, engine, n)
+        if 'mass' not in self.compiled:
+            with self.profiler.phase('compile_linearization'):
+                self.compiled['mass'] = Linearization.compile_mass(self)
+        mass = self.compiled['mass']
+        if self.parameters:
+            mass = BoundFunction(mass, self.get_parameter_values(parameters))
+        return Linearization(mass, self.get_jacobian(parameters=parameters), self.get_rhs(parameters=parameters), n)
+
+    def equilibrium(self, q0 = None, t = 0, parameters = None):
+        """Returns the rest state [Q0, 0, Q1, 0, ...] whose positions are the equilibrium next to q0.
+
+        q0 defaults to the initial positions of the components.
+        """
+        linearization = self.get_linearization(parameters)
+        if q0 is None:
+            q0 = self.get_x0()[0::2]
+        return linearization.state(linearization.equilibrium(q0, t))
+
+    def linearize(self, y0 = None, t0 = 0, parameters = None):
+        """Returns the linear.LinearSystem around the state y0, by default around the equilibrium next to the initial positions.
+
+        Its natural frequencies, mode shapes, eigenvalues and stability margin are plain linear
+        algebra, propagate evaluates the small oscillations with matrix exponentials.
+        """
+        if y0 is None:
+            y0 = self.equilibrium(t=t0, parameters=parameters)
+        with self.profiler.phase('linearize'):
+            return self.get_linearization(parameters).linearize(y0, t0)
+
+    def floquet(self, period, y0 = None, t0 = 0, parameters = None):
+        """Returns the linear.Floquet stability analysis of the periodic motion through y0 at t0.
+
+        For systems driven by moving FixGroup components with the given period. y0 defaults to the
+        equilibrium next to the initial positions of the system frozen at t0.
+        """
+        if y0 is None:
+            y0 = self.equilibrium(t=t0, parameters=parameters)
+        with self.profiler.phase('floquet'):
+            return self.get_linearization(parameters).floquet(y0, period, t0)
+
+    def export(self, path, jacobian = True, parameters = None):
+        """Writes the derived model into a standalone python module which only needs numpy, see export.generate.
+
+        Load it with export.load_model(path), which imports neither sympy nor this package.
+        """
+        from export import export_model
+        with self.profiler.phase('export'):
+            return export_model(self, path, jacobian, parameters)
+
+    def render(self, path = 'lagrange.mp4', t_span = (0, 10), x0 = None, parameters = None, **options):
+        """Integrates the system over t_span and renders the trajectory offline into a movie.
+
+        The frames are sampled every dt from t_span[0] up to but excluding t_span[1], such that
+        (0, 300*dt) gives 300 frames. options (size, dpi, fps, processes, ...) are passed to render.render_movie.
+        """
+        from render import render_movie
+        t = np.arange(t_span[0], t_span[1]-self.dt/2, self.dt)
+        y = self.integrate(t_span, t_eval=t, x0=x0, parameters=parameters)
+        with self.profiler.phase('render'):
+            return render_movie(self, t, y, path, parameters=parameters, **options)
+
+    def run(self, pipelined = False, buffer_size = 256, collections = False, trail = 0):
+        """Animates the system.
+
+        By default every frame integrates one step of dt before drawing and the animation stops
+        after 300 frames. With pipelined the integration runs ahead in a background process which
+        fills a ring buffer of buffer_size states, the animation only draws the buffered states
+        and runs until the window is closed. If the producer falls behind the last state is drawn again.
+        With collections all components are drawn by a few collections instead of one artist each,
+        which keeps the blitting fast for hundreds of components, see display.CollectionRenderer.
+        trail > 0 additionally draws the last trail positions of every mass.
+        """
+        import display
+        display.run(self, pipelined, buffer_size, collections, trail)
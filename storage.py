@@ -0,0 +1,209 @@
+import os
+import json
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+STORAGE_VERSION = 1
+
+
+def _chunk_path(directory, name, index):
+    return os.path.join(directory, '{}_{:05d}.npy'.format(name, index))
+
+
+def structure(sim):
+    """Returns the class, the parent indices and the DOF names of every object of sim"""
+    index = {id(object): i for i, object in enumerate(sim.Objects)}
+    return [{'class': type(object).__name__, 'parents': [index.get(id(parent), -1) for parent in object.get_parents()],
+             'dofs': [str(s[0]) for s in object.get_symbol()]} for object in sim.Objects]
+
+
+def describe(sim, parameters = None, kinematics = None):
+    """Returns the metadata header of a trajectory of sim.
+
+    It describes the state layout (the names of the Q and dQ symbols of get_symbols in the order
+    of get_x0), which DOFs and plot points belong to which object, and the parameters the
+    trajectory was integrated with.
+    """
+    sim.derive()
+    objects = structure(sim)
+    for i, entry in enumerate(objects):
+        if kinematics is not None:
+            s = kinematics.slices[i]
+            entry['points'] = [s.start, s.stop]
+    return {
+        'version': STORAGE_VERSION,
+        'state': [str(symbol) for symbol in sim.get_state_symbols()],
+        'dof': len(sim.get_symbols()),
+        'objects': objects,
+        'parameters': {str(symbol): float(value) for (symbol, default), value in
+                       zip(sim.parameters, sim.get_parameter_values(parameters))},
+        'dt': sim.dt,
+        'xlim': list(sim.xlim),
+        'ylim': list(sim.ylim),
+    }
+
+
+class TrajectoryWriter:
+    """Streams a trajectory into a directory of memory mapped chunk files.
+
+    Every chunk holds chunk_size frames of the times (times_<k>.npy), the states
+    (states_<k>.npy) and, with positions, the global coordinates of the plot points evaluated
+    with the compiled kinematics (positions_<k>.npy). Only the current chunk is mapped, a full
+    chunk is flushed and closed, such that the memory stays constant for arbitrarily long runs.
+    meta.json holds the header of describe and the number of written frames, it is rewritten
+    with every finished chunk and on close.
+    """
+    def __init__(self, path, sim, chunk_size = 4096, positions = False, parameters = None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.kinematics = sim.get_kinematics(parameters) if positions else None
+        self.meta = describe(sim, parameters, self.kinematics)
+        self.meta['chunk_size'] = chunk_size
+        self.meta['positions'] = positions
+        self.meta['length'] = 0
+        self.n = len(self.meta['state'])
+        self.points = len(self.kinematics.positions(0., np.zeros(self.n))) if positions else 0
+        self.chunk = -1
+        self.fill = chunk_size
+        self.arrays = None
+        os.makedirs(path, exist_ok=True)
+        self.write_meta()
+
+    def write_meta(self):
+        tmp = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp, 'w') as file:
+            json.dump(self.meta, file, indent=1)
+        os.replace(tmp, os.path.join(self.path, 'meta.json'))
+
+    def next_chunk(self):
+        self.flush()
+        self.chunk += 1
+        self.fill = 0
+        shapes = {'times': (self.chunk_size,), 'states': (self.chunk_size, self.n)}
+        if self.kinematics is not None:
+            shapes['positions'] = (self.chunk_size, self.points, 2)
+        self.arrays = {name: np.lib.format.open_memmap(_chunk_path(self.path, name, self.chunk), mode='w+',
+                                                       dtype=float, shape=shape)
+                       for name, shape in shapes.items()}
+        logger.debug("Opened chunk %s of %s", self.chunk, self.path)
+
+    def flush(self):
+        if self.arrays is not None:
+            for array in self.arrays.values():
+                array.flush()
+            self.write_meta()
+
+    def append(self, t, y):
+        """Appends one frame (a time and a state) or a block of frames (times of shape (K,) and states of shape (K, 2*DOF))"""
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        y = np.asarray(y, dtype=float).reshape(-1, self.n)
+        start = 0
+        while start < len(t):
+            if self.fill == self.chunk_size:
+                self.next_chunk()
+            count = min(len(t)-start, self.chunk_size-self.fill)
+            block = slice(self.fill, self.fill+count)
+            self.arrays['times'][block] = t[start:start+count]
+            self.arrays['states'][block] = y[start:start+count]
+            if self.kinematics is not None:
+                self.arrays['positions'][block] = self.kinematics.positions(t[start:start+count], y[start:start+count])
+            self.fill += count
+            self.meta['length'] += count
+            start += count
+
+    def close(self):
+        self.flush()
+        self.arrays = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryReader:
+    """Reads a trajectory written by TrajectoryWriter.
+
+    The chunks are opened as read only memory maps, so even files larger than the memory can be
+    sliced. len(reader) is the number of frames, reader[k] returns the time and the state of the
+    k-th frame and read(start, stop) the arrays of a range of frames.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as file:
+            self.meta = json.load(file)
+        if self.meta['version'] != STORAGE_VERSION:
+            raise ValueError("Unsupported trajectory version {}".format(self.meta['version']))
+        self.chunk_size = self.meta['chunk_size']
+        self.has_positions = self.meta['positions']
+        self.opened = {}
+
+    def __len__(self):
+        return self.meta['length']
+
+    def chunk(self, name, index):
+        """Returns the memory map of one chunk file, the last opened chunk of every name is kept open"""
+        if self.opened.get(name, (None,))[0] != index:
+            self.opened[name] = (index, np.load(_chunk_path(self.path, name, index), mmap_mode='r'))
+        return self.opened[name][1]
+
+    def chunks(self, names = ('times', 'states')):
+        """Yields the arrays of the given names chunk by chunk, the last chunk is cut to the written frames"""
+        for index in range((len(self)+self.chunk_size-1)//self.chunk_size):
+            count = min(self.chunk_size, len(self)-index*self.chunk_size)
+            yield tuple(self.chunk(name, index)[:count] for name in names)
+
+    def read(self, start = 0, stop = None, name = 'states'):
+        """Returns the frames start to stop of the times, states or positions as one array"""
+        if name == 'positions' and not self.has_positions:
+            raise ValueError("recording has no positions")
+        stop = len(self) if stop is None else min(stop, len(self))
+        if not len(self):
+            # no chunk was written yet
+            if name == 'times':
+                return np.empty(0)
+            if name == 'positions':
+                return np.empty((0, self.slices[-1].stop if self.slices else 0, 2))
+            return np.empty((0, len(self.meta['state'])))
+        parts = [self.chunk(name, 0)[:0]]
+        for index in range(start//self.chunk_size, (stop+self.chunk_size-1)//self.chunk_size):
+            offset = index*self.chunk_size
+            parts.append(self.chunk(name, index)[max(start-offset, 0):stop-offset])
+        return np.concatenate(parts)
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError("Frame {} out of range".format(k))
+        index, offset = divmod(k, self.chunk_size)
+        return float(self.chunk('times', index)[offset]), np.array(self.chunk('states', index)[offset])
+
+    def positions(self, k):
+        """Returns the recorded plot points of the k-th frame, the points of the i-th object are positions[slices[i]]"""
+        if not self.has_positions:
+            raise ValueError("recording has no positions")
+        index, offset = divmod(k, self.chunk_size)
+        return np.array(self.chunk('positions', index)[offset])
+
+    @property
+    def slices(self):
+        return [slice(*object['points']) for object in self.meta['objects']]
+
+    def check(self, sim):
+        """Raises a ValueError if sim has not the component graph the trajectory was recorded with"""
+        sim.derive()
+        recorded = [{key: object[key] for key in ('class', 'parents', 'dofs')} for object in self.meta['objects']]
+        if structure(sim) != recorded:
+            raise ValueError("The trajectory {} was recorded with different components".format(self.path))
+
+    def replay(self, sim, interval = None, collections = False, trail = 0):
+        """Animates the recorded frames with the artists of sim, see display.replay"""
+        import display
+        self.check(sim)
+        return display.replay(sim, self, interval, collections, trail)
@@ -0,0 +1,67 @@
+import os
+import itertools
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from compiler import BoundFunction, MassMatrixRHS
+from integrators import integrate_ode
+
+import logging
+
+logger = logging.getLogger('Lagrange_Mechanics')
+
+
+def parameter_grid(grid):
+    """Expands a dict from parameter names to lists of values into the list of all combinations"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+_worker = {}
+
+
+def _init_worker(function, n, mass_matrix, numeric, x0, t0, t_eval, method):
+    _worker.update(function=function, n=n, mass_matrix=mass_matrix, numeric=numeric, x0=x0, t0=t0, t_eval=t_eval, method=method)
+
+
+def _run(p):
+    if _worker['numeric']:
+        return integrate_ode(_worker['function'].bind(p), _worker['x0'], _worker['t0'], _worker['t_eval'], _worker['method'])
+    rhs = BoundFunction(_worker['function'], p)
+    if _worker['mass_matrix']:
+        rhs = MassMatrixRHS(rhs, _worker['n'])
+    return integrate_ode(rhs, _worker['x0'], _worker['t0'], _worker['t_eval'], _worker['method'])
+
+
+def sweep(sim, grid, t_span, t_eval = None, x0 = None, processes = None):
+    """Integrates sim for every parameter combination of grid.
+
+    sim must be created with symbolic_parameters=True, such that the equations are derived only
+    once. grid is either a dict from parameter names to lists of values, whose cartesian product
+    is used, or a list of dicts. Only the generated code of the right hand side, or the
+    NumericEngine with the numeric engine, is sent to the worker processes, the stiff
+    integrators therefore fall back to finite difference jacobians.
+    Returns the list of parameter dicts and an array of shape (len(parameters), len(t_eval), 2*DOF).
+    """
+    if not sim.symbolic_parameters:
+        raise ValueError("The parameter sweep needs a Simulation with symbolic_parameters=True")
+    sim.derive()
+    if isinstance(grid, dict):
+        grid = parameter_grid(grid)
+    if t_eval is None:
+        t_eval = np.arange(t_span[0], t_span[1]+sim.dt/2, sim.dt)
+    t_eval = np.asarray(t_eval, dtype=float)
+    if x0 is None:
+        x0 = sim.get_x0()
+
+    numeric = sim.engine == 'numeric'
+    function = sim.get_numeric_engine() if numeric else sim.get_compiled_rhs()
+    p = [sim.get_parameter_values(parameters) for parameters in grid]
+    logger.debug("Sweeping %s parameter sets", len(p))
+    initargs = (function, len(sim.get_symbols()), sim.formulation == 'mass_matrix', numeric, x0, t_span[0], t_eval, sim.integrator)
+    chunksize = max(1, len(p)//(4*(processes or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=initargs) as pool:
+        y = list(pool.map(_run, p, chunksize=chunksize))
+    return grid, np.array(y)
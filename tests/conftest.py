@@ -0,0 +1,8 @@
+import os
+import sys
+import logging
+
+# the modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.getLogger('Lagrange_Mechanics').setLevel(logging.WARNING)
@@ -0,0 +1,66 @@
+"""Small models shared by the tests, each returns a Simulation created with the given options"""
+import numpy as np
+import sympy as sp
+
+from components import FixPoint, FixLine, FixCircle, Point, Connector, Spring, Trolley
+from simulation import Simulation
+
+
+def pendulum(**options):
+    sim = Simulation(**options)
+    Base = FixPoint()
+    C1 = Connector(Base, phi0=np.pi/4)
+    P1 = Point(C1)
+    sim.addObjects([Base, C1, P1])
+    return sim
+
+
+def double_pendulum(**options):
+    sim = Simulation(**options)
+    Base = FixPoint()
+    C1 = Connector(Base, phi0=np.pi/4)
+    P1 = Point(C1)
+    C2 = Connector(P1, length=0.5, dampening=0.1)
+    P2 = Point(C2, mass=2)
+    sim.addObjects([Base, C1, P1, C2, P2])
+    return sim
+
+
+def restricted_spring(**options):
+    sim = Simulation(**options)
+    Base = FixPoint(position=[0, 1])
+    L1 = FixLine()
+    T1 = Trolley(L1, loc0=-1, mass=2)
+    S1 = Spring(Base, T1, k=20)
+    C1 = Connector(T1, length=0.5)
+    P1 = Point(C1, mass=0.1)
+    sim.addObjects([Base, L1, T1, S1, C1, P1])
+    return sim
+
+
+def swinging_spring(**options):
+    sim = Simulation(**options)
+    Base = FixPoint()
+    S1 = Spring(Base, phi0=np.pi/8, k=100)
+    P1 = Point(S1)
+    sim.addObjects([Base, S1, P1])
+    return sim
+
+
+def moving_circle(**options):
+    sim = Simulation(**options)
+    Base = FixCircle(1/4, midpoint=[0.3*sp.sin(2*sim.t), sp.Integer(0)], moving=True)
+    T1 = Trolley(Base, np.pi, mass=10)
+    C1 = Connector(T1, phi0=8/9*np.pi)
+    P1 = Point(C1)
+    sim.addObjects([Base, T1, C1, P1])
+    return sim
+
+
+MODELS = [pendulum, double_pendulum, restricted_spring, swinging_spring, moving_circle]
+
+
+def states(sim, count = 3, seed = 0):
+    """Returns states scattered around the initial conditions of sim"""
+    x0 = np.array(sim.get_x0(), dtype=float)
+    return x0 + 0.2*np.random.default_rng(seed).normal(size=(count, len(x0)))
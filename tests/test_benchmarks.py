@@ -0,0 +1,50 @@
+import json
+
+import benchmarks
+from benchmarks import compare, key, unmatched
+
+
+def result(family = 'pendulum_chain', n = 1, engine = 'symbolic', **metrics):
+    values = {'family': family, 'n': n, 'formulation': 'mass_matrix', 'backend': 'numpy', 'engine': engine,
+              'derive_time': 1., 'compile_time': 0.1, 'peak_memory': None, 'expression_size': 10,
+              'rhs_per_second': 1000., 'simulated_seconds_per_second': 10., 'render_fps': 30.}
+    values.update(metrics)
+    return values
+
+
+def test_compare_finds_regressions():
+    baseline = [result()]
+    assert compare([result(derive_time=1.1, render_fps=28.)], baseline) == []
+    regressions = compare([result(derive_time=2., rhs_per_second=500.)], baseline)
+    assert sorted(metric for k, metric, old, new in regressions) == ['derive_time', 'rhs_per_second']
+
+
+def test_old_baselines_are_symbolic():
+    old = result()
+    del old['engine']
+    assert key(old) == key(result())
+    assert key(result(engine='numeric')) != key(result())
+
+
+def test_unmatched_keys_of_both_sides():
+    missing, dropped = unmatched([result(n=1), result(n=2)], [result(n=1), result(engine='numeric')])
+    assert missing == [key(result(n=2))]
+    assert dropped == [key(result(engine='numeric'))]
+
+
+def test_main_fails_without_matching_results(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(benchmarks, 'benchmark', lambda family, n, *args, engine = 'symbolic', **options: result(family, n, engine))
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'results': [result(n=5)]}))
+    assert benchmarks.main(['--families', 'pendulum_chain', '--sizes', '1', '--baseline', str(baseline)]) == 1
+    assert "Not in the baseline: pendulum_chain n=1" in capsys.readouterr().out
+    baseline.write_text(json.dumps({'results': [result(n=1)]}))
+    assert benchmarks.main(['--families', 'pendulum_chain', '--sizes', '1', '--baseline', str(baseline)]) == 0
+    assert "Not in the baseline: pendulum_chain n=1 (mass_matrix, numpy, numeric)" in capsys.readouterr().out
+
+
+def test_stored_baseline_covers_both_engines():
+    with open(benchmarks.__file__.replace('benchmarks.py', 'benchmark_baseline.json')) as file:
+        results = json.load(file)['results']
+    assert {r['engine'] for r in results} == {'symbolic', 'numeric'}
+    assert {r['family'] for r in results} == set(benchmarks.FAMILIES)
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+from cache import EquationCache, topology_key
+from systems import double_pendulum, pendulum, states
+
+
+def test_topology_key():
+    sim = double_pendulum()
+    key = topology_key(sim.Objects, 9.81, 'solve')
+    assert key == topology_key(double_pendulum().Objects, 9.81, 'solve')
+    assert key != topology_key(sim.Objects, 9.81, 'mass_matrix')
+    sim.Objects[4].mass = 3
+    assert key != topology_key(sim.Objects, 9.81, 'solve')
+
+
+def test_derived_equations_are_loaded(tmp_path, monkeypatch):
+    cache = EquationCache(str(tmp_path))
+    first = double_pendulum(cache=cache)
+    first.derive()
+    assert len(cache.entries()) == 1
+
+    second = double_pendulum(cache=cache)
+
+    def fail(*args):
+        raise AssertionError("derived although cached")
+    monkeypatch.setattr(second, 'calculate_lagrange_expr', fail)
+    y = states(first)[0]
+    np.testing.assert_allclose(second.get_rhs()(0, y), first.get_rhs()(0, y))
+
+
+def test_changed_parameters_miss(tmp_path):
+    cache = EquationCache(str(tmp_path))
+    pendulum(cache=cache).derive()
+    sim = pendulum(cache=cache)
+    sim.Objects[1].length = 2
+    sim.derive()
+    assert len(cache.entries()) == 2
+
+
+def test_unreadable_entries_are_dropped(tmp_path):
+    cache = EquationCache(str(tmp_path))
+    with open(cache.path('broken'), 'wb') as file:
+        file.write(b'no pickle')
+    assert cache.get('broken') is None
+    assert not os.path.exists(cache.path('broken'))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EquationCache(str(tmp_path), max_entries=2)
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, i)
+        os.utime(cache.path(key), (i, i))
+    assert cache.get('a') is None
+    assert cache.get('b') == 1 and cache.get('c') == 2
+    cache.clear()
+    assert cache.entries() == []
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import chaos
+from events import Event
+from systems import pendulum
+
+
+def section(sim):
+    return Event(lambda: sim.get_symbols()[0][0], direction=1)
+
+
+def test_pendulum_is_regular():
+    sim = pendulum()
+    result = chaos.analyze(sim, [[0.1, 0]], (0, 40), exponents=2, section=section(sim), processes=1)[0]
+    # the exponents of a regular orbit decay like log(t)/t, the conservative flow keeps their sum at 0
+    assert np.abs(result.exponents).max() < 0.2
+    assert abs(result.exponents.sum()) < 1e-6
+    assert len(result.history) == 40
+    # released at rest on the positive side, the pendulum first passes Q0 = 0 upwards after 3/4 of a period
+    period = 2*np.pi/np.sqrt(sim.get_g())
+    assert len(result.crossing_times) == int(40/period + 0.25)
+    np.testing.assert_allclose(np.diff(result.crossing_times), period, rtol=1e-3)
+    np.testing.assert_allclose(result.crossings[:, 0], 0, atol=1e-9)
+    assert (result.crossings[:, 1] > 0).all()
+
+
+@pytest.mark.parametrize('engine', ['symbolic', 'numeric'])
+def test_engines_agree(engine):
+    sim = pendulum(engine=engine)
+    reference = pendulum()
+    x0s = [[0.5, 0], [2., 0]]
+    results = chaos.analyze(sim, x0s, (0, 5), processes=1)
+    expected = [chaos.lyapunov(reference.get_rhs(), reference.get_jacobian(), x0, (0, 5)) for x0 in x0s]
+    for result, single in zip(results, expected):
+        np.testing.assert_allclose(result.exponents, single.exponents, atol=1e-4)
@@ -0,0 +1,70 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+import sympy as sp
+
+from compiler import compile_function, private_directory
+from systems import double_pendulum, states
+
+
+BACKENDS = ['numpy', 'lambdify'] + (['c'] if shutil.which(os.environ.get('CC', 'cc')) else [])
+
+
+def expressions():
+    x, y = sp.symbols('x y')
+    z = sp.symbols('z0:3')
+    return [sp.sin(x)*z[0] + sp.cos(x)**2, sp.sin(x)*z[1]*y, sp.exp(-y)*z[2]], [('x', x), ('y', y), ('z', list(z))]
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv('LAGRANGE_CACHE_DIR', str(tmp_path / 'cache'))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_evaluate_the_expressions(backend):
+    exprs, args = expressions()
+    function = compile_function(exprs, args, name='f', backend=backend)
+    z = np.array([1., 2., 3.])
+    expected = [np.sin(0.5)*1 + np.cos(0.5)**2, np.sin(0.5)*2*0.25, np.exp(-0.25)*3]
+    np.testing.assert_allclose(function(0.5, 0.25, z), expected)
+    out = np.empty(3)
+    assert function(0.5, 0.25, z, out=out) is out
+    if backend != 'lambdify':
+        # only the generated source is pickled
+        np.testing.assert_allclose(pickle.loads(pickle.dumps(function))(0.5, 0.25, z), expected)
+
+
+def test_common_subexpressions_are_evaluated_once():
+    exprs, args = expressions()
+    function = compile_function(exprs, args, backend='numpy')
+    assert function.source.count('math.sin(x)') == 1
+
+
+def test_vectorized():
+    exprs, args = expressions()
+    function = compile_function(exprs, args, backend='numpy', vectorized=True)
+    z = np.arange(6.).reshape(3, 2)
+    out = function(np.array([0.5, 1.]), 0.25, z)
+    assert out.shape == (3, 2)
+    np.testing.assert_allclose(out[:, 1], compile_function(exprs, args)(1., 0.25, z[:, 1]))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_simulation_backends_agree(backend):
+    reference = double_pendulum(formulation='mass_matrix')
+    sim = double_pendulum(formulation='mass_matrix', backend=backend)
+    for y in states(sim):
+        np.testing.assert_allclose(sim.get_rhs()(0, y), reference.get_rhs()(0, y), atol=1e-12)
+
+
+def test_private_directory(tmp_path):
+    directory = str(tmp_path / 'libraries')
+    os.makedirs(directory, mode=0o777)
+    os.chmod(directory, 0o777)
+    private_directory(directory)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert os.stat(private_directory(str(tmp_path / 'new'))).st_mode & 0o777 == 0o700
@@ -0,0 +1,46 @@
+import numpy as np
+import sympy as sp
+
+from components import FixPoint, FixLine, Connector, Spring, Trolley
+from simulation import Simulation
+
+
+def kinetic_energy(sim):
+    sim.setup()
+    T = sum(object.kinetic_expr() for object in sim.Objects)
+    E = [T]
+    for object in sim.Objects:
+        object.substitude_symbols(E)
+    return E[0]
+
+
+def test_trolley_on_connector_moves_along_it():
+    sim = Simulation()
+    Base = FixPoint()
+    C1 = Connector(Base, phi0=0.3)
+    T1 = Trolley(C1, loc0=0.5)
+    sim.addObjects([Base, C1, T1])
+    Q0, dQ0, Q1, dQ1 = sp.symbols('Q0 dQ0 Q1 dQ1')
+    assert sp.simplify(kinetic_energy(sim) - (0.5*Q1**2*dQ0**2 + 0.5*dQ1**2)) == 0
+
+
+def test_trolley_on_spring_between_points_moves_along_it():
+    sim = Simulation()
+    Base = FixPoint()
+    L1 = FixLine()
+    T1 = Trolley(L1, loc0=1)
+    S1 = Spring(Base, T1)
+    T2 = Trolley(S1, loc0=0.5)
+    sim.addObjects([Base, L1, T1, S1, T2])
+    Q0, dQ0, Q1, dQ1 = sp.symbols('Q0 dQ0 Q1 dQ1')
+    assert sp.simplify(kinetic_energy(sim) - (0.5*dQ0**2 + 0.5*(Q0*dQ1 + Q1*dQ0)**2)) == 0
+
+
+def test_trolley_on_connector_integrates():
+    sim = Simulation(formulation='mass_matrix')
+    Base = FixPoint()
+    C1 = Connector(Base, phi0=0.3)
+    T1 = Trolley(C1, loc0=0.5)
+    sim.addObjects([Base, C1, T1])
+    y = sim.integrate((0, 0.5))
+    assert np.all(np.isfinite(y))
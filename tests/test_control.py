@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from systems import double_pendulum, pendulum, restricted_spring
+
+
+@pytest.mark.parametrize('options', [{'formulation': 'solve'}, {'formulation': 'mass_matrix'}, {'engine': 'numeric'}])
+def test_stepper_without_input_follows_integrate(options):
+    sim = restricted_spring(**options)
+    dt = 0.01
+    stepper = sim.get_stepper()
+    for k in range(100):
+        stepper.step(dt)
+    reference = sim.integrate((0, 1), t_eval=[0, 1])[-1]
+    assert stepper.t == pytest.approx(1)
+    np.testing.assert_allclose(stepper.y, reference, atol=1e-4)
+    assert stepper.statistics()['steps'] == 100
+
+
+def test_stepper_torque_holds_pendulum():
+    sim = pendulum(formulation='mass_matrix')
+    stepper = sim.get_stepper()
+    C1 = sim.Objects[1]
+    u = np.zeros(1)
+    # the torque of gravity on the pendulum at phi = pi/4
+    u[stepper.index(C1)] = sim.get_g()*np.sin(np.pi/4)
+    for k in range(50):
+        stepper.step(0.01, u)
+    np.testing.assert_allclose(stepper.y, sim.get_x0(), atol=1e-10)
+
+
+def test_stepper_outputs_and_reset():
+    sim = double_pendulum(formulation='mass_matrix')
+    stepper = sim.get_stepper(outputs=True)
+    y = stepper.step(0.01).copy()
+    np.testing.assert_allclose(stepper.output, sim.get_kinematics().positions(stepper.t, y).ravel(), atol=1e-12)
+    stepper.reset(sim.get_x0())
+    assert stepper.t == 0 and stepper.statistics() == {'steps': 0}
+    np.testing.assert_allclose(stepper.step(0.01), y)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from diagnostics import EnergyMonitor
+from systems import double_pendulum, pendulum, restricted_spring
+
+
+def test_energies_of_a_pendulum():
+    sim = pendulum(formulation='mass_matrix')
+    y = np.array([[0., 2.], [np.pi/2, 0.]])
+    g = sim.get_g()
+    energies = sim.get_diagnostics().evaluate(0, y)
+    np.testing.assert_allclose(energies['T'], [2., 0.])
+    np.testing.assert_allclose(energies['U'], [-g, 0.], atol=1e-12)
+    np.testing.assert_allclose(energies['H'], energies['T']+energies['U'])
+    # the kinetic energy belongs to the Point, the third object
+    np.testing.assert_allclose(energies['kinetic'][:, 2], [2., 0.])
+    np.testing.assert_allclose(energies['kinetic'].sum(axis=1), energies['T'])
+    np.testing.assert_allclose(energies['potential'].sum(axis=1), energies['U'])
+
+
+@pytest.mark.parametrize('formulation', ['solve', 'mass_matrix'])
+def test_energy_is_conserved(formulation):
+    sim = restricted_spring(formulation=formulation)
+    t = np.linspace(0, 2, 21)
+    y = sim.integrate((0, 2), t_eval=t)
+    assert sim.get_diagnostics().energy_drift(t, y).max() < 1e-3
+
+
+def test_dampening_dissipates():
+    sim = double_pendulum(formulation='mass_matrix')
+    t = np.linspace(0, 5, 6)
+    H = sim.get_diagnostics().energy(t, sim.integrate((0, 5), t_eval=t))
+    assert np.all(np.diff(H) < 0)
+
+
+def test_energy_monitor():
+    sim = pendulum(formulation='mass_matrix')
+    monitor = EnergyMonitor(sim.get_diagnostics(), tolerance=1e-6)
+    assert monitor.check(0, np.array([0., 1.])) == 0
+    assert monitor.check(0, np.array([0., 1.1])) > 1e-6
+    assert monitor.warned
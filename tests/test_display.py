@@ -0,0 +1,46 @@
+import numpy as np
+
+from matplotlib.figure import Figure
+
+from display import CollectionRenderer
+from systems import double_pendulum, moving_circle, states
+
+
+def renderer(sim, trail = 0):
+    sim.derive()
+    renderer = CollectionRenderer(sim, trail)
+    renderer.init_plot(Figure().add_subplot(111))
+    return renderer
+
+
+def test_draw_updates_the_collections():
+    sim = moving_circle()
+    collections = renderer(sim)
+    kinematics = sim.get_kinematics()
+    assert len(collections.circles) == 1
+    # the Trolley and the Point leave trails, the FixCircle does not
+    np.testing.assert_array_equal(collections.masses, [kinematics.slices[1].start, kinematics.slices[3].start])
+    points = kinematics.positions(0.3, states(sim, 1)[0])
+    collections.draw(points)
+    np.testing.assert_allclose(collections.scatter.get_offsets(), points[collections.markers])
+    np.testing.assert_allclose(collections.circle_collection.get_offsets(), points[collections.circles])
+    segments = collections.lines.get_segments()
+    assert len(segments) == len(collections.segments)
+    np.testing.assert_allclose(segments[0], points[collections.segments[0]])
+
+
+def test_trail_keeps_the_last_positions():
+    sim = double_pendulum()
+    collections = renderer(sim, trail=3)
+    kinematics = sim.get_kinematics()
+    y = states(sim, 5)
+    for state in y:
+        collections.draw(kinematics.positions(0., state))
+    trails = collections.trails.get_segments()
+    assert len(trails) == len(collections.masses) == 2
+    expected = kinematics.positions(0., y[-3:])[:, collections.masses]
+    for k in range(2):
+        np.testing.assert_allclose(trails[k], expected[:, k])
+    collections.clear_trails()
+    collections.draw(kinematics.positions(0., y[0]))
+    assert len(collections.trails.get_segments()[0]) == 1
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from events import Event
+from integrators import IntegrationError, integrate_dense
+from systems import pendulum
+
+
+def small_pendulum():
+    sim = pendulum(formulation='mass_matrix')
+    sim.Objects[1].phi0 = 0.01
+    return sim
+
+
+def test_zero_crossings_are_located():
+    sim = small_pendulum()
+    omega = np.sqrt(sim.get_g())
+    crossing = Event(lambda: sim.get_symbols()[0][0], name='crossing')
+    rising = Event(lambda: sim.get_symbols()[0][0], name='rising', direction=1)
+    result = sim.integrate_dense((0, 3), events=[crossing, rising])
+    assert result.status == 0
+    times, states = result.events['crossing']
+    # the small oscillations cross zero every half period, starting after a quarter
+    np.testing.assert_allclose(times, (np.arange(len(times))+0.5)*np.pi/omega, rtol=1e-4)
+    assert len(times) == int(3*omega/np.pi+0.5)
+    np.testing.assert_allclose(states[:, 0], 0, atol=1e-9)
+    np.testing.assert_allclose(result.events['rising'][0], times[1::2])
+
+
+def test_terminal_event_stops():
+    sim = small_pendulum()
+    stop = Event(lambda: sim.get_symbols()[0][0], terminal=True)
+    result = sim.integrate_dense((0, 3), events=[stop])
+    assert result.status == 1
+    assert result.t[-1] <= result.events[0][0][0]
+
+
+def test_samples_match_integrate():
+    sim = small_pendulum()
+    t = np.linspace(0, 2, 9)
+    result = sim.integrate_dense((0, 2), t_eval=t)
+    np.testing.assert_allclose(result.t, t)
+    np.testing.assert_allclose(result.y, sim.integrate((0, 2), t_eval=t), atol=1e-6)
+
+
+def test_failures_are_reported():
+    def rhs(t, x):
+        # blows up at t = 1
+        return np.array([1/(1-t)**2])
+    result = integrate_dense(rhs, [0.], (0, 2), method='RK45')
+    assert result.status == -1 and not result.success
+
+
+def test_strict_integration_raises(monkeypatch):
+    sim = small_pendulum()
+    sim.derive()
+    monkeypatch.setattr(sim, 'get_rhs', lambda parameters = None: lambda t, y: np.array([1/(1-t)**2, 0.]))
+    with pytest.raises(IntegrationError) as error:
+        sim.integrate_dense((0, 2), method='RK45')
+    assert error.value.result.status == -1
+    assert not sim.integrate_dense((0, 2), method='RK45', strict=False).success
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from export import load_model
+from systems import double_pendulum, moving_circle, restricted_spring, states
+
+
+@pytest.mark.parametrize('model, formulation', [(double_pendulum, 'solve'), (double_pendulum, 'mass_matrix'),
+                                                (moving_circle, 'mass_matrix')])
+def test_exported_module_matches_simulation(tmp_path, model, formulation):
+    sim = model(formulation=formulation)
+    path = sim.export(str(tmp_path / 'model.py'))
+    module = load_model(path)
+    y = states(sim)
+    for state in y:
+        np.testing.assert_allclose(module.rhs(0.3, state), sim.get_rhs()(0.3, state), atol=1e-12)
+        np.testing.assert_allclose(module.jacobian(0.3, state), sim.get_jacobian()(0.3, state), atol=1e-10)
+    np.testing.assert_allclose(module.energy(0.3, y), sim.get_diagnostics().energy(0.3, y), atol=1e-12)
+    np.testing.assert_allclose(module.positions(0.3, y), sim.get_kinematics().positions(0.3, y), atol=1e-12)
+    np.testing.assert_array_equal(module.X0, sim.get_x0())
+
+
+def test_exported_parameters(tmp_path):
+    sim = restricted_spring(formulation='mass_matrix', symbolic_parameters=True)
+    module = load_model(sim.export(str(tmp_path / 'model.py')))
+    parameters = {'g': 3.}
+    p = sim.get_parameter_values(parameters)
+    y = states(sim)[0]
+    np.testing.assert_allclose(module.rhs(0.3, y, p), sim.get_rhs(parameters=parameters)(0.3, y), atol=1e-12)
+    np.testing.assert_allclose(module.rhs(0.3, y), sim.get_rhs()(0.3, y), atol=1e-12)
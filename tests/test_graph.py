@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from components import FixPoint, FixLine, Point, Connector, Trolley
+from graph import ComponentGraph, GraphError
+from simulation import Simulation
+from systems import double_pendulum, pendulum, states
+
+
+def second_pendulum():
+    Base = FixPoint(position=[1, 0])
+    C1 = Connector(Base, length=0.5, phi0=-np.pi/8)
+    P1 = Point(C1, mass=2)
+    return [Base, C1, P1]
+
+
+def two_pendulums(**options):
+    sim = Simulation(**options)
+    Base = FixPoint()
+    C1 = Connector(Base, phi0=np.pi/4)
+    P1 = Point(C1)
+    sim.addObjects([Base, C1, P1] + second_pendulum())
+    return sim
+
+
+def test_removed_components_reuse_the_remaining_shares():
+    sim = double_pendulum(formulation='mass_matrix')
+    sim.derive()
+    misses = sim.contributions.misses
+    sim.removeObjects(sim.Objects[3:])
+    sim.derive()
+    assert sim.contributions.misses == misses
+    y = states(sim)[0]
+    np.testing.assert_allclose(sim.get_rhs()(0, y), pendulum(formulation='mass_matrix').get_rhs()(0, y), atol=1e-12)
+
+
+@pytest.mark.parametrize('symbolic_parameters', [False, True])
+def test_renumbered_shares_are_renamed(symbolic_parameters):
+    sim = two_pendulums(formulation='mass_matrix', symbolic_parameters=symbolic_parameters)
+    sim.derive()
+    misses = sim.contributions.misses
+    sim.removeObjects(sim.Objects[:3])
+    sim.derive()
+    # the DOF Q1 and the parameters of the second pendulum are renamed with xreplace
+    assert sim.contributions.misses == misses
+    reference = Simulation(formulation='mass_matrix', symbolic_parameters=symbolic_parameters)
+    reference.addObjects(second_pendulum())
+    y = states(reference)[0]
+    np.testing.assert_allclose(sim.get_rhs()(0, y), reference.get_rhs()(0, y), atol=1e-12)
+    assert sim.expressions['M'] == reference.expressions['M']
+
+
+def test_invalidate_derives_the_changed_subtree():
+    sim = double_pendulum(formulation='mass_matrix')
+    sim.derive()
+    misses = sim.contributions.misses
+    Base, C1, P1, C2, P2 = sim.Objects
+    P2.mass = 3
+    sim.invalidate()
+    sim.derive()
+    assert sim.contributions.misses == misses+1
+    reference = double_pendulum(formulation='mass_matrix')
+    reference.Objects[4].mass = 3
+    y = states(sim)[0]
+    np.testing.assert_allclose(sim.get_rhs()(0, y), reference.get_rhs()(0, y), atol=1e-12)
+
+
+def test_remove_attached_component_raises():
+    sim = double_pendulum()
+    with pytest.raises(GraphError):
+        sim.removeObjects([sim.Objects[2]])
+
+
+def test_order_puts_parents_first():
+    Base = FixPoint()
+    C1 = Connector(Base)
+    P1 = Point(C1)
+    assert ComponentGraph([P1, Base, C1]).order() == [Base, C1, P1]
+
+
+def test_validate():
+    Base = FixPoint()
+    L1 = FixLine()
+    with pytest.raises(GraphError):
+        ComponentGraph([Base, Point(Base)]).validate()
+    with pytest.raises(GraphError):
+        ComponentGraph([L1, Trolley(FixLine())]).validate()
+
+
+def test_shares_are_bounded():
+    sim = pendulum(formulation='mass_matrix')
+    sim.contributions.max_entries = 3
+    sim.derive()
+    assert len(sim.contributions) == 3
+    Base, C1, P1 = sim.Objects
+    P1.mass = 2
+    sim.invalidate()
+    sim.derive()
+    # the share of the old mass was the least recently used one and is dropped
+    assert len(sim.contributions) == 3
+    misses = sim.contributions.misses
+    sim.invalidate()
+    sim.derive()
+    assert sim.contributions.misses == misses
+    sim.contributions.clear()
+    assert len(sim.contributions) == 0
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from systems import MODELS, double_pendulum, swinging_spring, states
+
+
+def finite_differences(rhs, t, y, h = 1e-6):
+    J = np.empty((len(y), len(y)))
+    for j in range(len(y)):
+        e = np.zeros(len(y))
+        e[j] = h
+        J[:, j] = (rhs(t, y+e) - rhs(t, y-e))/(2*h)
+    return J
+
+
+@pytest.mark.parametrize('formulation', ['solve', 'mass_matrix'])
+@pytest.mark.parametrize('model', MODELS)
+def test_jacobian_matches_finite_differences(model, formulation):
+    sim = model(formulation=formulation)
+    jac = sim.get_jacobian()
+    for y in states(sim):
+        np.testing.assert_allclose(jac(0.3, y), finite_differences(sim.get_rhs(), 0.3, y), atol=1e-6)
+
+
+def test_sparse_jacobian():
+    sim = double_pendulum(formulation='mass_matrix')
+    y = states(sim)[0]
+    np.testing.assert_allclose(sim.get_jacobian(sparse=True)(0, y).toarray(), sim.get_jacobian()(0, y))
+    # the positions only change with the velocities
+    assert not sim.get_jacobian().sparsity[0::2, 0::2].any()
+
+
+# the step based solvers of scipy.integrate run with their loose default tolerances
+@pytest.mark.parametrize('integrator, tolerance', [('bdf', 2e-3), ('radau', 5e-2), ('BDF', 5e-2), ('LSODA', 5e-2)])
+def test_stiff_integrators(integrator, tolerance):
+    t = np.linspace(0, 1, 5)
+    reference = swinging_spring(formulation='mass_matrix').integrate((0, 1), t_eval=t)
+    y = swinging_spring(formulation='mass_matrix', integrator=integrator).integrate((0, 1), t_eval=t)
+    np.testing.assert_allclose(y, reference, atol=tolerance)
+
+
+@pytest.mark.parametrize('integrator, tolerance', [('bdf', 2e-3), ('RK45', 5e-2)])
+def test_ensemble_uses_the_integrator(integrator, tolerance):
+    sim = double_pendulum(formulation='mass_matrix', integrator=integrator)
+    reference = double_pendulum(formulation='mass_matrix')
+    x0s = states(sim)
+    t = np.linspace(0, 1, 5)
+    for x0, y in zip(x0s, sim.integrate_ensemble(x0s, (0, 1), t_eval=t)):
+        np.testing.assert_allclose(y, reference.integrate((0, 1), t_eval=t, x0=x0), atol=tolerance)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from systems import double_pendulum, moving_circle, restricted_spring
+
+
+def test_positions_of_a_double_pendulum():
+    sim = double_pendulum(formulation='mass_matrix')
+    kinematics = sim.get_kinematics()
+    y = np.array([[np.pi/2, 0., 0., 0.], [0., 0., np.pi, 0.]])
+    positions = kinematics.positions(0, y)
+    assert positions.shape == (2, kinematics.slices[-1].stop, 2)
+    # the second point hangs 0.5 below or above the first
+    np.testing.assert_allclose(kinematics.component_positions(0, y, 4)[:, 0], [[1., -0.5], [0., -0.5]], atol=1e-12)
+    np.testing.assert_allclose(kinematics.component_positions(0, y, 2)[:, 0], [[1., 0.], [0., -1.]], atol=1e-12)
+    np.testing.assert_allclose(kinematics.positions(0, y[1]), positions[1])
+
+
+def test_positions_follow_the_components():
+    sim = restricted_spring(formulation='mass_matrix')
+    kinematics = sim.get_kinematics()
+    y = np.array(sim.get_x0(), dtype=float)
+    positions = kinematics.positions(0, y)
+    sim.update(y)
+    for index in (0, 2, 5):
+        np.testing.assert_allclose(positions[kinematics.slices[index]][0], sim.Objects[index].get_position(0), atol=1e-12)
+
+
+def test_moving_anchor_depends_on_time():
+    sim = moving_circle(formulation='mass_matrix')
+    kinematics = sim.get_kinematics()
+    y = np.array(sim.get_x0(), dtype=float)
+    t = np.array([0, np.pi/4])
+    positions = kinematics.positions(t, np.array([y, y]))
+    np.testing.assert_allclose(positions[1]-positions[0], np.tile([0.3, 0.], (len(positions[0]), 1)), atol=1e-12)
@@ -0,0 +1,63 @@
+import numpy as np
+import sympy as sp
+import pytest
+
+from components import FixPoint, Connector, Point
+from simulation import Simulation
+from systems import pendulum, swinging_spring
+
+
+def inverted_pendulum(driven = True, **options):
+    """The dampened pendulum of dampend_inverted_pendulum.py, upright on a vertically oscillating FixPoint"""
+    sim = Simulation(g=1, **options)
+    trace = [sp.Integer(0), 0.1*sp.sin(20*sim.t)] if driven else [sp.Integer(0), sp.Integer(0)]
+    Base = FixPoint(moving=driven, position=trace)
+    C1 = Connector(Base, phi0=np.pi, dampening=0.2)
+    P1 = Point(C1)
+    sim.addObjects([Base, C1, P1])
+    return sim
+
+
+@pytest.mark.parametrize('engine', ['symbolic', 'numeric'])
+def test_pendulum_frequency(engine):
+    sim = pendulum(engine=engine)
+    np.testing.assert_allclose(sim.equilibrium(), [0, 0], atol=1e-8)
+    lin = sim.linearize()
+    np.testing.assert_allclose(lin.natural_frequencies(), [np.sqrt(sim.get_g())/(2*np.pi)], rtol=1e-6)
+    assert lin.is_stable()
+
+
+def test_swinging_spring_frequencies():
+    lin = swinging_spring().linearize()
+    g, k = swinging_spring().get_g(), 100
+    # the stretched spring of length 1 + g/k swings with sqrt(g/l), the mass bounces with sqrt(k/m)
+    expected = np.sort([np.sqrt(g/(1+g/k)), np.sqrt(k)])/(2*np.pi)
+    np.testing.assert_allclose(np.sort(lin.natural_frequencies()), expected, rtol=1e-6)
+
+
+def test_propagate_follows_small_oscillations():
+    sim = pendulum()
+    lin = sim.linearize()
+    x0 = [1e-3, 0]
+    t = np.linspace(0, 2, 9)
+    y = lin.propagate(x0, t)
+    np.testing.assert_allclose(y, sim.integrate((0, 2), t_eval=t, x0=x0), atol=1e-6)
+
+
+def test_drive_stabilizes_the_upright_position():
+    assert not inverted_pendulum(driven=False).linearize(y0=[np.pi, 0]).is_stable()
+    floquet = inverted_pendulum().floquet(2*np.pi/20, y0=[np.pi, 0])
+    assert np.abs(floquet.multipliers()).max() < 1
+    assert floquet.is_stable()
+    assert floquet.stability_margin() > 0
+
+
+def test_floquet_propagate_returns_states():
+    sim = inverted_pendulum()
+    period = 2*np.pi/20
+    floquet = sim.floquet(period, y0=[np.pi, 0])
+    x0 = np.array([np.pi+1e-4, 0])
+    y = floquet.propagate(x0, 3)
+    assert y.shape == (4, 2)
+    np.testing.assert_array_equal(y[0], x0)
+    np.testing.assert_allclose(y, sim.integrate((0, 3*period), t_eval=period*np.arange(4), x0=x0), atol=1e-8)
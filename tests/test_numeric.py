@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from components import FixPoint, FixLine, Point, Connector, Spring, Trolley
+from simulation import Simulation
+from systems import MODELS, states
+
+
+def trolley_on_connector(**options):
+    sim = Simulation(**options)
+    Base = FixPoint()
+    C1 = Connector(Base, phi0=0.3, dampening=0.3)
+    T1 = Trolley(C1, loc0=0.5, dloc0=0.2)
+    sim.addObjects([Base, C1, T1])
+    return sim
+
+
+def trolley_on_spring(**options):
+    sim = Simulation(**options)
+    Base = FixPoint()
+    S1 = Spring(Base, phi0=0.3, dphi0=0.4, dx0=0.3)
+    T1 = Trolley(S1, loc0=0.5, dloc0=-0.1)
+    P1 = Point(S1)
+    sim.addObjects([Base, S1, T1, P1])
+    return sim
+
+
+def trolley_between_points(**options):
+    sim = Simulation(**options)
+    Base = FixPoint()
+    L1 = FixLine()
+    T1 = Trolley(L1, loc0=1)
+    S1 = Spring(Base, T1)
+    T2 = Trolley(S1, loc0=0.5)
+    sim.addObjects([Base, L1, T1, S1, T2])
+    return sim
+
+
+@pytest.mark.parametrize('model', [trolley_on_connector, trolley_on_spring, trolley_between_points])
+def test_trolley_on_moving_parent(model):
+    symbolic = model(formulation='mass_matrix')
+    numeric = model(engine='numeric')
+    rng = np.random.default_rng(0)
+    for k in range(3):
+        y = np.array(symbolic.get_x0()) + 0.3*rng.normal(size=len(symbolic.get_x0()))
+        np.testing.assert_allclose(numeric.get_rhs()(0.2, y), symbolic.get_rhs()(0.2, y), atol=1e-10)
+
+
+def test_engine_pickles():
+    import pickle
+    sim = trolley_on_spring(engine='numeric')
+    rhs = sim.get_rhs()
+    y = np.array(sim.get_x0()) + 0.1
+    np.testing.assert_array_equal(pickle.loads(pickle.dumps(rhs))(0.2, y), rhs(0.2, y))
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_numeric_matches_symbolic(model):
+    symbolic = model(formulation='mass_matrix')
+    numeric = model(engine='numeric')
+    y = states(symbolic)
+    for state in y:
+        np.testing.assert_allclose(numeric.get_rhs()(0.3, state), symbolic.get_rhs()(0.3, state), atol=1e-10)
+    np.testing.assert_allclose(numeric.get_diagnostics().energy(0.3, y), symbolic.get_diagnostics().energy(0.3, y), atol=1e-10)
+    np.testing.assert_allclose(numeric.get_kinematics().positions(0.3, y), symbolic.get_kinematics().positions(0.3, y), atol=1e-12)
+
+
+def branched_tree(n):
+    """A chain of n links with a swinging spring, a Trolley on a Connector and a coupling Spring at every joint"""
+    sim = Simulation(engine='numeric')
+    Base = FixPoint()
+    L1 = FixLine(point1=[-1, -3], point2=[1, -3])
+    sim.addObjects([Base, L1])
+    parent = Base
+    for i in range(n):
+        connector = Connector(parent, length=0.5+0.1*i, offset=0.1, phi0=0.3*i, dampening=0.2)
+        point = Point(connector, mass=1+0.5*i)
+        spring = Spring(point, k=30, phi0=-0.2, x0=0.1)
+        trolley = Trolley(connector, loc0=0.3, mass=0.5)
+        slider = Trolley(L1, loc0=0.1*i)
+        sim.addObjects([connector, point, spring, Point(spring, local=0.6), Point(spring, mass=0.3), trolley,
+                        slider, Spring(trolley, slider, k=10)])
+        parent = point
+    return sim
+
+
+def test_recursion_matches_dense_solution():
+    sim = branched_tree(4)
+    engine = sim.get_rhs()
+    assert engine.clusters is not None
+    for y in states(sim, 4):
+        M, F = engine.evaluate(0.2, y)
+        np.testing.assert_allclose(engine.accelerations(0.2, y), np.linalg.solve(M, F), rtol=1e-9, atol=1e-9)
+
+
+def test_loop_falls_back_to_dense_solution():
+    engine = trolley_between_points(engine='numeric').get_rhs()
+    assert engine.clusters is None
+
+
+def test_bound_engine_pickles():
+    import pickle
+    sim = trolley_on_spring(engine='numeric', symbolic_parameters=True)
+    engine = pickle.loads(pickle.dumps(sim.get_rhs()))
+    assert engine.sim is None
+    y = np.array(sim.get_x0()) + 0.1
+    heavier = sim.get_parameter_values({'g': 5.})
+    np.testing.assert_allclose(engine.bind(heavier)(0.2, y), sim.get_rhs(parameters={'g': 5.})(0.2, y))
@@ -0,0 +1,66 @@
+import copy
+import time
+
+import numpy as np
+
+from pipeline import IntegrationProducer, StateBuffer
+from systems import pendulum
+
+
+def failing(t, y, out = None):
+    return np.array([np.nan if t > 0.25 else 1.])
+
+
+def collect(producer, count, timeout = 10):
+    items = []
+    deadline = time.time()+timeout
+    while len(items) < count and time.time() < deadline:
+        item = producer.get()
+        if item is None:
+            time.sleep(0.01)
+        else:
+            items.append(item)
+    return items
+
+
+def test_state_buffer_keeps_the_order():
+    buffer = StateBuffer(3, 2)
+    # the producer and the consumer keep their own position in their process
+    consumer = copy.copy(buffer)
+    assert consumer.get() is None
+    for k in range(3):
+        assert buffer.put(k, [k, -k])
+    assert not buffer.put(3, [3, -3], timeout=0.01)
+    t, y = consumer.get()
+    assert t == 0
+    np.testing.assert_array_equal(y, [0, 0])
+    assert buffer.put(3, [3, -3])
+    assert [consumer.get()[0] for k in range(3)] == [1, 2, 3]
+    assert consumer.get() is None
+
+
+def test_producer_matches_integrate():
+    sim = pendulum(formulation='mass_matrix')
+    producer = IntegrationProducer(sim.get_rhs(), sim.get_x0(), dt=0.1, capacity=4)
+    producer.start()
+    try:
+        items = collect(producer, 10)
+    finally:
+        producer.stop()
+    t = np.array([item[0] for item in items])
+    np.testing.assert_allclose(t, 0.1*np.arange(1, 11))
+    y = sim.integrate((0, 1), t_eval=t)
+    np.testing.assert_allclose([item[1] for item in items], y, atol=1e-5)
+    assert not producer.failed.is_set()
+
+
+def test_failed_producer_sets_the_event():
+    producer = IntegrationProducer(failing, [0.], dt=0.1, subintegrations=1)
+    producer.start()
+    try:
+        producer.process.join(10)
+        items = collect(producer, 2)
+    finally:
+        producer.stop()
+    assert producer.failed.is_set()
+    assert [round(item[0], 6) for item in items] == [0.1, 0.2]
@@ -0,0 +1,44 @@
+import sympy as sp
+
+from profiling import Lazy, Profiler, expression_size
+from systems import pendulum
+
+
+def test_expression_size():
+    x, y = sp.symbols('x y')
+    assert expression_size(x) == 1
+    assert expression_size([x+y, x]) == 4
+    assert expression_size({'a': x*y}) == 3
+
+
+def test_phases_and_counters():
+    records = []
+    profiler = Profiler(callback=records.append)
+    sim = pendulum(formulation='mass_matrix', profiler=profiler)
+    sim.integrate((0, 1))
+    report = profiler.report()
+    names = [phase['name'] for phase in report['phases']]
+    assert 'setup' in names and 'derive' in names and 'integrate' in names
+    # the callback gets every phase once it finished
+    assert sorted(record['name'] for record in records) == sorted(names)
+    assert report['counters']['rhs'] > 0
+    derive = report['phases'][names.index('derive')]
+    nested = [phase for phase in report['phases'] if phase['name'] == 'derive_component']
+    assert nested and all(phase['depth'] == derive['depth']+1 and phase['size'] is not None for phase in nested)
+    assert profiler.totals()['integrate'] > 0
+    assert 'integrate' in profiler.summary()
+
+
+def test_memory_is_traced():
+    profiler = Profiler(memory=True)
+    with profiler.phase('allocate'):
+        data = [0]*100000
+    assert profiler.report()['phases'][0]['memory'] >= 8*100000
+    del data
+
+
+def test_lazy_arguments_are_built_on_formatting():
+    calls = []
+    lazy = Lazy(lambda: calls.append(1) or 'text')
+    assert calls == []
+    assert str(lazy) == 'text' and calls == [1]
@@ -0,0 +1,48 @@
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from render import render_movie
+from systems import pendulum
+
+
+def script(path, body):
+    with open(path, 'w') as file:
+        file.write("#!/bin/sh\n" + body)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    """An ffmpeg replacement which stores the raw frames in the output path"""
+    return script(tmp_path / 'ffmpeg', 'for last; do :; done\ncat > "$last"\n')
+
+
+def test_frames_are_piped_in_order(tmp_path, recorder):
+    sim = pendulum(formulation='mass_matrix')
+    t = np.arange(0, 10)*sim.dt
+    y = sim.integrate((0, t[-1]), t_eval=t)
+    path = str(tmp_path / 'movie.raw')
+    render_movie(sim, t, y, path, size=(200, 100), processes=1, chunk_size=3, ffmpeg=recorder)
+    frames = np.fromfile(path, dtype=np.uint8).reshape(len(t), 100, 200, 3)
+    # the pendulum moves, every frame differs from the one before
+    assert all(np.any(frames[k] != frames[k+1]) for k in range(len(t)-1))
+
+
+def test_render_samples_an_exclusive_range(tmp_path, recorder):
+    sim = pendulum(formulation='mass_matrix')
+    path = str(tmp_path / 'movie.raw')
+    sim.render(path, (0, 12*sim.dt), size=(200, 100), processes=1, ffmpeg=recorder)
+    assert os.path.getsize(path) == 12*200*100*3
+
+
+def test_failing_encoder_is_reported(tmp_path):
+    sim = pendulum(formulation='mass_matrix')
+    ffmpeg = script(tmp_path / 'ffmpeg', 'echo "Unknown encoder" >&2\nexit 3\n')
+    t = np.arange(0, 40)*sim.dt
+    with pytest.raises(RuntimeError, match="status 3.*Unknown encoder"):
+        render_movie(sim, t, sim.integrate((0, t[-1]), t_eval=t), str(tmp_path / 'movie.mp4'),
+                     size=(200, 100), processes=1, ffmpeg=ffmpeg)
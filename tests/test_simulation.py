@@ -0,0 +1,87 @@
+import logging
+
+import numpy as np
+import pytest
+
+import simulation
+from simulation import configure_logging, logger
+from systems import MODELS, double_pendulum, pendulum, restricted_spring, states
+
+
+def test_configure_logging_replaces_its_handlers(tmp_path):
+    level = logger.level
+    before = list(logger.handlers)
+    try:
+        configure_logging(str(tmp_path / 'first.log'))
+        configure_logging(str(tmp_path / 'second.log'), level=logging.WARNING)
+        added = [handler for handler in logger.handlers if handler not in before]
+        assert len(added) == 2
+        logger.debug("only once")
+        assert (tmp_path / 'second.log').read_text().count("only once") == 1
+        assert "only once" not in (tmp_path / 'first.log').read_text()
+    finally:
+        while simulation._handlers:
+            handler = simulation._handlers.pop()
+            logger.removeHandler(handler)
+            handler.close()
+        logger.setLevel(level)
+
+
+def test_integrate_headless():
+    sim = pendulum()
+    sim.Objects[1].phi0 = 0.01
+    y = sim.integrate((0, 2))
+    t = np.arange(0, 2+sim.dt/2, sim.dt)
+    assert y.shape == (len(t), 2)
+    assert sim.fig is None
+    # the small oscillations of a pendulum of length 1
+    omega = np.sqrt(sim.get_g())
+    np.testing.assert_allclose(y[:, 0], 0.01*np.cos(omega*t), atol=1e-5)
+    np.testing.assert_allclose(y[:, 1], -0.01*omega*np.sin(omega*t), atol=1e-4)
+
+
+def test_integrate_from_other_states():
+    sim = pendulum()
+    y = sim.integrate((0, 1), t_eval=[0, 0.5, 1], x0=[0.5, 1.])
+    assert y.shape == (3, 2)
+    np.testing.assert_array_equal(y[0], [0.5, 1.])
+
+
+def test_unknown_options_raise():
+    with pytest.raises(ValueError):
+        pendulum(formulation='unknown')
+    with pytest.raises(ValueError):
+        pendulum(engine='unknown')
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_mass_matrix_matches_solve(model):
+    solve = model()
+    mass_matrix = model(formulation='mass_matrix')
+    for y in states(solve):
+        np.testing.assert_allclose(mass_matrix.get_rhs()(0.3, y), solve.get_rhs()(0.3, y), atol=1e-10)
+
+
+def test_mass_matrix_integrates_like_solve():
+    t = np.linspace(0, 1, 5)
+    np.testing.assert_allclose(restricted_spring(formulation='mass_matrix').integrate((0, 1), t_eval=t),
+                               restricted_spring().integrate((0, 1), t_eval=t), atol=1e-4)
+
+
+@pytest.mark.parametrize('chunk_size', [None, 2])
+def test_ensemble_matches_single_runs(chunk_size):
+    sim = double_pendulum(formulation='mass_matrix')
+    x0s = states(sim)
+    t = np.linspace(0, 1, 5)
+    ensemble = sim.integrate_ensemble(x0s, (0, 1), t_eval=t, chunk_size=chunk_size)
+    assert ensemble.shape == (len(x0s), len(t), len(x0s[0]))
+    for x0, y in zip(x0s, ensemble):
+        np.testing.assert_allclose(y, sim.integrate((0, 1), t_eval=t, x0=x0), atol=1e-3)
+
+
+def test_vectorized_rhs_matches_single_states():
+    sim = restricted_spring(formulation='mass_matrix')
+    y = states(sim, 4)
+    vectorized = sim.get_rhs(vectorized=True)(0.3, y.T)
+    for k in range(len(y)):
+        np.testing.assert_allclose(vectorized[:, k], sim.get_rhs()(0.3, y[k]), atol=1e-12)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from storage import TrajectoryWriter, TrajectoryReader
+from systems import pendulum
+
+
+def test_read_back(tmp_path):
+    sim = pendulum(formulation='mass_matrix')
+    t = np.arange(0, 1, sim.dt)
+    y = sim.integrate((0, 1), t_eval=t)
+    path = str(tmp_path / 'trajectory')
+    with TrajectoryWriter(path, sim, chunk_size=7, positions=True) as writer:
+        writer.append(t[:10], y[:10])
+        for k in range(10, len(t)):
+            writer.append(t[k], y[k])
+    reader = TrajectoryReader(path)
+    assert len(reader) == len(t)
+    np.testing.assert_array_equal(reader.read(name='times'), t)
+    np.testing.assert_array_equal(reader.read(), y)
+    np.testing.assert_array_equal(reader.read(5, 20), y[5:20])
+    time, state = reader[-1]
+    assert time == t[-1]
+    np.testing.assert_array_equal(state, y[-1])
+    np.testing.assert_allclose(reader.read(name='positions'), sim.get_kinematics().positions(t, y))
+    reader.check(sim)
+
+
+def test_read_empty(tmp_path):
+    sim = pendulum(formulation='mass_matrix')
+    path = str(tmp_path / 'empty')
+    TrajectoryWriter(path, sim).close()
+    reader = TrajectoryReader(path)
+    assert len(reader) == 0
+    assert reader.read().shape == (0, 2)
+    assert reader.read(name='times').shape == (0,)
+
+
+def test_read_without_positions(tmp_path):
+    sim = pendulum(formulation='mass_matrix')
+    path = str(tmp_path / 'states')
+    with TrajectoryWriter(path, sim) as writer:
+        writer.append(0., sim.get_x0())
+    reader = TrajectoryReader(path)
+    with pytest.raises(ValueError, match="no positions"):
+        reader.read(name='positions')
+    with pytest.raises(ValueError, match="no positions"):
+        reader.positions(0)
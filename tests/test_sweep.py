@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from sweep import parameter_grid, sweep
+from systems import double_pendulum, pendulum, states
+
+
+def test_parameter_grid():
+    assert parameter_grid({'g': [1, 2], 'mass_2': [3]}) == [{'g': 1, 'mass_2': 3}, {'g': 2, 'mass_2': 3}]
+
+
+def test_symbolic_parameters_match_fixed_values():
+    sim = double_pendulum(formulation='mass_matrix', symbolic_parameters=True)
+    reference = double_pendulum(formulation='mass_matrix', g=3.)
+    reference.Objects[4].mass = 0.5
+    reference.Objects[3].length = 0.8
+    parameters = {'g': 3., 'mass_4': 0.5, 'length_3': 0.8}
+    for y in states(sim):
+        np.testing.assert_allclose(sim.get_rhs(parameters=parameters)(0, y), reference.get_rhs()(0, y), atol=1e-12)
+
+
+def test_unknown_parameters_raise():
+    sim = pendulum(symbolic_parameters=True)
+    sim.derive()
+    with pytest.raises(KeyError):
+        sim.get_parameter_values({'mass_7': 1.})
+
+
+@pytest.mark.parametrize('engine', ['symbolic', 'numeric'])
+def test_sweep_matches_single_integrations(engine):
+    sim = pendulum(symbolic_parameters=True, engine=engine)
+    t = np.linspace(0, 1, 4)
+    grid, y = sweep(sim, {'g': [1., 9.81], 'length_1': [0.5, 1.]}, (0, 1), t_eval=t, processes=1)
+    assert y.shape == (4, len(t), 2)
+    for parameters, trajectory in zip(grid, y):
+        np.testing.assert_allclose(trajectory, sim.integrate((0, 1), t_eval=t, parameters=parameters), atol=1e-8)
+
+
+def test_sweep_needs_symbolic_parameters():
+    with pytest.raises(ValueError):
+        sweep(pendulum(), {'g': [1.]}, (0, 1))
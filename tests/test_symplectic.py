@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from systems import pendulum, swinging_spring, states
+
+
+@pytest.mark.parametrize('scheme', ['midpoint', 'verlet'])
+def test_short_runs_follow_integrate(scheme):
+    sim = swinging_spring(formulation='mass_matrix')
+    y = sim.integrate_symplectic((0, 0.5), scheme=scheme, substeps=20)
+    t = np.arange(len(y))*sim.dt
+    np.testing.assert_allclose(y, sim.integrate((0, t[-1]), t_eval=t), atol=2e-3)
+
+
+def test_energy_error_stays_bounded():
+    sim = pendulum(formulation='mass_matrix', dt=0.1)
+    sim.Objects[1].phi0 = 2.
+    y = sim.integrate_symplectic((0, 200))
+    drift = sim.get_diagnostics().energy_drift(np.arange(len(y))*sim.dt, y)
+    # bounded oscillations instead of a drift, the second half is not worse than the first
+    assert drift.max() < 5e-2
+    assert drift[len(drift)//2:].max() < 1.5*drift[:len(drift)//2].max()
+
+
+def test_ensemble_matches_single_runs():
+    sim = swinging_spring(formulation='mass_matrix')
+    x0s = states(sim, 2)
+    ensemble = sim.integrate_symplectic((0, 0.5), x0=x0s)
+    for x0, y in zip(x0s, ensemble):
+        np.testing.assert_allclose(y, sim.integrate_symplectic((0, 0.5), x0=x0), atol=1e-9)
+
+
+def test_unknown_scheme_raises():
+    with pytest.raises(ValueError):
+        pendulum().integrate_symplectic((0, 1), scheme='euler')